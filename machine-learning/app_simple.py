@@ -1,37 +1,131 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Header, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Literal
+import cv2
 import joblib
+import numpy as np
+import pandas as pd
 import json
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import re
+import time
+import logging
 
 # Importar nossos módulos
-from data_generator import SyntheticDataGenerator
-from model_trainer import DocumentValidatorTrainer
-from ocr_simple import OCRProcessor
+from ocr_simple import OCRProcessor, synthetic_document_image
+from training_jobs import TrainingJobManager
+from model_registry import ModelRegistry
+from feature_store import FeatureStore, text_hash
+from validation_jobs import RetryLater, ValidationJobQueue
+from profiling import RequestProfiler, ProfilingMiddleware
+from logging_config import configure_logging, get_logger
+from metrics import (registry as metrics_registry, STAGE_SECONDS, OCR_SECONDS, REQUEST_SECONDS,
+                     VALIDATIONS, IN_FLIGHT, WORKER_INFO, FEATURE_STORE_LOOKUPS, VALIDATION_JOBS,
+                     SlowRequestLog, server_timing)
 
-app = FastAPI(title="ML Document Validator API", version="1.0.0")
+# Logs com nível e amostragem (ML_LOG_LEVEL, ML_LOG_FORMAT, ML_LOG_SAMPLE_RATE), escritos por uma thread de fundo
+configure_logging()
+logger = get_logger("api")
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_bytes(content):
+    """JSON compacto em bytes, com orjson quando disponível"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson (ou json compacto, sem orjson)"""
+
+    def render(self, content):
+        return json_bytes(content)
+
+app = FastAPI(title="ML Document Validator API", version="1.0.0",
+              default_response_class=FastJSONResponse)
+# Comprime respostas grandes quando o cliente envia Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Perfis amostrados (ML_PROFILE_RATE / X-Profile); desligado, o middleware nem é instalado
+profiler = RequestProfiler.from_env()
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Contagens de `analyze_text` guardadas no feature store; as regras rodam a cada requisição
+TEXT_SIGNAL_SCHEMA = "text-signals-v1"
+TEXT_SIGNAL_COLUMNS = [
+    "land_count", "cda_count", "agro_tech_count", "official_count", "invalid_count",
+    "has_dates", "has_cpf_cnpj", "has_money", "has_area_measures", "has_registry_numbers",
+    "text_length", "word_count", "year_count"
+]
+
+# Como devolver o texto extraído: completo, truncado ou só o tamanho
+TextMode = Literal["full", "truncated", "none"]
 
 # Variáveis globais simples
 ocr_processor = OCRProcessor()
+training_jobs = TrainingJobManager()
+model_registry = ModelRegistry("models")
 model = None
+model_version = None
+ocr_executor = None
+feature_store = None
+validation_jobs = None
+# Aquecimento do worker (`warm_up`); /ready só responde 200 depois dele
+warmup_status = {"ready": False, "stage": None, "timings_ms": {}, "error": None}
+# Requisições acima de ML_SLOW_REQUEST_MS (padrão 1000 ms; -1 desliga) vão para logs/slow_requests.jsonl
+slow_requests = SlowRequestLog.from_env()
 
-def load_model():
-    """Carrega o modelo treinado"""
-    global model
-    model_path = "models/document_validator.pkl"
+def load_model(version=None):
+    """Carrega o modelo (versão atual do registro) e troca o modelo servido
+
+    O novo modelo é carregado por completo antes da troca; a troca é uma única
+    atribuição, então requisições em andamento terminam com o modelo antigo.
+    """
+    global model, model_version
     
-    if os.path.exists(model_path):
-        model = joblib.load(model_path)
-        print("✅ Modelo carregado")
-        return True
-    else:
-        print("⚠️ Modelo não encontrado. Execute: python model_trainer.py")
-        return False
+    try:
+        # ML_MODEL_MMAP=1: arrays do modelo mapeados do disco (páginas compartilhadas entre workers)
+        mmap_mode = 'r' if os.getenv('ML_MODEL_MMAP') == '1' else None
+        new_model, metadata = model_registry.load(version, mmap_mode=mmap_mode)
+        new_version = metadata['version']
+    except FileNotFoundError:
+        # Compatibilidade com modelos salvos antes do registro versionado
+        legacy_path = "models/document_validator.pkl"
+        if version is not None or not os.path.exists(legacy_path):
+            logger.warning("⚠️ Modelo não encontrado. Execute: python model_trainer.py")
+            return False
+        new_model, new_version = joblib.load(legacy_path), "legacy"
+    
+    # Primeira predição fora do caminho da requisição (inicialização preguiçosa do sklearn)
+    new_model.predict_proba([[0.0] * getattr(new_model, "n_features_in_", 9)])
+    
+    model, model_version = new_model, new_version
+    logger.info(f"✅ Modelo carregado (versão {model_version})", extra={"model_version": model_version})
+    return True
 
-def extract_features_from_text(text):
-    """Extrai features MUITO rigorosas do texto para documentos de propriedade rural"""
+def text_fields(text, mode="full", max_chars=500):
+    """Campos de texto da resposta conforme o modo pedido pelo cliente"""
+    if mode == "full":
+        return {"extracted_text": text}
+    if mode == "truncated":
+        return {
+            "extracted_text": text[:max_chars],
+            "extracted_text_truncated": len(text) > max_chars,
+            "extracted_text_length": len(text)
+        }
+    return {"extracted_text_length": len(text)}
+
+def analyze_text(text):
+    """Contagens de termos e padrões do texto (a parte cara da extração)"""
     
     # Termos OBRIGATÓRIOS para documentos de terra/propriedade rural
     land_property_terms = [
@@ -81,12 +175,47 @@ def extract_features_from_text(text):
     has_cpf_cnpj = len(re.findall(r'\d{3}\.\d{3}\.\d{3}-\d{2}|\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}', text))
     has_money = len(re.findall(r'R\$\s*[\d.,]+|reais|valor|preço', text_lower))
     has_area_measures = len(re.findall(r'\d+[\s]*(?:hectares?|ha|m²|metros?|alqueires?|toneladas?|sacas?)', text_lower))
-    has_coordinates = len(re.findall(r'-?\d+\.\d+.*-?\d+\.\d+', text))
     has_registry_numbers = len(re.findall(r'(?:matrícula|registro|protocolo)[\s\n]*n?[ºo°]?\s*[\d\-\.]+', text_lower))
     
     # Comprimento do texto
     text_length = len(text)
     word_count = len(text.split())
+    year_count = len(re.findall(r'\d{4}', text))
+    
+    return {
+        "land_count": land_count,
+        "cda_count": cda_count,
+        "agro_tech_count": agro_tech_count,
+        "official_count": official_count,
+        "invalid_count": invalid_count,
+        "has_dates": has_dates,
+        "has_cpf_cnpj": has_cpf_cnpj,
+        "has_money": has_money,
+        "has_area_measures": has_area_measures,
+        "has_registry_numbers": has_registry_numbers,
+        "text_length": text_length,
+        "word_count": word_count,
+        "year_count": year_count
+    }
+
+def apply_rigorous_rules(signals, explain=False):
+    """Critérios rigorosos e vetor de features do modelo a partir de `analyze_text`
+
+    Retorna (features, decisão, análise); a análise detalhada só é montada com
+    `explain=True` ou com o log em nível DEBUG (senão é None).
+    """
+    land_count = signals["land_count"]
+    cda_count = signals["cda_count"]
+    agro_tech_count = signals["agro_tech_count"]
+    official_count = signals["official_count"]
+    invalid_count = signals["invalid_count"]
+    has_dates = signals["has_dates"]
+    has_cpf_cnpj = signals["has_cpf_cnpj"]
+    has_money = signals["has_money"]
+    has_area_measures = signals["has_area_measures"]
+    has_registry_numbers = signals["has_registry_numbers"]
+    text_length = signals["text_length"]
+    word_count = signals["word_count"]
     
     # CRITÉRIOS EXTREMAMENTE RIGOROSOS:
     # Para ser válido o documento DEVE ter:
@@ -101,7 +230,7 @@ def extract_features_from_text(text):
     # 3. Elementos técnicos obrigatórios (critérios mais flexíveis)
     has_sufficient_agro = agro_tech_count >= 1
     has_sufficient_official = official_count >= 1  
-    has_sufficient_dates = has_dates >= 1 or len(re.findall(r'\d{4}', text)) >= 1  # Data ou pelo menos um ano
+    has_sufficient_dates = has_dates >= 1 or signals["year_count"] >= 1  # Data ou pelo menos um ano
     has_sufficient_ids = (has_cpf_cnpj >= 1 or has_registry_numbers >= 1)
     has_sufficient_length = text_length >= 200  # Reduzido de 300 para 200
     
@@ -138,28 +267,250 @@ def extract_features_from_text(text):
         min(word_count/100, 10),     # 8: Palavras normalizadas
     ]
     
-    # Log para debug detalhado
-    print(f"🔍 Análise rigorosa:")
-    print(f"   📋 Tipo válido: {is_valid_document_type} (Terra: {is_land_document}, CDA: {is_cda_document})")
-    print(f"   ❌ Termos inválidos: {has_invalid_terms} ({invalid_count} encontrados)")
-    print(f"   🌾 Termos agro suficientes: {has_sufficient_agro} ({agro_tech_count} encontrados)")
-    print(f"   📜 Termos oficiais suficientes: {has_sufficient_official} ({official_count} encontrados)")
-    print(f"   📅 Datas suficientes: {has_sufficient_dates} ({has_dates} encontradas)")
-    print(f"   🆔 IDs suficientes: {has_sufficient_ids} (CPF/CNPJ: {has_cpf_cnpj}, Registros: {has_registry_numbers})")
-    print(f"   📏 Tamanho suficiente: {has_sufficient_length} ({text_length} caracteres)")
-    print(f"   ✅ Requisitos: {has_all_requirements}")
-    print(f"   🎯 Decisão final: {is_truly_valid}")
+    # Análise detalhada: só quando pedida na resposta ou com log em DEBUG
+    analysis = None
+    if explain or logger.isEnabledFor(logging.DEBUG):
+        analysis = {
+            "valid_document_type": is_valid_document_type,
+            "land_document": is_land_document,
+            "cda_document": is_cda_document,
+            "has_invalid_terms": has_invalid_terms,
+            "invalid_terms": invalid_count,
+            "sufficient_agro": has_sufficient_agro,
+            "agro_terms": agro_tech_count,
+            "sufficient_official": has_sufficient_official,
+            "official_terms": official_count,
+            "sufficient_dates": has_sufficient_dates,
+            "dates": has_dates,
+            "sufficient_ids": has_sufficient_ids,
+            "cpf_cnpj": has_cpf_cnpj,
+            "registry_numbers": has_registry_numbers,
+            "sufficient_length": has_sufficient_length,
+            "text_length": text_length,
+            "all_requirements": has_all_requirements,
+            "decision": is_truly_valid
+        }
+        logger.debug("🔍 Análise rigorosa", extra={"analysis": analysis, "sampled": True})
     
+    return features, is_truly_valid, analysis
+
+def extract_features_from_text(text):
+    """Extrai features MUITO rigorosas do texto para documentos de propriedade rural"""
+    features, is_truly_valid, _ = apply_rigorous_rules(analyze_text(text))
     return features, is_truly_valid
 
+def text_signals_frame(texts):
+    """Featurizer do feature store: contagens de `analyze_text` por texto"""
+    return pd.DataFrame([analyze_text(text) for text in texts], columns=TEXT_SIGNAL_COLUMNS)
+
+def record_stage(timings, stage, seconds):
+    """Registra a duração de uma etapa no histograma e nas durações da requisição"""
+    if stage.startswith("ocr_"):
+        OCR_SECONDS.observe(seconds, backend=stage[4:])
+    else:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    timings[stage] = seconds
+
+def text_features(text, timings, explain=False):
+    """Features, decisão e análise das regras, com as contagens em cache por hash do texto"""
+    start = time.perf_counter()
+    if feature_store is None:
+        signals = analyze_text(text)
+    else:
+        row = feature_store.get_features([text]).iloc[0].tolist()
+        signals = {name: int(value) for name, value in zip(TEXT_SIGNAL_COLUMNS, row)}
+    record_stage(timings, "features", time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    result = apply_rigorous_rules(signals, explain)
+    record_stage(timings, "rules", time.perf_counter() - start)
+    return result
+
+def finish_request(endpoint, response, request_start, timings, result, reason, details):
+    """Métricas, header Server-Timing e log de requisições lentas ao fim de uma validação
+
+    Sem `response` (streaming: os headers já foram enviados), só métricas e log.
+    """
+    duration = time.perf_counter() - request_start
+    IN_FLIGHT.dec(endpoint=endpoint)
+    REQUEST_SECONDS.observe(duration, endpoint=endpoint)
+    VALIDATIONS.inc(endpoint=endpoint, result=result, reason=reason)
+    
+    if response is not None:
+        response.headers["Server-Timing"] = server_timing(timings, duration)
+        response.headers["Timing-Allow-Origin"] = "*"
+    slow_requests.record(duration, {
+        "endpoint": endpoint,
+        "result": result,
+        "reason": reason,
+        "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+        "timestamp": datetime.now().isoformat(),
+        **details
+    })
+
+# Documento sintético do aquecimento: termos de terra/CDA, datas e identificadores
+WARMUP_LINES = [
+    "ESCRITURA PUBLICA DE COMPRA E VENDA",
+    "Fazenda Boa Vista - imovel rural, area rural de 150 hectares",
+    "Matricula n 12.345 - Cartorio de Registro de Imoveis",
+    "Certidao emitida em 12/03/2024 pelo tabeliao",
+    "CPF 123.456.789-00 - plantio de soja e milho, 500 sacas",
+    "Valor: R$ 1.500.000,00 - Protocolo n 789/2024"
+]
+
+def warm_up():
+    """Passa um documento sintético por decode, OCR, features, regras, inferência e serialização
+
+    Paga antes do tráfego os custos da primeira requisição: leitura do
+    `por.traineddata` do Tesseract, compilação das regex, inicialização do
+    sklearn e carga do índice do feature store.
+    """
+    def step(name, func, *args):
+        warmup_status["stage"] = name
+        start = time.perf_counter()
+        value = func(*args)
+        warmup_status["timings_ms"][name] = round((time.perf_counter() - start) * 1000, 3)
+        return value
+    
+    image = step("render", synthetic_document_image, WARMUP_LINES)
+    gray = step("decode", lambda: cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE))
+    # Tesseract direto: com MISTRAL_API_KEY, process_uploaded_file faria uma chamada paga a cada boot
+    ocr_text = step("ocr", ocr_processor.extract_text_tesseract, gray)
+    # Sem texto do OCR (ex.: Tesseract ausente) as features usam o texto de origem
+    text = ocr_text or "\n".join(WARMUP_LINES)
+    signals = step("features", analyze_text, text)
+    if feature_store is not None:
+        step("feature_store", feature_store.lookup, [text_hash(text)])
+    features, is_valid, analysis = step("rules", apply_rigorous_rules, signals, True)
+    
+    current_model = model
+    if current_model is not None:
+        step("inference", lambda: (current_model.predict([features]), current_model.predict_proba([features])))
+    step("serialization", json_bytes, {"is_valid": is_valid, "analysis": analysis,
+                                       **text_fields(text, "truncated", 500)})
+
+async def run_warm_up():
+    """Aquece o worker no pool de OCR e marca /ready"""
+    start = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(ocr_executor, warm_up)
+    except Exception as e:
+        # Aquecer é otimização: o worker atende mesmo se uma etapa falhar
+        warmup_status["error"] = f"{warmup_status['stage']}: {e}"
+        logger.warning(f"⚠️ Erro no aquecimento ({warmup_status['error']})")
+    warmup_status.update({"ready": True, "stage": None,
+                          "seconds": round(time.perf_counter() - start, 3)})
+    logger.info(f"🔥 Worker aquecido em {warmup_status['seconds']}s",
+                extra={"timings_ms": warmup_status["timings_ms"]})
+
 @app.on_event("startup")
 async def startup():
     """Inicialização"""
-    print("🚀 Iniciando API...")
+    logger.info("🚀 Iniciando API...", extra={"pid": os.getpid()})
     os.makedirs("data", exist_ok=True)
     os.makedirs("models", exist_ok=True)
     os.makedirs("uploads", exist_ok=True)
-    load_model()
+    
+    global ocr_executor
+    # Pool de OCR criado por worker (threads não sobrevivem ao fork)
+    ocr_executor = ThreadPoolExecutor(
+        max_workers=int(os.getenv("ML_OCR_THREADS", "0")) or (os.cpu_count() or 1),
+        thread_name_prefix="ocr"
+    )
+    
+    # Com pré-carregamento (serving.serve_prefork) o modelo já veio do processo pai
+    if model is None:
+        load_model()
+    
+    global feature_store
+    # ML_FEATURE_STORE=1 liga o cache de features por hash do texto (desligado: `analyze_text`
+    # por requisição é mais rápido que a consulta ao store)
+    if os.getenv("ML_FEATURE_STORE", "0") == "1":
+        feature_store = FeatureStore(
+            "data/feature_store", TEXT_SIGNAL_SCHEMA, TEXT_SIGNAL_COLUMNS,
+            featurize=text_signals_frame, flush_rows=None
+        )
+        asyncio.create_task(flush_feature_store(float(os.getenv("ML_FEATURE_STORE_FLUSH_SECONDS", "60"))))
+    
+    global validation_jobs
+    # Fila durável de validações (POST /jobs); ML_JOB_WORKERS=0 só aceita jobs, sem processá-los
+    if os.getenv("ML_JOBS", "1") != "0":
+        validation_jobs = ValidationJobQueue(
+            "uploads/jobs.sqlite3", "uploads",
+            lease_seconds=float(os.getenv("ML_JOB_LEASE_SECONDS", "600")),
+            max_attempts=int(os.getenv("ML_JOB_MAX_ATTEMPTS", "3"))
+        )
+        validation_jobs.start(process_validation_job, int(os.getenv("ML_JOB_WORKERS", "1")))
+    
+    poll_seconds = float(os.getenv("ML_MODEL_POLL_SECONDS", "0"))
+    if poll_seconds > 0:
+        asyncio.create_task(watch_model_registry(poll_seconds))
+    
+    WORKER_INFO.set(1, pid=os.getpid())
+    # Com vários workers (serving.serve_prefork) /metrics junta os snapshots do diretório compartilhado
+    if os.getenv("ML_METRICS_DIR"):
+        metrics_registry.enable_multiprocess(os.environ["ML_METRICS_DIR"])
+        asyncio.create_task(sync_metrics(float(os.getenv("ML_METRICS_SYNC_SECONDS", "5"))))
+    
+    # ML_WARMUP=0 pula o aquecimento (/ready fica pronto assim que o modelo carrega)
+    if os.getenv("ML_WARMUP", "1") != "0":
+        asyncio.create_task(run_warm_up())
+    else:
+        warmup_status["ready"] = True
+
+async def flush_feature_store(interval_seconds):
+    """Grava os vetores pendentes do feature store periodicamente, fora do event loop"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(feature_store.flush)
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao gravar o feature store: {e}")
+
+# Consultas ao feature store já somadas ao contador (as contagens ficam em `feature_store.stats`)
+reported_lookups = {"hits": 0, "misses": 0}
+
+def update_worker_metrics():
+    """Atualiza as métricas lidas do estado do worker (não das requisições)"""
+    if feature_store is not None:
+        for key, result in (("hits", "hit"), ("misses", "miss")):
+            count = feature_store.stats[key]
+            FEATURE_STORE_LOOKUPS.inc(count - reported_lookups[key], result=result)
+            reported_lookups[key] = count
+
+async def sync_metrics(interval_seconds):
+    """Grava o snapshot de métricas do worker para os outros workers o incluírem em /metrics"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            update_worker_metrics()
+            await run_in_threadpool(metrics_registry.write_snapshot)
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao gravar as métricas: {e}")
+
+async def watch_model_registry(poll_seconds):
+    """Troca o modelo quando outra instância/worker promove uma nova versão"""
+    while True:
+        await asyncio.sleep(poll_seconds)
+        try:
+            current = model_registry.current_version()
+            if current is not None and current != model_version:
+                await run_in_threadpool(load_model, current)
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao verificar o registro de modelos: {e}")
+
+@app.on_event("shutdown")
+async def shutdown():
+    if validation_jobs is not None:
+        validation_jobs.stop()
+    if ocr_executor is not None:
+        ocr_executor.shutdown(wait=False)
+    if feature_store is not None:
+        await run_in_threadpool(feature_store.flush)
+    if metrics_registry.directory is not None:
+        # Contadores e histogramas do worker continuam somados depois que ele sai
+        update_worker_metrics()
+        await run_in_threadpool(metrics_registry.write_snapshot)
 
 @app.get("/")
 async def root():
@@ -168,7 +519,7 @@ async def root():
         "message": "ML Document Validator API",
         "status": "running",
         "model_loaded": model is not None,
-        "endpoints": ["/validate-document", "/health", "/docs"]
+        "endpoints": ["/validate-document", "/validate-document/stream", "/validate-text", "/jobs", "/train-model", "/models", "/health", "/ready", "/metrics", "/docs"]
     }
 
 @app.get("/health")
@@ -177,132 +528,495 @@ async def health():
     return {
         "status": "healthy",
         "model_loaded": model is not None,
+        "model_version": model_version,
         "timestamp": datetime.now().isoformat()
     }
 
-@app.post("/validate-document")
-async def validate_document(file: UploadFile = File(...)):
-    """Valida um documento"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Modelo não carregado")
+@app.get("/ready")
+async def ready():
+    """Prontidão para tráfego: worker aquecido (503 até lá)
+
+    Com ML_READY_REQUIRES_MODEL=1, também exige o modelo carregado. Desligado
+    por padrão: um deploy novo, sem modelo, precisa receber `/train-model`.
+    """
+    requires_model = os.getenv("ML_READY_REQUIRES_MODEL", "0") == "1"
+    body = {
+        "ready": warmup_status["ready"] and (model is not None or not requires_model),
+        "model_loaded": model is not None,
+        "model_version": model_version,
+        "warmup": warmup_status
+    }
+    if not body["ready"]:
+        return FastJSONResponse(body, status_code=503)
+    return body
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato texto do Prometheus (de todos os workers, com ML_METRICS_DIR)"""
+    update_worker_metrics()
+    if validation_jobs is not None:
+        for status, count in validation_jobs.counts().items():
+            VALIDATION_JOBS.set(count, status=status)
+    if metrics_registry.directory is None:
+        body = metrics_registry.render()
+    else:
+        body = await run_in_threadpool(metrics_registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/models")
+async def list_models():
+    """Versões registradas e a versão servida"""
+    return {
+        "serving": model_version,
+        "current": model_registry.current_version(),
+        "versions": model_registry.list_versions()
+    }
+
+@app.post("/models/{version}/promote")
+async def promote_model(version: str):
+    """Promove uma versão e troca o modelo servido sem derrubar requisições"""
+    try:
+        model_registry.promote(version)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
+    # Carrega fora do event loop; a troca em si é uma atribuição
+    await run_in_threadpool(load_model, version)
+    return {"success": True, "serving": model_version}
+
+@app.post("/models/rollback")
+async def rollback_model():
+    """Volta para a versão promovida anteriormente"""
     try:
-        # Ler arquivo
-        file_content = await file.read()
-        
-        # Processar com OCR
-        ocr_result = ocr_processor.process_uploaded_file(file_content, file.filename)
-        
-        if not ocr_result["success"]:
-            return {
-                "is_valid": False,
-                "confidence": 0.0,
-                "error": ocr_result["error"],
-                "extracted_text": ""
-            }
+        pointer = model_registry.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    await run_in_threadpool(load_model, pointer["current"])
+    return {"success": True, "serving": model_version}
+
+@app.get("/profiles")
+async def list_profiles(limit: int = Query(50, ge=1, le=500), x_profile_token: str = Header(None)):
+    """Perfis recentes com os metadados da requisição (exige X-Profile-Token)"""
+    if not profiler.check_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Token de perfil inválido")
+    return {"profiles": profiler.list_profiles(limit)}
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, x_profile_token: str = Header(None)):
+    """Baixa um perfil no formato pstats (ex.: snakeviz, python -m pstats)"""
+    if not profiler.check_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Token de perfil inválido")
+    
+    path = profiler.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+def rejected_by_rules_body(text, ocr_method, text_mode, max_text_chars, analysis, explain):
+    """Corpo da resposta de um documento reprovado pelas regras rigorosas"""
+    return {
+        "is_valid": False,
+        "confidence": 0.0,
+        **text_fields(text, text_mode, max_text_chars),
+        "reason": "Documento não atende critérios rigorosos para propriedade rural/CDA",
+        "ocr_method": ocr_method,
+        "processed_at": datetime.now().isoformat(),
+        **({"analysis": analysis} if explain else {})
+    }
+
+def iter_document_validation(file_content, filename, current_model, current_version, timings, details,
+                             text_mode="full", max_text_chars=500, explain=False, strip_height=None):
+    """OCR, features, regras e modelo para um arquivo, como eventos `(nome, dados)`
+
+    Eventos: `decoded`, `ocr` (texto parcial de cada faixa), `features`,
+    `rules` e, por último, `result` com (corpo, resultado, motivo). Com várias
+    faixas, um termo invalidante no texto parcial já reprova o documento (o
+    termo continua no texto completo) e o OCR das faixas restantes não roda.
+    Síncrono: cada evento é pedido de uma thread (pool de OCR ou fila de jobs).
+    """
+    ocr_events = ocr_processor.iter_process_uploaded_file(file_content, filename, strip_height)
+    ocr_timings, parts, early_check_seconds = {}, [], 0.0
+    for event, data in ocr_events:
+        if event == "done":
+            ocr_result = data
+            break
+        if event == "decoded":
+            ocr_timings["decode"] = data["seconds"]
+            yield "decoded", data
+            continue
         
-        extracted_text = ocr_result["text"]
+        stage = f"ocr_{data['method']}"
+        ocr_timings[stage] = ocr_timings.get(stage, 0.0) + data["seconds"]
+        if data["text"]:
+            parts.append(data["text"])
+        yield "ocr", {**{key: value for key, value in data.items() if key != "text"},
+                      **text_fields(data["text"], text_mode, max_text_chars)}
+        if data["strip"] == data["strips"]:
+            continue
         
-        # Extrair features com validação rigorosa
-        features, is_rigorously_valid = extract_features_from_text(extracted_text)
+        # Rejeição antecipada: só termos invalidantes, que não somem com mais texto
+        start = time.perf_counter()
+        partial_text = "\n".join(parts)
+        signals = analyze_text(partial_text)
+        early_check_seconds += time.perf_counter() - start
+        if signals["invalid_count"] == 0:
+            continue
         
-        # Se não passou na validação rigorosa, retorna inválido direto
-        if not is_rigorously_valid:
-            return {
-                "is_valid": False,
-                "confidence": 0.0,
-                "extracted_text": extracted_text,
-                "reason": "Documento não atende critérios rigorosos para propriedade rural/CDA",
-                "ocr_method": ocr_result.get("method_used", "tesseract"),
-                "processed_at": datetime.now().isoformat()
-            }
+        ocr_events.close()
+        for stage, seconds in ocr_timings.items():
+            record_stage(timings, stage, seconds)
+        record_stage(timings, "features", early_check_seconds)
+        details["ocr_method"] = data["method"]
+        details["text_chars"] = len(partial_text)
+        details["ocr_strips"] = f"{data['strip']}/{data['strips']}"
         
-        # Se passou na validação rigorosa, usa o modelo ML como confirmação
-        prediction = model.predict([features])[0]
-        probabilities = model.predict_proba([features])[0]
+        start = time.perf_counter()
+        features, _, analysis = apply_rigorous_rules(signals, explain)
+        record_stage(timings, "rules", time.perf_counter() - start)
+        yield "features", {"features": features, "text_chars": len(partial_text)}
+        yield "rules", {"passed": False, "early": True, "strips_processed": data["strip"],
+                        "strips": data["strips"], **({"analysis": analysis} if explain else {})}
+        yield "result", (rejected_by_rules_body(partial_text, data["method"], text_mode, max_text_chars,
+                                                analysis, explain), "invalid", "rigorous_rules")
+        return
+    
+    for stage, seconds in ocr_result.get("timings", {}).items():
+        record_stage(timings, stage, seconds)
+    if early_check_seconds:
+        record_stage(timings, "early_check", early_check_seconds)
+    details["ocr_method"] = ocr_result.get("method_used")
+    details["text_chars"] = len(ocr_result["text"])
+    
+    if not ocr_result["success"]:
+        yield "result", ({
+            "is_valid": False,
+            "confidence": 0.0,
+            "error": ocr_result["error"],
+            **text_fields("", text_mode, max_text_chars)
+        }, "invalid", ocr_result.get("error_code", "ocr_error"))
+        return
+    
+    extracted_text = ocr_result["text"]
+    ocr_method = ocr_result.get("method_used", "tesseract")
+    
+    # Extrair features com validação rigorosa
+    features, is_rigorously_valid, analysis = text_features(extracted_text, timings, explain)
+    yield "features", {"features": features, "text_chars": len(extracted_text)}
+    yield "rules", {"passed": is_rigorously_valid, "early": False,
+                    **({"analysis": analysis} if explain else {})}
+    
+    # Se não passou na validação rigorosa, retorna inválido direto
+    if not is_rigorously_valid:
+        yield "result", (rejected_by_rules_body(extracted_text, ocr_method, text_mode, max_text_chars,
+                                                analysis, explain), "invalid", "rigorous_rules")
+        return
+    
+    # Se passou na validação rigorosa, usa o modelo ML como confirmação
+    start = time.perf_counter()
+    prediction = current_model.predict([features])[0]
+    probabilities = current_model.predict_proba([features])[0]
+    record_stage(timings, "inference", time.perf_counter() - start)
+    
+    is_valid = bool(prediction and is_rigorously_valid)
+    yield "result", ({
+        "is_valid": is_valid,
+        "confidence": float(max(probabilities)),
+        **text_fields(extracted_text, text_mode, max_text_chars),
+        "rigorous_validation": is_rigorously_valid,
+        "ocr_method": ocr_method,
+        "model_version": current_version,
+        "processed_at": datetime.now().isoformat(),
+        **({"analysis": analysis} if explain else {})
+    }, ("valid" if is_valid else "invalid"), "model")
+
+def validate_document_content(file_content, filename, current_model, current_version, timings, details,
+                              text_mode="full", max_text_chars=500, explain=False):
+    """OCR, features, regras e modelo para um arquivo; retorna (corpo, resultado, motivo)
+
+    Síncrono: roda no pool de OCR (`/validate-document`) ou numa thread da fila de jobs.
+    """
+    for event, data in iter_document_validation(file_content, filename, current_model, current_version,
+                                                timings, details, text_mode, max_text_chars, explain):
+        if event == "result":
+            return data
+
+@app.post("/validate-document")
+async def validate_document(response: Response, file: UploadFile = File(...),
+                            text_mode: TextMode = "full", max_text_chars: int = Query(500, ge=0),
+                            explain: bool = False):
+    """Valida um documento
+
+    `text_mode=truncated|none` reduz a resposta aos campos de decisão;
+    `explain=true` inclui a análise detalhada das regras rigorosas.
+    """
+    # Referência local: uma troca de modelo não afeta esta requisição
+    current_model, current_version = model, model_version
+    if current_model is None:
+        VALIDATIONS.inc(endpoint="validate-document", result="error", reason="model_not_loaded")
+        raise HTTPException(status_code=503, detail="Modelo não carregado")
+    
+    IN_FLIGHT.inc(endpoint="validate-document")
+    request_start = time.perf_counter()
+    timings = {}
+    result, reason = "error", "exception"
+    details = {"filename": file.filename, "content_type": file.content_type, "model_version": current_version}
+    try:
+        # Ler arquivo
+        start = time.perf_counter()
+        file_content = await file.read()
+        record_stage(timings, "upload_read", time.perf_counter() - start)
+        details["input_bytes"] = len(file_content)
         
-        return {
-            "is_valid": bool(prediction and is_rigorously_valid),
-            "confidence": float(max(probabilities)),
-            "extracted_text": extracted_text,
-            "rigorous_validation": is_rigorously_valid,
-            "ocr_method": ocr_result.get("method_used", "tesseract"),
-            "processed_at": datetime.now().isoformat()
-        }
+        # OCR e validação no pool de threads: não bloqueia o event loop
+        loop = asyncio.get_running_loop()
+        body, result, reason = await loop.run_in_executor(
+            ocr_executor, profiler.wrap(validate_document_content), file_content, file.filename,
+            current_model, current_version, timings, details, text_mode, max_text_chars, explain
+        )
+        return body
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+    finally:
+        finish_request("validate-document", response, request_start, timings, result, reason, details)
 
-@app.post("/train-model")
-async def train_model():
-    """Treina o modelo"""
+def sse_event(event, data):
+    """Um evento no formato Server-Sent Events"""
+    return b"event: " + event.encode() + b"\ndata: " + json_bytes(data) + b"\n\n"
+
+@app.post("/validate-document/stream")
+async def validate_document_stream(file: UploadFile = File(...), text_mode: TextMode = "full",
+                                   max_text_chars: int = Query(500, ge=0), explain: bool = False,
+                                   strip_height: int = Query(800, ge=100)):
+    """Valida um documento emitindo o progresso como Server-Sent Events
+
+    O OCR (Tesseract) roda em faixas de ~`strip_height` pixels, com um evento
+    `ocr` e o texto parcial por faixa. Se o cliente desconectar, as faixas
+    restantes não são processadas.
+    """
+    # Referência local: uma troca de modelo não afeta esta requisição
+    current_model, current_version = model, model_version
+    if current_model is None:
+        VALIDATIONS.inc(endpoint="validate-document-stream", result="error", reason="model_not_loaded")
+        raise HTTPException(status_code=503, detail="Modelo não carregado")
+    
+    # Início antes da leitura do upload: o total inclui `upload_read`
+    request_start = time.perf_counter()
+    timings = {}
+    details = {"filename": file.filename, "content_type": file.content_type, "model_version": current_version}
+    
+    start = time.perf_counter()
+    file_content = await file.read()
+    record_stage(timings, "upload_read", time.perf_counter() - start)
+    details["input_bytes"] = len(file_content)
+    
+    async def events():
+        result, reason = "error", "exception"
+        loop = asyncio.get_running_loop()
+        pipeline = iter_document_validation(
+            file_content, file.filename, current_model, current_version, timings, details,
+            text_mode, max_text_chars, explain, strip_height
+        )
+        # Incrementado aqui, junto do `finally` que decrementa: se a leitura do upload falhar
+        # ou o cliente desconectar antes do primeiro evento, o gerador nem começa
+        IN_FLIGHT.inc(endpoint="validate-document-stream")
+        try:
+            while True:
+                # Um evento por vez no pool de OCR: parar de pedir cancela o OCR restante
+                item = await loop.run_in_executor(ocr_executor, profiler.wrap(next), pipeline, None)
+                if item is None:
+                    break
+                event, data = item
+                if event == "result":
+                    data, result, reason = data
+                    data = {**data, "timings_ms": {stage: round(seconds * 1000, 3)
+                                                   for stage, seconds in timings.items()}}
+                yield sse_event(event, data)
+        except asyncio.CancelledError:
+            result, reason = "cancelled", "client_disconnected"
+            raise
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Erro: {str(e)}"})
+        finally:
+            finish_request("validate-document-stream", None, request_start, timings, result, reason, details)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def process_validation_job(file_content, filename, params):
+    """Executa um job da fila (thread de `validation_jobs`); o resultado fica no SQLite"""
+    current_model, current_version = model, model_version
+    if current_model is None:
+        # Sem modelo (ainda não treinado): o job espera na fila em vez de falhar
+        raise RetryLater("Modelo não carregado")
+    
+    IN_FLIGHT.inc(endpoint="jobs")
+    job_start = time.perf_counter()
+    timings = {}
+    result, reason = "error", "exception"
+    details = {"filename": filename, "model_version": current_version, "input_bytes": len(file_content)}
     try:
-        if not os.path.exists("data/synthetic_data.csv"):
-            # Gerar dados primeiro
-            generator = SyntheticDataGenerator()
-            data = generator.generate_dataset(n_samples=1000)
-            generator.save_data(data, "data")
-        
-        # Treinar
-        trainer = DocumentValidatorTrainer()
-        df = trainer.load_data("data/synthetic_data.csv")
-        X, y, _ = trainer.prepare_features(df)
-        results, _, _ = trainer.train_models(X, y)
-        model_path = trainer.save_model()
-        
-        # Recarregar modelo
-        load_model()
-        
-        return {
-            "success": True,
-            "message": "Modelo treinado",
-            "accuracy": max([r["accuracy"] for r in results.values()]),
-            "model_path": model_path
-        }
-        
+        body, result, reason = validate_document_content(
+            file_content, filename, current_model, current_version, timings, details,
+            params.get("text_mode", "full"), params.get("max_text_chars", 500), params.get("explain", False)
+        )
+        return {**body, "timings_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}}
+    finally:
+        IN_FLIGHT.dec(endpoint="jobs")
+        REQUEST_SECONDS.observe(time.perf_counter() - job_start, endpoint="jobs")
+        VALIDATIONS.inc(endpoint="jobs", result=result, reason=reason)
+
+@app.post("/jobs", status_code=202)
+async def submit_validation_job(file: UploadFile = File(...), text_mode: TextMode = "full",
+                                max_text_chars: int = Query(500, ge=0), explain: bool = False):
+    """Enfileira a validação de um documento e retorna o id do job
+
+    O arquivo é gravado em `uploads/` antes da resposta: o job sobrevive a
+    reinícios e quedas do servidor. O resultado fica em `GET /jobs/{job_id}`.
+    """
+    if validation_jobs is None:
+        raise HTTPException(status_code=503, detail="Fila de jobs desativada")
+    
+    params = {"text_mode": text_mode, "max_text_chars": max_text_chars, "explain": explain}
+    # Cópia em blocos do arquivo temporário do upload, fora do event loop
+    chunks = iter(lambda: file.file.read(1024 * 1024), b"")
+    job = await run_in_threadpool(validation_jobs.submit, chunks, file.filename, params)
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['job_id']}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def validation_job_status(job_id: str):
+    """Status, tentativas e resultado de um job de validação"""
+    if validation_jobs is None:
+        raise HTTPException(status_code=503, detail="Fila de jobs desativada")
+    
+    job = await run_in_threadpool(validation_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.post("/train-model", status_code=202)
+async def train_model(search: bool = False):
+    """Inicia o treino do modelo em segundo plano e retorna o id do job
+
+    `search=true` busca os hiperparâmetros (successive halving) antes do treino.
+    """
+    try:
+        # O modelo é recarregado quando o job termina com sucesso
+        job, created = training_jobs.submit(
+            on_complete=lambda status: load_model(),
+            n_jobs=int(os.getenv('ML_TRAIN_JOBS', '0')) or None,
+            search=search
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": "Treino iniciado" if created else "Treino já em andamento",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "deduplicated": not created,
+        "status_url": f"/train-model/{job['job_id']}"
+    }
+
+@app.get("/train-model/{job_id}")
+async def train_model_status(job_id: str):
+    """Progresso, métricas por candidato e tempos de um job de treino"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+def validate_text_content(text, current_model, current_version, timings, text_mode="full", max_text_chars=500,
+                          explain=False):
+    """Features, regras e modelo para um texto; retorna (corpo, resultado, motivo)"""
+    # Extrair features do texto com validação rigorosa
+    features, is_rigorously_valid, analysis = text_features(text, timings, explain)
+    
+    # Se não passou na validação rigorosa, retorna inválido direto  
+    if not is_rigorously_valid:
+        return {
+            "is_valid": False,
+            "confidence": 0.0,
+            **text_fields(text, text_mode, max_text_chars),
+            "reason": "Documento não atende critérios rigorosos para propriedade rural/CDA",
+            "processed_at": datetime.now().isoformat(),
+            **({"analysis": analysis} if explain else {})
+        }, "invalid", "rigorous_rules"
+    
+    # Se passou na validação rigorosa, usa o modelo ML como confirmação
+    start = time.perf_counter()
+    prediction = current_model.predict([features])[0]
+    probabilities = current_model.predict_proba([features])[0]
+    record_stage(timings, "inference", time.perf_counter() - start)
+    
+    is_valid = bool(prediction and is_rigorously_valid)
+    return {
+        "is_valid": is_valid,
+        "confidence": float(max(probabilities)),
+        **text_fields(text, text_mode, max_text_chars),
+        "rigorous_validation": is_rigorously_valid,
+        "model_version": current_version,
+        "processed_at": datetime.now().isoformat(),
+        **({"analysis": analysis} if explain else {})
+    }, ("valid" if is_valid else "invalid"), "model"
 
 @app.post("/validate-text")
-async def validate_text(request: dict):
-    """Valida texto diretamente"""
-    if model is None:
+async def validate_text(request: dict, response: Response, text_mode: TextMode = "full",
+                        max_text_chars: int = Query(500, ge=0), explain: bool = False):
+    """Valida texto diretamente
+
+    O cliente já tem o texto enviado: `text_mode=none` evita devolvê-lo.
+    `explain=true` inclui a análise detalhada das regras rigorosas.
+    """
+    # Referência local: uma troca de modelo não afeta esta requisição
+    current_model, current_version = model, model_version
+    if current_model is None:
+        VALIDATIONS.inc(endpoint="validate-text", result="error", reason="model_not_loaded")
         raise HTTPException(status_code=503, detail="Modelo não carregado")
     
     text = request.get("text", "")
     if not text:
+        VALIDATIONS.inc(endpoint="validate-text", result="error", reason="empty_text")
         raise HTTPException(status_code=400, detail="Texto é obrigatório")
     
+    IN_FLIGHT.inc(endpoint="validate-text")
+    request_start = time.perf_counter()
+    timings = {}
+    result, reason = "error", "exception"
+    details = {"text_chars": len(text), "model_version": current_version}
     try:
-        # Extrair features do texto com validação rigorosa
-        features, is_rigorously_valid = extract_features_from_text(text)
-        
-        # Se não passou na validação rigorosa, retorna inválido direto  
-        if not is_rigorously_valid:
-            return {
-                "is_valid": False,
-                "confidence": 0.0,
-                "extracted_text": text,
-                "reason": "Documento não atende critérios rigorosos para propriedade rural/CDA",
-                "processed_at": datetime.now().isoformat()
-            }
-        
-        # Se passou na validação rigorosa, usa o modelo ML como confirmação
-        prediction = model.predict([features])[0]
-        probabilities = model.predict_proba([features])[0]
-        
-        return {
-            "is_valid": bool(prediction and is_rigorously_valid),
-            "confidence": float(max(probabilities)),
-            "extracted_text": text,
-            "rigorous_validation": is_rigorously_valid,
-            "processed_at": datetime.now().isoformat()
-        }
-        
+        body, result, reason = validate_text_content(text, current_model, current_version, timings,
+                                                     text_mode, max_text_chars, explain)
+        return body
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro: {str(e)}")
+    finally:
+        finish_request("validate-text", response, request_start, timings, result, reason, details)
 
 if __name__ == "__main__":
-    import uvicorn
-    print("🚀 Iniciando servidor em http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import argparse
+    from serving import plan_worker_resources, apply_resource_plan, serve_prefork
+    
+    parser = argparse.ArgumentParser(description="ML Document Validator API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ML_WORKERS", "1")),
+                        help="Processos HTTP (modelo carregado uma vez antes do fork)")
+    parser.add_argument("--ocr-threads", type=int, default=int(os.getenv("ML_OCR_THREADS", "0")),
+                        help="Threads de OCR por worker (padrão: núcleos / workers)")
+    args = parser.parse_args()
+    
+    plan = plan_worker_resources(args.workers, args.ocr_threads)
+    apply_resource_plan(plan)
+    if plan["workers"] > 1:
+        # Cada worker acompanha promoções feitas por outro worker
+        os.environ.setdefault("ML_MODEL_POLL_SECONDS", "5")
+    
+    logger.info(f"🚀 Iniciando servidor em http://localhost:{args.port}", extra={"plan": plan})
+    serve_prefork(app, args.host, args.port, plan["workers"], preload=load_model)
\ No newline at end of file
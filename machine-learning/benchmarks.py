@@ -0,0 +1,736 @@
+import argparse
+import json
+import mimetypes
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_generator import SyntheticDataGenerator, DatasetWriter
+
+def benchmark_features(n_rows=20000, seed=42):
+    """Compara o cálculo de features escalar (por texto) com o vetorizado (por coluna)"""
+    generator = SyntheticDataGenerator(seed=seed)
+    texts = pd.Series([s['text'] for s in generator.iter_samples(n_rows, with_features=False)])
+
+    start = time.perf_counter()
+    scalar = pd.DataFrame([generator.generate_features(text, None) for text in texts])
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = generator.generate_features_frame(texts)
+    vectorized_time = time.perf_counter() - start
+
+    # Os dois caminhos precisam produzir exatamente os mesmos valores
+    for column in scalar.columns:
+        if not np.array_equal(scalar[column].to_numpy(float), vectorized[column].to_numpy(float)):
+            raise AssertionError(f"Divergência na feature {column}")
+
+    result = {
+        'rows': n_rows,
+        'scalar_rows_per_sec': n_rows / scalar_time,
+        'vectorized_rows_per_sec': n_rows / vectorized_time,
+        'speedup': scalar_time / vectorized_time
+    }
+
+    print(f"📊 Features ({n_rows} linhas):")
+    print(f"   Escalar:    {result['scalar_rows_per_sec']:,.0f} linhas/s")
+    print(f"   Vetorizado: {result['vectorized_rows_per_sec']:,.0f} linhas/s")
+    print(f"   Ganho: {result['speedup']:.1f}x")
+
+    return result
+
+def _build_storage_dataset(n_rows, base_path, chunk_size=500_000, pool_size=1000, seed=42):
+    """Grava um dataset grande em CSV, Parquet e Arrow (só features)
+
+    Os textos são sorteados de um pool de documentos sintéticos reais para
+    que a geração não domine o tempo do benchmark.
+    """
+    generator = SyntheticDataGenerator(seed=seed)
+    pool = pd.DataFrame(list(generator.iter_samples(pool_size)))
+    rng = np.random.default_rng(seed)
+
+    os.makedirs(base_path, exist_ok=True)
+    paths = {
+        'csv': os.path.join(base_path, 'synthetic_data.csv'),
+        'parquet': os.path.join(base_path, 'synthetic_data.parquet'),
+        'arrow': os.path.join(base_path, 'synthetic_features.arrow')
+    }
+
+    with DatasetWriter(paths['csv']) as csv_writer, \
+            DatasetWriter(paths['parquet'], paths['arrow']) as parquet_writer:
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            chunk = pool.iloc[rng.integers(0, pool_size, stop - start)].reset_index(drop=True)
+            chunk['id'] = [f'doc_{i+1:04d}' for i in range(start, stop)]
+            csv_writer.write(chunk)
+            parquet_writer.write(chunk)
+
+    return paths
+
+def _reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux); o pico herdado do processo pai distorce a medição"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    """Pico de RSS do processo em MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _load_for_storage_benchmark(loader, path):
+    """Executa um carregamento e mede tempo e pico de memória (roda em subprocesso)"""
+    from model_trainer import DocumentValidatorTrainer
+
+    trainer = DocumentValidatorTrainer()
+    _reset_peak_rss()
+    baseline_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if loader == 'arrow':
+        X, y = trainer.load_feature_matrix(path)
+    else:
+        df = trainer.load_data(path)
+        X, y, _ = trainer.prepare_features(df)
+    # Garante que todas as páginas da matriz foram de fato lidas
+    float(np.asarray(X, dtype=np.float32).sum())
+    elapsed = time.perf_counter() - start
+
+    peak_rss = _peak_rss_mb()
+    return {
+        'loader': loader,
+        'rows': int(len(y)),
+        'seconds': elapsed,
+        'peak_rss_mb': peak_rss,
+        'load_rss_mb': peak_rss - baseline_rss
+    }
+
+def benchmark_storage(n_rows=10_000_000, base_path='data/bench_storage', keep_files=False):
+    """Compara tempo de carga e pico de memória do treino para CSV, Parquet e Arrow"""
+    print(f"🔄 Gerando dataset de {n_rows:,} linhas em {base_path}...")
+    paths = _build_storage_dataset(n_rows, base_path)
+
+    results = []
+    for loader, path in paths.items():
+        # Cada carga roda num processo novo para medir o pico de memória isolado
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), 'storage-load', loader, path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['file_mb'] = os.path.getsize(path) / 1024**2
+        results.append(result)
+
+    print(f"📊 Carga para treino ({n_rows:,} linhas):")
+    for r in results:
+        print(f"   {r['loader']:8s} {r['seconds']:8.2f}s  pico {r['peak_rss_mb']:9.1f} MB  "
+              f"(+{r['load_rss_mb']:.1f} MB)  arquivo {r['file_mb']:9.1f} MB")
+
+    if not keep_files:
+        for path in paths.values():
+            os.remove(path)
+
+    return results
+
+def _process_memory_mb(pid):
+    """RSS e PSS (memória proporcional: páginas compartilhadas divididas) de um processo"""
+    memory = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                memory[key.lower() + '_mb'] = int(value.split()[0]) / 1024
+    return memory
+
+def _worker_pids(server_pid):
+    """Workers do servidor: filhos do processo pai (ou o próprio, com 1 worker)"""
+    try:
+        with open(f'/proc/{server_pid}/task/{server_pid}/children') as f:
+            children = [int(pid) for pid in f.read().split()]
+    except OSError:
+        children = []
+    return children or [server_pid]
+
+def _drive_load(url, payload, duration, concurrency):
+    """Dispara requisições concorrentes por `duration` segundos; retorna (ok, erros)"""
+    import threading
+    import requests
+
+    ok, errors = [0], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            try:
+                response = session.post(url, json=payload, timeout=30)
+                success = response.status_code == 200
+            except requests.RequestException:
+                success = False
+            with lock:
+                if success:
+                    ok[0] += 1
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return ok[0], errors[0]
+
+def benchmark_serving(worker_counts=(1, 2, 4), duration=10, concurrency=16, port=8765):
+    """Throughput agregado e memória por worker do /validate-text para cada número de workers"""
+    import requests
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(app_dir, 'cda_valido.txt')) as f:
+        payload = {'text': f.read()}
+
+    results = []
+    for workers in worker_counts:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(app_dir, 'app_simple.py'),
+             '--workers', str(workers), '--port', str(port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            for _ in range(120):
+                try:
+                    if requests.get(f'{base_url}/health', timeout=1).json().get('model_loaded'):
+                        break
+                except requests.RequestException:
+                    pass
+                time.sleep(0.5)
+            else:
+                raise RuntimeError(f"Servidor com {workers} workers não ficou pronto")
+
+            # Aquece todos os workers antes de medir
+            _drive_load(f'{base_url}/validate-text', payload, 2, concurrency)
+            ok, errors = _drive_load(f'{base_url}/validate-text', payload, duration, concurrency)
+            memory = [_process_memory_mb(pid) for pid in _worker_pids(server.pid)]
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        result = {
+            'workers': workers,
+            'requests_per_sec': ok / duration,
+            'errors': errors,
+            'rss_mb_per_worker': float(np.mean([m['rss_mb'] for m in memory])),
+            'pss_mb_per_worker': float(np.mean([m['pss_mb'] for m in memory])),
+            'pss_mb_total': float(sum(m['pss_mb'] for m in memory))
+        }
+        results.append(result)
+
+    print(f"📊 /validate-text ({concurrency} clientes, {duration}s, {os.cpu_count()} núcleos):")
+    print("   workers   req/s   RSS/worker   PSS/worker   PSS total   erros")
+    for r in results:
+        print(f"   {r['workers']:7d} {r['requests_per_sec']:7.1f} {r['rss_mb_per_worker']:9.1f} MB "
+              f"{r['pss_mb_per_worker']:9.1f} MB {r['pss_mb_total']:9.1f} MB {r['errors']:7d}")
+
+    return results
+
+def benchmark_warmup(runs=3, port=8766):
+    """Latência da primeira requisição de cada tipo com e sem aquecimento (ML_WARMUP)
+
+    Sem aquecimento mede a partir de `/health` com o modelo carregado; com
+    aquecimento, a partir de `/ready`. Cada execução sobe um servidor novo.
+    """
+    import requests
+    from ocr_simple import synthetic_document_image
+
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(app_dir, 'cda_valido.txt')) as f:
+        payload = {'text': f.read()}
+    image = synthetic_document_image(["ESCRITURA PUBLICA", "Matricula: 12345", "Propriedade rural"])
+
+    def timed(call):
+        start = time.perf_counter()
+        response = call()
+        response.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    results = {}
+    for warmup in ('0', '1'):
+        samples = []
+        for _ in range(runs):
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(app_dir, 'app_simple.py'), '--port', str(port)],
+                env={**os.environ, 'ML_WARMUP': warmup},
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                start = time.perf_counter()
+                for _ in range(240):
+                    try:
+                        if warmup == '1':
+                            ready = requests.get(f'{base_url}/ready', timeout=1).status_code == 200
+                        else:
+                            ready = requests.get(f'{base_url}/health', timeout=1).json().get('model_loaded')
+                        if ready:
+                            break
+                    except requests.RequestException:
+                        pass
+                    time.sleep(0.05)
+                else:
+                    raise RuntimeError("Servidor não ficou pronto")
+                ready_seconds = time.perf_counter() - start
+
+                session = requests.Session()
+                document = lambda: session.post(f'{base_url}/validate-document',
+                                                files={'file': ('doc.png', image, 'image/png')})
+                text = lambda: session.post(f'{base_url}/validate-text', json=payload)
+                samples.append({
+                    'ready_seconds': ready_seconds,
+                    'first_document_ms': timed(document),
+                    'first_text_ms': timed(text),
+                    'second_document_ms': timed(document),
+                    'second_text_ms': timed(text)
+                })
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        results['warm' if warmup == '1' else 'cold'] = {
+            key: float(np.median([sample[key] for sample in samples])) for key in samples[0]
+        }
+
+    print(f"📊 Primeira requisição após subir o servidor (mediana de {runs} execuções):")
+    print("   modo   pronto em   1º documento   1º texto   2º documento   2º texto")
+    for mode, r in results.items():
+        print(f"   {mode:5s} {r['ready_seconds']:8.2f}s {r['first_document_ms']:11.1f} ms "
+              f"{r['first_text_ms']:7.1f} ms {r['second_document_ms']:11.1f} ms {r['second_text_ms']:7.1f} ms")
+
+    return results
+
+def benchmark_responses(n_requests=200, doc_kb=200):
+    """Bytes na rede e latência (p50/p99) de /validate-text por modo de texto e gzip"""
+    import contextlib
+    import io
+    import warnings
+    from fastapi.testclient import TestClient
+
+    import app_simple
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cda_valido.txt')) as f:
+        base_text = f.read()
+    text = (base_text + '\n') * max(1, doc_kb * 1024 // (len(base_text) + 1))
+
+    # Serialização isolada: json da biblioteca padrão vs orjson
+    body = {'is_valid': True, 'confidence': 0.97, 'extracted_text': text,
+            'processed_at': '2024-01-01T00:00:00'}
+    encoders = {'json': lambda: json.dumps(body).encode('utf-8')}
+    if app_simple.orjson is not None:
+        encoders['orjson'] = lambda: app_simple.orjson.dumps(body)
+    encode_ms = {}
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        for _ in range(50):
+            encode()
+        encode_ms[name] = (time.perf_counter() - start) / 50 * 1000
+
+    results = []
+    # Logs de análise por requisição não interessam aqui
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings(), \
+            TestClient(app_simple.app) as client:
+        warnings.simplefilter('ignore')
+        if app_simple.model is None:
+            raise RuntimeError("Modelo não carregado. Execute: python model_trainer.py")
+        for text_mode in ('full', 'truncated', 'none'):
+            for encoding in ('identity', 'gzip'):
+                latencies, wire_bytes = [], 0
+                for _ in range(n_requests):
+                    start = time.perf_counter()
+                    response = client.post('/validate-text', params={'text_mode': text_mode},
+                                           json={'text': text}, headers={'Accept-Encoding': encoding})
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                    wire_bytes = int(response.headers['content-length'])
+                results.append({
+                    'text_mode': text_mode,
+                    'encoding': encoding,
+                    'response_bytes': wire_bytes,
+                    'p50_ms': float(np.percentile(latencies, 50) * 1000),
+                    'p99_ms': float(np.percentile(latencies, 99) * 1000)
+                })
+
+    print(f"📊 Serialização da resposta ({len(text) / 1024:.0f} KB de texto):")
+    for name, ms in encode_ms.items():
+        print(f"   {name:8s} {ms:7.2f} ms")
+    print(f"📊 /validate-text ({n_requests} requisições por linha):")
+    print("   modo        encoding      bytes     p50      p99")
+    for r in results:
+        print(f"   {r['text_mode']:10s}  {r['encoding']:8s} {r['response_bytes']:10,d} "
+              f"{r['p50_ms']:6.1f}ms {r['p99_ms']:6.1f}ms")
+
+    return {'encode_ms': encode_ms, 'requests': results}
+
+def _logging_run(n_requests):
+    """Executa /validate-text em processo com o nível de log do ambiente (roda em subprocesso)
+
+    Mede dois textos: um aceito pelas regras (passa pelo modelo) e um
+    rejeitado pelas regras (só análise de texto, onde o log pesa mais).
+    """
+    import warnings
+    from fastapi.testclient import TestClient
+
+    import app_simple
+
+    warnings.simplefilter('ignore')
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cda_valido.txt')) as f:
+        payloads = {
+            'model': {'text': f.read()},
+            'rules': {'text': SyntheticDataGenerator(seed=0)._generate_curriculum_text()}
+        }
+
+    result = {}
+    with TestClient(app_simple.app) as client:
+        for path, payload in payloads.items():
+            for _ in range(20):
+                client.post('/validate-text', params={'text_mode': 'none'}, json=payload)
+            start = time.perf_counter()
+            for _ in range(n_requests):
+                client.post('/validate-text', params={'text_mode': 'none'}, json=payload)
+            result[f'{path}_requests_per_sec'] = n_requests / (time.perf_counter() - start)
+
+    return result
+
+def benchmark_logging(n_requests=1000, levels=('DEBUG', 'INFO')):
+    """Throughput de /validate-text por nível de log, com a saída indo para um arquivo"""
+    import tempfile
+
+    results = []
+    for level in levels:
+        # Sem feature store: toda requisição passa pela análise rigorosa. Saída sem
+        # buffer, como em containers (PYTHONUNBUFFERED=1)
+        env = {**os.environ, 'ML_LOG_LEVEL': level, 'ML_FEATURE_STORE': '0', 'ML_SLOW_REQUEST_MS': '-1',
+               'PYTHONUNBUFFERED': '1'}
+        with tempfile.TemporaryFile() as log_file:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'logging-run', str(n_requests)],
+                stdout=log_file, stderr=subprocess.PIPE, text=True, env=env, check=True
+            ).stderr
+            log_bytes = log_file.seek(0, os.SEEK_END)
+        result = json.loads(output.strip().splitlines()[-1])
+        result.update({'level': level, 'log_bytes_per_request': log_bytes / (2 * n_requests)})
+        results.append(result)
+
+    print(f"📊 /validate-text por nível de log ({n_requests} requisições por texto):")
+    print("   nível    modelo req/s   regras req/s   bytes de log/req")
+    for r in results:
+        print(f"   {r['level']:7s} {r['model_requests_per_sec']:12.1f} {r['rules_requests_per_sec']:14.1f} "
+              f"{r['log_bytes_per_request']:18.1f}")
+
+    return results
+
+# Versão do formato do resultado da suíte; resultados de versões diferentes não são comparados
+SUITE_VERSION = 2
+
+# Diferença mínima (ms) para uma latência contar como regressão: abaixo disso é ruído
+SUITE_MIN_DELTA_MS = 0.5
+
+# Tamanhos de documento para as features: número de textos gerados concatenados
+SUITE_TEXT_SIZES = {'small': 1, 'medium': 15, 'large': 150}
+
+def _samples_ms(call, repeat):
+    """Duração (ms) de `repeat` chamadas de `call`"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def _metric(value, unit, better, gate=True):
+    return {'value': round(float(value), 4), 'unit': unit, 'better': better, 'gate': gate}
+
+def _latency_metrics(metrics, name, samples):
+    metrics[f'{name}.p50_ms'] = _metric(np.percentile(samples, 50), 'ms', 'lower')
+    # p95 de poucas dezenas de amostras é quase a 2ª mais lenta: só informativo
+    metrics[f'{name}.p95_ms'] = _metric(np.percentile(samples, 95), 'ms', 'lower', gate=False)
+
+def _suite_environment():
+    """Máquina e versões que afetam os números (comparar só resultados do mesmo ambiente)"""
+    import platform
+    import sklearn
+
+    try:
+        import pytesseract
+        tesseract = str(pytesseract.get_tesseract_version())
+    except Exception:
+        tesseract = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'tesseract': tesseract,
+        'commit': commit
+    }
+
+def compare_suite(result, baseline, tolerance=0.2):
+    """Compara duas execuções da suíte; retorna as linhas da comparação e as regressões
+
+    Uma métrica com `gate` regride quando piora mais que `tolerance` (fração)
+    no sentido indicado por `better`; latências precisam piorar também mais
+    que `SUITE_MIN_DELTA_MS`. Os p95 aparecem na comparação, mas não
+    reprovam. Métricas presentes só num dos lados são ignoradas.
+    """
+    if baseline.get('suite_version') != result.get('suite_version'):
+        raise ValueError(f"Baseline da suíte v{baseline.get('suite_version')}, resultado v{result.get('suite_version')}")
+    if baseline.get('repeat') != result.get('repeat'):
+        raise ValueError(f"Baseline medido com repeat={baseline.get('repeat')}, resultado com "
+                         f"repeat={result.get('repeat')}")
+
+    rows, regressions = [], []
+    for name, metric in result['metrics'].items():
+        base = baseline['metrics'].get(name)
+        if base is None or not base['value']:
+            continue
+        change = (metric['value'] - base['value']) / base['value']
+        worse = change > tolerance if metric['better'] == 'lower' else change < -tolerance
+        if metric['unit'] == 'ms' and metric['value'] - base['value'] < SUITE_MIN_DELTA_MS:
+            worse = False
+        worse = worse and metric.get('gate', True)
+        row = {'metric': name, 'baseline': base['value'], 'value': metric['value'],
+               'unit': metric['unit'], 'change': change, 'regression': worse,
+               'gate': metric.get('gate', True)}
+        rows.append(row)
+        if worse:
+            regressions.append(row)
+    return rows, regressions
+
+def benchmark_suite(output=None, baseline=None, tolerance=0.2, repeat=30, save_baseline=False):
+    """Suíte offline: features, OCR por classe de imagem, inferência e ponta a ponta na API
+
+    Roda em processo (ASGI via TestClient), sem servidor. O resultado vai para
+    `data/benchmarks/suite-<data>.json`; com `baseline`, cada métrica é
+    comparada ao resultado guardado e as regressões acima de `tolerance` são
+    listadas. Retorna (resultado, regressões).
+    """
+    import contextlib
+    import io
+    import warnings
+    from datetime import datetime
+    from fastapi.testclient import TestClient
+
+    # Sem cache de features nem fila de jobs: cada requisição faz o trabalho completo
+    os.environ.update({'ML_FEATURE_STORE': '0', 'ML_JOBS': '0', 'ML_SLOW_REQUEST_MS': '-1'})
+    import app_simple
+    from ocr_simple import OCRProcessor, synthetic_document_image
+    from scan_corpus import ScanRenderer
+
+    generator = SyntheticDataGenerator(seed=7)
+    base_texts = [generator.generate_valid_document_text() for _ in range(max(SUITE_TEXT_SIZES.values()))]
+    texts = {size: '\n'.join(base_texts[:n]) for size, n in SUITE_TEXT_SIZES.items()}
+    metrics = {}
+
+    # Features (análise de texto + regras) por tamanho de documento
+    for size, text in texts.items():
+        runs = max(3, repeat * 10 // SUITE_TEXT_SIZES[size])
+        samples = _samples_ms(lambda: app_simple.extract_features_from_text(text), runs)
+        metrics[f'features.{size}.docs_per_sec'] = _metric(1000 / np.median(samples), 'docs/s', 'higher')
+        metrics[f'features.{size}.kb_per_sec'] = _metric(
+            len(text.encode('utf-8')) / 1024 / (np.median(samples) / 1000), 'KB/s', 'higher')
+
+    # OCR por classe de imagem: cartão pequeno e páginas A4 a 200 dpi com artefatos crescentes
+    page_text = texts['small']
+    # {classe: (bytes, nome do arquivo com a extensão do formato real)}
+    images = {'card': (synthetic_document_image(["ESCRITURA PUBLICA", "Matricula: 12345", "Propriedade rural"]),
+                       'card.png')}
+    for level in ('clean', 'light', 'heavy'):
+        renderer = ScanRenderer(dpi=200, artifacts=level)
+        data, fmt, _ = renderer.render(page_text, np.random.default_rng(0))
+        images[f'a4_{level}'] = (data, f'a4_{level}.{fmt}')
+    ocr = OCRProcessor()
+    ocr_runs = max(3, repeat // 5)
+    for image_class, (image, filename) in images.items():
+        ocr.process_uploaded_file(image, filename)
+        _latency_metrics(metrics, f'ocr.{image_class}',
+                         _samples_ms(lambda: ocr.process_uploaded_file(image, filename), ocr_runs))
+
+    # Logs de análise por requisição não interessam aqui
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings(), \
+            TestClient(app_simple.app) as client:
+        warnings.simplefilter('ignore')
+        if app_simple.model is None:
+            raise RuntimeError("Modelo não carregado. Execute: python model_trainer.py")
+        current_model = app_simple.model
+
+        # Inferência: uma linha (caminho da requisição) e lote de 1000 linhas
+        rows = [app_simple.extract_features_from_text(text)[0] for text in base_texts]
+        batch = np.array([rows[i % len(rows)] for i in range(1000)], dtype=float)
+        _latency_metrics(metrics, 'inference.single_row',
+                         _samples_ms(lambda: current_model.predict_proba([rows[0]]), repeat * 10))
+        batch_ms = np.median(_samples_ms(lambda: current_model.predict_proba(batch), repeat))
+        metrics['inference.batch_1k.rows_per_sec'] = _metric(1000 / (batch_ms / 1000), 'rows/s', 'higher')
+
+        # Ponta a ponta pela aplicação ASGI
+        def post_text(text):
+            return lambda: client.post('/validate-text', json={'text': text}).raise_for_status()
+
+        def post_document(image, filename):
+            # O tipo do multipart segue o formato real, como num cliente
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            return lambda: client.post('/validate-document',
+                                       files={'file': (filename, image, content_type)}).raise_for_status()
+
+        endpoints = {
+            'api.validate_text.small': post_text(texts['small']),
+            'api.validate_text.large': post_text(texts['large']),
+            'api.validate_document.card': post_document(*images['card']),
+            'api.validate_document.a4_light': post_document(*images['a4_light'])
+        }
+        for name, call in endpoints.items():
+            call()
+            runs = repeat if 'validate_text' in name else max(3, repeat // 5)
+            _latency_metrics(metrics, name, _samples_ms(call, runs))
+
+    result = {
+        'suite_version': SUITE_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'environment': _suite_environment(),
+        'model_version': app_simple.model_version,
+        'repeat': repeat,
+        'metrics': metrics
+    }
+
+    if output is None:
+        output = os.path.join('data', 'benchmarks', f"suite-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"📊 Suíte de benchmarks (repeat={repeat}):")
+    for name, metric in metrics.items():
+        print(f"   {name:45s} {metric['value']:12,.2f} {metric['unit']}")
+    if result['environment']['tesseract'] is None:
+        print("⚠️ Tesseract não encontrado: as métricas de OCR medem só a decodificação")
+    print(f"💾 Resultado em {output}")
+
+    regressions = []
+    if baseline is not None and os.path.exists(baseline) and not save_baseline:
+        with open(baseline) as f:
+            baseline_result = json.load(f)
+        if baseline_result.get('environment', {}).get('cpus') != result['environment']['cpus']:
+            print("⚠️ Baseline medido em outra máquina: compare com cuidado")
+        if baseline_result.get('model_version') != result['model_version']:
+            print(f"⚠️ Baseline com outro modelo ({baseline_result.get('model_version')}): "
+                  "inferência e API não são comparáveis")
+        rows, regressions = compare_suite(result, baseline_result, tolerance)
+        print(f"📊 Comparação com {baseline} (tolerância {tolerance:.0%}):")
+        for row in rows:
+            flag = '❌' if row['regression'] else '  '
+            print(f"   {flag} {row['metric']:45s} {row['baseline']:12,.2f} → {row['value']:12,.2f} "
+                  f"{row['unit']:7s} {row['change']:+7.1%}{'' if row['gate'] else '  (informativo)'}")
+        if regressions:
+            print(f"❌ {len(regressions)} regressão(ões) acima de {tolerance:.0%}")
+        else:
+            print("✅ Nenhuma regressão")
+    elif baseline is not None:
+        os.makedirs(os.path.dirname(baseline) or '.', exist_ok=True)
+        with open(baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Baseline gravado em {baseline}")
+
+    return result, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline de validação")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    features_parser = subparsers.add_parser('features', help="Features escalar vs vetorizado")
+    features_parser.add_argument('--rows', type=int, default=20000)
+
+    storage_parser = subparsers.add_parser('storage', help="Carga do dataset: CSV vs Parquet vs Arrow")
+    storage_parser.add_argument('--rows', type=int, default=10_000_000)
+    storage_parser.add_argument('--path', default='data/bench_storage')
+    storage_parser.add_argument('--keep-files', action='store_true')
+
+    serving_parser = subparsers.add_parser('serving', help="Throughput e memória por número de workers")
+    serving_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    serving_parser.add_argument('--duration', type=float, default=10)
+    serving_parser.add_argument('--concurrency', type=int, default=16)
+
+    responses_parser = subparsers.add_parser('responses', help="Tamanho e latência da resposta por modo de texto")
+    responses_parser.add_argument('--requests', type=int, default=200)
+    responses_parser.add_argument('--doc-kb', type=int, default=200)
+
+    logging_parser = subparsers.add_parser('logging', help="Throughput por nível de log")
+    logging_parser.add_argument('--requests', type=int, default=1000)
+    logging_parser.add_argument('--levels', nargs='+', default=['DEBUG', 'INFO'])
+
+    warmup_parser = subparsers.add_parser('warmup', help="Primeira requisição com e sem aquecimento")
+    warmup_parser.add_argument('--runs', type=int, default=3)
+
+    suite_parser = subparsers.add_parser('suite', help="Suíte offline com resultado em JSON e comparação com baseline")
+    suite_parser.add_argument('--output', default=None, help="Arquivo do resultado (padrão: data/benchmarks/suite-<data>.json)")
+    suite_parser.add_argument('--baseline', default='data/benchmarks/baseline.json',
+                              help="Resultado de referência (gravado na primeira execução)")
+    suite_parser.add_argument('--save-baseline', action='store_true', help="Substitui o baseline por esta execução")
+    suite_parser.add_argument('--tolerance', type=float, default=0.2, help="Piora tolerada por métrica (fração)")
+    suite_parser.add_argument('--repeat', type=int, default=30)
+
+    # Uso interno: uma carga isolada por subprocesso
+    load_parser = subparsers.add_parser('storage-load')
+    load_parser.add_argument('loader', choices=['csv', 'parquet', 'arrow'])
+    load_parser.add_argument('path')
+
+    logging_run_parser = subparsers.add_parser('logging-run')
+    logging_run_parser.add_argument('requests', type=int)
+
+    args = parser.parse_args()
+
+    if args.command == 'features':
+        benchmark_features(args.rows)
+    elif args.command == 'storage':
+        benchmark_storage(args.rows, args.path, args.keep_files)
+    elif args.command == 'serving':
+        benchmark_serving(args.workers, args.duration, args.concurrency)
+    elif args.command == 'responses':
+        benchmark_responses(args.requests, args.doc_kb)
+    elif args.command == 'warmup':
+        benchmark_warmup(args.runs)
+    elif args.command == 'logging':
+        benchmark_logging(args.requests, args.levels)
+    elif args.command == 'suite':
+        try:
+            _, regressions = benchmark_suite(args.output, args.baseline, args.tolerance, args.repeat,
+                                             args.save_baseline)
+        except ValueError as e:
+            print(f"❌ Baseline não comparável: {e}. Rode com --save-baseline para trocá-lo")
+            sys.exit(2)
+        sys.exit(1 if regressions else 0)
+    elif args.command == 'logging-run':
+        print(json.dumps(_logging_run(args.requests)), file=sys.stderr)
+    elif args.command == 'storage-load':
+        print(json.dumps(_load_for_storage_benchmark(args.loader, args.path)))
+
+if __name__ == "__main__":
+    main()
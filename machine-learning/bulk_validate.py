@@ -0,0 +1,228 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from logging_config import configure_logging, get_logger
+
+logger = get_logger('bulk')
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp'}
+TEXT_EXTENSIONS = {'.txt'}
+
+def list_inputs(source):
+    """Arquivos a validar: um diretório (recursivo) ou um manifesto
+
+    O manifesto pode ser JSONL (campo `path` ou `image`, como o de
+    `scan_corpus.py`) ou uma lista com um caminho por linha. Caminhos
+    relativos partem do diretório do manifesto. Os caminhos retornados são
+    absolutos e canônicos (`realpath`): o mesmo arquivo tem a mesma chave no
+    checkpoint vindo de um diretório ou de um manifesto.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS | TEXT_EXTENSIONS:
+                    paths.append(os.path.realpath(os.path.join(root, name)))
+        return paths
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if source.endswith('.jsonl'):
+                entry = json.loads(line)
+                line = entry.get('path') or entry['image']
+            paths.append(os.path.realpath(os.path.join(base_dir, line)))
+    return paths
+
+def read_checkpoint(output_path):
+    """Caminhos já validados no JSONL de saída (canônicos, como em `list_inputs`)
+
+    Resultados `error` (ex.: falha transitória de leitura) não contam: o
+    arquivo é validado de novo e a linha mais recente vale. Uma linha
+    incompleta no fim (processo interrompido no meio da escrita) é removida
+    do arquivo; o documento dela também é validado de novo.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+
+    valid_bytes = 0
+    with open(output_path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                path = os.path.realpath(record['path'])
+            except (ValueError, KeyError):
+                break
+            if record.get('result') == 'error':
+                done.discard(path)
+            else:
+                done.add(path)
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(output_path):
+        logger.warning(f"⚠️ Linha incompleta no fim de {output_path}; descartada")
+        with open(output_path, 'rb+') as f:
+            f.truncate(valid_bytes)
+    return done
+
+def _init_worker(model_version, text_mode, max_text_chars, explain):
+    """Carrega o pipeline da API no processo do pool (uma vez por processo)"""
+    global _app, _options
+    # Um processo Tesseract/BLAS de 1 thread por worker: o paralelismo vem do pool
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+
+    import app_simple
+    if not app_simple.load_model(model_version):
+        raise RuntimeError("Modelo não carregado. Execute: python model_trainer.py")
+    _app = app_simple
+    _options = (text_mode, max_text_chars, explain)
+
+def _validate_file(path):
+    """Valida um arquivo (imagem pelo OCR, `.txt` direto pelas features); retorna a linha do JSONL"""
+    text_mode, max_text_chars, explain = _options
+    start = time.perf_counter()
+    timings, details = {}, {}
+    record = {'path': path}
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        if os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS:
+            body, result, reason = _app.validate_text_content(
+                content.decode('utf-8', errors='replace'), _app.model, _app.model_version, timings,
+                text_mode, max_text_chars, explain
+            )
+        else:
+            body, result, reason = _app.validate_document_content(
+                content, os.path.basename(path), _app.model, _app.model_version, timings, details,
+                text_mode, max_text_chars, explain
+            )
+        record.update(body)
+        record.update({'result': result, 'reason_code': reason, 'model_version': _app.model_version})
+    except Exception as e:
+        record.update({'result': 'error', 'reason_code': 'exception', 'error': str(e)})
+    record['timings_ms'] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+def bulk_validate(source, output_path, workers=None, model_version=None, text_mode='none',
+                  max_text_chars=500, explain=False, restart=False):
+    """Valida todos os arquivos de `source` num pool de processos e grava um JSONL
+
+    Cada resultado é gravado assim que fica pronto (fora de ordem). Arquivos
+    já validados sem erro em `output_path` são pulados, então rodar de novo
+    retoma uma execução interrompida. Retorna o resumo com docs/s e tempo total por etapa.
+    """
+    paths = list_inputs(source)
+    if restart and os.path.exists(output_path):
+        os.remove(output_path)
+    done = read_checkpoint(output_path)
+    pending = [path for path in paths if path not in done]
+    workers = workers or os.cpu_count() or 1
+    if model_version is None:
+        # Todos os processos usam a mesma versão, mesmo que outra seja promovida durante o lote
+        from model_registry import ModelRegistry
+        model_version = ModelRegistry('models').current_version()
+
+    logger.info(f"📂 {len(paths)} arquivos, {len(paths) - len(pending)} já validados, {len(pending)} pendentes "
+                f"({workers} processos)")
+
+    summary = {
+        'files': len(paths),
+        'skipped': len(paths) - len(pending),
+        'processed': 0,
+        'results': {},
+        'stage_seconds': {},
+        'document_seconds': 0.0
+    }
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    start = time.perf_counter()
+
+    # spawn: os processos do pool não herdam a thread de logging do processo principal
+    context = multiprocessing.get_context('spawn')
+    with open(output_path, 'a', encoding='utf-8') as output, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                initargs=(model_version, text_mode, max_text_chars, explain)) as executor:
+        # Poucos arquivos em voo por processo: a memória não cresce com o tamanho do lote
+        queue = iter(pending)
+        in_flight = set()
+        while True:
+            while len(in_flight) < workers * 2:
+                path = next(queue, None)
+                if path is None:
+                    break
+                in_flight.add(executor.submit(_validate_file, path))
+            if not in_flight:
+                break
+
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                output.flush()
+
+                summary['processed'] += 1
+                summary['results'][record['result']] = summary['results'].get(record['result'], 0) + 1
+                summary['document_seconds'] += record['seconds']
+                for stage, ms in record['timings_ms'].items():
+                    summary['stage_seconds'][stage] = summary['stage_seconds'].get(stage, 0.0) + ms / 1000
+
+                if summary['processed'] % 500 == 0:
+                    os.fsync(output.fileno())
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"⏳ {summary['processed']}/{len(pending)} "
+                                f"({summary['processed'] / elapsed:.1f} docs/s)")
+        os.fsync(output.fileno())
+
+    elapsed = time.perf_counter() - start
+    summary.update({
+        'seconds': round(elapsed, 3),
+        'docs_per_sec': summary['processed'] / elapsed if elapsed > 0 else 0.0,
+        'stage_seconds': {stage: round(seconds, 3) for stage, seconds in summary['stage_seconds'].items()},
+        'document_seconds': round(summary['document_seconds'], 3),
+        'finished_at': datetime.now().isoformat()
+    })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Validação em lote de documentos (imagens e .txt)")
+    parser.add_argument('source', help="Diretório ou manifesto (JSONL ou um caminho por linha)")
+    parser.add_argument('--output', default='bulk_results.jsonl', help="JSONL de resultados (também é o checkpoint)")
+    parser.add_argument('--workers', type=int, default=None, help="Processos (padrão: núcleos)")
+    parser.add_argument('--model-version', default=None, help="Versão do registro (padrão: a atual)")
+    parser.add_argument('--text-mode', default='none', choices=['full', 'truncated', 'none'])
+    parser.add_argument('--max-text-chars', type=int, default=500)
+    parser.add_argument('--explain', action='store_true', help="Inclui a análise das regras rigorosas")
+    parser.add_argument('--restart', action='store_true', help="Ignora resultados anteriores e recomeça")
+    args = parser.parse_args()
+
+    configure_logging()
+    try:
+        summary = bulk_validate(args.source, args.output, args.workers, args.model_version, args.text_mode,
+                                args.max_text_chars, args.explain, args.restart)
+    except KeyboardInterrupt:
+        print(f"⏸️ Interrompido. Os resultados gravados ficam em {args.output}; rode de novo para retomar")
+        raise SystemExit(130)
+
+    print(f"✅ {summary['processed']} documentos em {summary['seconds']:.1f}s "
+          f"({summary['docs_per_sec']:.1f} docs/s); {summary['skipped']} já validados antes")
+    print(f"📊 Resultados: {summary['results']}")
+    if summary['stage_seconds']:
+        print("⏱️ Tempo total por etapa (soma dos processos):")
+        for stage, seconds in sorted(summary['stage_seconds'].items(), key=lambda item: -item[1]):
+            print(f"   {stage:16s} {seconds:10.2f}s")
+    print(f"💾 Resultados em {args.output}")
+
+if __name__ == "__main__":
+    main()
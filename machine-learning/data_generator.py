@@ -2,11 +2,122 @@ import pandas as pd
 import numpy as np
 import json
 import random
+import shutil
+from itertools import islice
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import os
+import re
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Tamanho fixo dos shards: a divisão não depende do número de workers,
+# então a saída é a mesma para qualquer quantidade de processos
+DEFAULT_SHARD_SIZE = 50_000
+
+# Colunas numéricas consumidas pelo DocumentValidatorTrainer
+FEATURE_COLUMNS = [
+    'legal_terms_count', 'has_dates', 'text_length',
+    'number_count', 'special_chars_count', 'legal_density',
+    'keywords_present', 'has_coordinates', 'uppercase_ratio'
+]
+
+# Versão do cálculo de `generate_features`/`generate_features_frame`; mude ao
+# alterar as features para que o feature store não reaproveite valores antigos
+FEATURE_SCHEMA_VERSION = 'generator-v1'
+
+def dataset_schema():
+    """Schema Arrow tipado do dataset completo (Parquet)"""
+    return pa.schema([
+        ('id', pa.string()),
+        ('text', pa.string()),
+        ('is_valid', pa.bool_()),
+        ('document_type', pa.string()),
+        ('generated_at', pa.string()),
+        ('legal_terms_count', pa.int32()),
+        ('has_dates', pa.int8()),
+        ('text_length', pa.int32()),
+        ('number_count', pa.int32()),
+        ('special_chars_count', pa.int32()),
+        ('legal_density', pa.float64()),
+        ('keywords_present', pa.int8()),
+        ('has_coordinates', pa.int8()),
+        ('uppercase_ratio', pa.float64())
+    ])
+
+def features_schema():
+    """Schema do arquivo só de features (Arrow IPC, mapeável em memória)
+
+    As features ficam numa lista de tamanho fixo float32, ou seja, uma matriz
+    linha-a-linha contígua que o trainer lê sem cópia e sem a coluna de texto.
+    """
+    return pa.schema(
+        [('features', pa.list_(pa.float32(), len(FEATURE_COLUMNS))), ('is_valid', pa.int8())],
+        metadata={'feature_columns': json.dumps(FEATURE_COLUMNS)}
+    )
+
+class DatasetWriter:
+    """Grava blocos de amostras em CSV ou Parquet e, opcionalmente, num arquivo Arrow só de features"""
+
+    def __init__(self, path, features_path=None):
+        self.path = path
+        self.features_path = features_path
+        self.format = 'parquet' if path.endswith('.parquet') else 'csv'
+        self.rows = 0
+        
+        if (self.format == 'parquet' or features_path) and pa is None:
+            raise ImportError("pyarrow é necessário para saída Parquet/Arrow (pip install pyarrow)")
+        
+        if self.format == 'parquet':
+            self._writer = pq.ParquetWriter(path, dataset_schema())
+        else:
+            self._writer = open(path, 'w', encoding='utf-8', newline='')
+        self._features_writer = (
+            pa.ipc.new_file(features_path, features_schema()) if features_path else None
+        )
+
+    def write(self, df):
+        """Grava um bloco (DataFrame com texto e features)"""
+        if self.format == 'parquet':
+            table = pa.Table.from_pandas(df, schema=dataset_schema(), preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            df.to_csv(self._writer, index=False, header=(self.rows == 0))
+        
+        if self._features_writer is not None:
+            self._features_writer.write_batch(_features_batch(df))
+        
+        self.rows += len(df)
+
+    def close(self):
+        self._writer.close()
+        if self._features_writer is not None:
+            self._features_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _features_batch(df):
+    """Converte as colunas de features de um bloco em RecordBatch float32"""
+    matrix = df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    features = pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), len(FEATURE_COLUMNS))
+    labels = pa.array(df['is_valid'].to_numpy(dtype=np.int8))
+    return pa.RecordBatch.from_arrays([features, labels], schema=features_schema())
 
 class SyntheticDataGenerator:
-    def __init__(self):
+    def __init__(self, seed=None, reference_time=None):
+        # Estado aleatório próprio (não usa o `random` global)
+        self.rng = random.Random(seed)
+        self.reference_time = reference_time or datetime.now()
+
         self.legal_terms = [
             "escritura", "propriedade", "imóvel", "registro", "cartório",
             "matrícula", "lote", "quadra", "município", "comarca",
@@ -26,6 +137,14 @@ class SyntheticDataGenerator:
             "Rio Grande do Sul", "Goiás", "Mato Grosso", "Ceará", "Pernambuco"
         ]
         
+        # Padrões usados nas features (compartilhados pelos caminhos escalar e vetorizado)
+        self.date_patterns = [
+            r'\d{1,2}/\d{1,2}/\d{4}', r'\d{4}',
+            r'(?:janeiro|fevereiro|março|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro)'
+        ]
+        self.keywords = ['escritura', 'propriedade', 'matrícula', 'cartório', 'registro']
+        self.coord_pattern = r'-?\d{1,2}\.\d+°[NS]?\s*-?\d{1,2}\.\d+°[WE]?'
+        
         self.invalid_indicators = [
             "texto_ilegivel", "documento_rasgado", "sem_assinatura",
             "data_invalida", "informacoes_incompletas", "formato_incorreto",
@@ -34,29 +153,29 @@ class SyntheticDataGenerator:
 
     def generate_valid_document_text(self):
         """Gera texto de documento válido"""
-        location = random.choice(self.locations)
-        doc_type = random.choice(self.document_types)
+        location = self.rng.choice(self.locations)
+        doc_type = self.rng.choice(self.document_types)
         
         # Data aleatória nos últimos 50 anos
-        start_date = datetime.now() - timedelta(days=50*365)
-        random_date = start_date + timedelta(days=random.randint(0, 50*365))
+        start_date = self.reference_time - timedelta(days=50*365)
+        random_date = start_date + timedelta(days=self.rng.randint(0, 50*365))
         
         text_templates = [
-            f"ESCRITURA PÚBLICA DE COMPRA E VENDA. Saibam quantos este público instrumento virem que no ano de {random_date.year}, aos {random_date.day} dias do mês de {random_date.strftime('%B')}, nesta cidade de {location}, Estado de São Paulo, Brasil, perante mim, Tabelião, compareceram como outorgante vendedor JOÃO DA SILVA, brasileiro, casado, proprietário rural, portador da Cédula de Identidade RG nº 12.345.678-9, inscrito no CPF sob nº 123.456.789-00, residente e domiciliado na propriedade rural denominada 'Fazenda Santa Rita', situada no município de {location}, matrícula nº {random.randint(10000, 99999)}, área de {random.randint(10, 1000)} hectares.",
+            f"ESCRITURA PÚBLICA DE COMPRA E VENDA. Saibam quantos este público instrumento virem que no ano de {random_date.year}, aos {random_date.day} dias do mês de {random_date.strftime('%B')}, nesta cidade de {location}, Estado de São Paulo, Brasil, perante mim, Tabelião, compareceram como outorgante vendedor JOÃO DA SILVA, brasileiro, casado, proprietário rural, portador da Cédula de Identidade RG nº 12.345.678-9, inscrito no CPF sob nº 123.456.789-00, residente e domiciliado na propriedade rural denominada 'Fazenda Santa Rita', situada no município de {location}, matrícula nº {self.rng.randint(10000, 99999)}, área de {self.rng.randint(10, 1000)} hectares.",
             
-            f"CERTIDÃO DE PROPRIEDADE expedida pelo Cartório de Registro de Imóveis da {random.randint(1, 10)}ª Circunscrição de {location}. Certifico que, revendo os livros de registro desta serventia, neles consta matriculado sob o nº {random.randint(10000, 99999)}, um imóvel rural denominado Sítio Boa Vista, com área de {random.randint(5, 100)} hectares, situado no distrito de {location}, confrontando ao Norte com propriedade de Maria Santos, ao Sul com estrada municipal, ao Leste com córrego das Pedras e ao Oeste com propriedade de José Oliveira.",
+            f"CERTIDÃO DE PROPRIEDADE expedida pelo Cartório de Registro de Imóveis da {self.rng.randint(1, 10)}ª Circunscrição de {location}. Certifico que, revendo os livros de registro desta serventia, neles consta matriculado sob o nº {self.rng.randint(10000, 99999)}, um imóvel rural denominado Sítio Boa Vista, com área de {self.rng.randint(5, 100)} hectares, situado no distrito de {location}, confrontando ao Norte com propriedade de Maria Santos, ao Sul com estrada municipal, ao Leste com córrego das Pedras e ao Oeste com propriedade de José Oliveira.",
             
-            f"MEMORIAL DESCRITIVO da propriedade rural situada no município de {location}, comarca de {location}, Estado de São Paulo, com área total de {random.randint(20, 500)} hectares, {random.randint(10, 99)} ares e {random.randint(10, 99)} centiares, registrada sob matrícula nº {random.randint(10000, 99999)} no Cartório de Registro de Imóveis. Inicia-se a descrição no ponto P1, situado nas coordenadas geográficas {random.uniform(-25, -20):.6f}°S e {random.uniform(-50, -45):.6f}°W."
+            f"MEMORIAL DESCRITIVO da propriedade rural situada no município de {location}, comarca de {location}, Estado de São Paulo, com área total de {self.rng.randint(20, 500)} hectares, {self.rng.randint(10, 99)} ares e {self.rng.randint(10, 99)} centiares, registrada sob matrícula nº {self.rng.randint(10000, 99999)} no Cartório de Registro de Imóveis. Inicia-se a descrição no ponto P1, situado nas coordenadas geográficas {self.rng.uniform(-25, -20):.6f}°S e {self.rng.uniform(-50, -45):.6f}°W."
         ]
         
-        base_text = random.choice(text_templates)
+        base_text = self.rng.choice(text_templates)
         
         # Adiciona termos legais aleatórios
-        num_terms = random.randint(3, 8)
-        selected_terms = random.sample(self.legal_terms, num_terms)
+        num_terms = self.rng.randint(3, 8)
+        selected_terms = self.rng.sample(self.legal_terms, num_terms)
         
         for term in selected_terms:
-            if random.random() > 0.5:
+            if self.rng.random() > 0.5:
                 base_text += f" {term.upper()}"
         
         return base_text
@@ -64,31 +183,32 @@ class SyntheticDataGenerator:
     def generate_invalid_document_text(self):
         """Gera texto de documento inválido (currículos, textos aleatórios, etc)"""
         
-        invalid_types = [
-            self._generate_curriculum_text(),
-            self._generate_random_text(),
-            self._generate_commercial_text(),
-            self._generate_academic_text(),
-            self._generate_corrupted_text()
+        # Sorteia a variante antes de renderizar: só o texto escolhido é gerado
+        invalid_generators = [
+            self._generate_curriculum_text,
+            self._generate_random_text,
+            self._generate_commercial_text,
+            self._generate_academic_text,
+            self._generate_corrupted_text
         ]
         
-        return random.choice(invalid_types)
+        return self.rng.choice(invalid_generators)()
     
     def _generate_curriculum_text(self):
         """Gera currículo - documento inválido para AFI"""
-        nome = random.choice(['João Silva', 'Maria Santos', 'Pedro Costa'])
+        nome = self.rng.choice(['João Silva', 'Maria Santos', 'Pedro Costa'])
         
         return f"""CURRÍCULO PROFISSIONAL
 
 Nome: {nome}
-Formação: {random.choice(['Engenharia', 'Administração', 'Contabilidade'])}
+Formação: {self.rng.choice(['Engenharia', 'Administração', 'Contabilidade'])}
 
 EXPERIÊNCIA PROFISSIONAL:
 - Analista (2020-2022)
 - Coordenador (2022-2024)
 
 EDUCAÇÃO:
-- Graduação em {random.choice(['Economia', 'Gestão', 'Tecnologia'])}
+- Graduação em {self.rng.choice(['Economia', 'Gestão', 'Tecnologia'])}
 - Curso de especialização
 
 HABILIDADES:
@@ -103,8 +223,8 @@ HABILIDADES:
 Este documento fala sobre assuntos urbanos e não tem relação 
 com propriedades rurais ou documentação de terra.
 
-Apenas texto comum com números: {random.randint(1000, 9999)}
-Data: {random.randint(1, 28)}/{random.randint(1, 12)}/2024
+Apenas texto comum com números: {self.rng.randint(1000, 9999)}
+Data: {self.rng.randint(1, 28)}/{self.rng.randint(1, 12)}/2024
 
 Mais texto irrelevante para agricultura."""
 
@@ -116,7 +236,7 @@ Empresa: Tech Solutions LTDA
 CNPJ: 12.345.678/0001-90
 
 Prestação de serviços de consultoria
-Valor: R$ {random.randint(5000, 50000):,.2f}
+Valor: R$ {self.rng.randint(5000, 50000):,.2f}
 
 Local: Centro comercial - São Paulo/SP
 Sem relação com atividades rurais"""
@@ -125,16 +245,16 @@ Sem relação com atividades rurais"""
         """Gera documento acadêmico"""
         return f"""CERTIFICADO UNIVERSITÁRIO
 
-Curso de {random.choice(['Engenharia', 'Medicina', 'Direito'])}
-Carga horária: {random.randint(3000, 4000)}h
-Nota: {random.uniform(7.0, 10.0):.1f}
+Curso de {self.rng.choice(['Engenharia', 'Medicina', 'Direito'])}
+Carga horária: {self.rng.randint(3000, 4000)}h
+Nota: {self.rng.uniform(7.0, 10.0):.1f}
 
-Formatura: {random.randint(1, 28)}/{random.randint(1, 12)}/2024
+Formatura: {self.rng.randint(1, 28)}/{self.rng.randint(1, 12)}/2024
 Universidade Federal"""
 
     def _generate_corrupted_text(self):
         """Gera texto corrompido"""
-        return random.choice([
+        return self.rng.choice([
             "texto ilegível ######### @@@@@@ $$$$$$",
             "doc*mento danific#do sem inf$rmaçõ&s",
             "DOCUMENTO SEM DATA 99/99/9999",
@@ -151,9 +271,7 @@ Universidade Federal"""
         features['legal_terms_count'] = legal_count
         
         # Presença de datas
-        import re
-        date_patterns = [r'\d{1,2}/\d{1,2}/\d{4}', r'\d{4}', r'(janeiro|fevereiro|março|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro)']
-        has_dates = any(re.search(pattern, text.lower()) for pattern in date_patterns)
+        has_dates = any(re.search(pattern, text.lower()) for pattern in self.date_patterns)
         features['has_dates'] = int(has_dates)
         
         # Comprimento do texto
@@ -171,12 +289,10 @@ Universidade Federal"""
         features['legal_density'] = legal_count / max(len(words), 1)
         
         # Presença de palavras-chave específicas
-        keywords = ['escritura', 'propriedade', 'matrícula', 'cartório', 'registro']
-        features['keywords_present'] = sum(1 for kw in keywords if kw.lower() in text.lower())
+        features['keywords_present'] = sum(1 for kw in self.keywords if kw.lower() in text.lower())
         
         # Presença de coordenadas geográficas
-        coord_pattern = r'-?\d{1,2}\.\d+°[NS]?\s*-?\d{1,2}\.\d+°[WE]?'
-        features['has_coordinates'] = int(bool(re.search(coord_pattern, text)))
+        features['has_coordinates'] = int(bool(re.search(self.coord_pattern, text)))
         
         # Razão maiúsculas/minúsculas (documentos legais têm padrão específico)
         if len(text) > 0:
@@ -186,76 +302,320 @@ Universidade Federal"""
         
         return features
 
+    def generate_features_frame(self, texts):
+        """Versão vetorizada de `generate_features` para uma coluna de textos
+
+        Recebe uma `pd.Series` (ou lista) de textos e retorna um DataFrame com
+        as mesmas colunas e os mesmos valores do caminho escalar.
+        """
+        texts = pd.Series(texts, dtype=object).reset_index(drop=True)
+        lower = texts.str.lower()
+        
+        legal_count = sum(lower.str.contains(term.lower(), regex=False).astype(np.int64)
+                          for term in self.legal_terms)
+        
+        # Como no `any()` escalar, cada padrão só é testado nas linhas ainda sem data
+        has_dates = np.zeros(len(texts), dtype=bool)
+        for pattern in self.date_patterns:
+            pending = ~has_dates
+            if not pending.any():
+                break
+            has_dates[pending] = lower[pending].str.contains(pattern, regex=True).to_numpy(dtype=bool)
+        
+        # O padrão de coordenadas exige '°': a regex só roda nas linhas que o contêm
+        has_coordinates = texts.str.contains('°', regex=False).to_numpy(dtype=bool, copy=True)
+        has_coordinates[has_coordinates] = (
+            texts[has_coordinates].str.contains(self.coord_pattern, regex=True).to_numpy(dtype=bool)
+        )
+        
+        text_length = texts.str.len().astype(np.int64)
+        # `\S+` segue a mesma definição de espaço de `str.split()`
+        word_count = texts.str.count(r'\S+').astype(np.int64)
+        
+        features = pd.DataFrame({
+            'legal_terms_count': legal_count,
+            'has_dates': has_dates.astype(np.int64),
+            'text_length': text_length,
+            'number_count': texts.str.count(r'\d+').astype(np.int64),
+            'special_chars_count': texts.str.count(r'[#@$%&*|]').astype(np.int64),
+            'legal_density': legal_count / np.maximum(word_count, 1),
+            'keywords_present': sum(lower.str.contains(kw.lower(), regex=False).astype(np.int64)
+                                    for kw in self.keywords),
+            'has_coordinates': has_coordinates.astype(np.int64),
+            'uppercase_ratio': _uppercase_ratio(texts, text_length.to_numpy())
+        })
+        
+        return features
+
+    def _build_sample(self, index, is_valid, with_features=True):
+        """Gera uma amostra (texto + features) na posição global `index`"""
+        if is_valid:
+            text = self.generate_valid_document_text()
+            document_type = self.rng.choice(self.document_types)
+        else:
+            text = self.generate_invalid_document_text()
+            document_type = 'invalid'
+        features = self.generate_features(text, is_valid) if with_features else {}
+
+        return {
+            'id': f'doc_{index+1:04d}',
+            'text': text,
+            'is_valid': is_valid,
+            'document_type': document_type,
+            'generated_at': self.reference_time.isoformat(),
+            **features
+        }
+
+    def iter_samples(self, n_samples=1000, start=0, stop=None, with_features=True):
+        """Gera amostras sob demanda, uma por vez
+
+        Mantém o layout do dataset completo (70% válidos seguidos de 30%
+        inválidos); `start`/`stop` permitem gerar só um intervalo de índices.
+        Com `with_features=False` só o texto é gerado (features calculadas
+        depois, em bloco, por `write_samples(featurize=True)`).
+        """
+        n_valid = int(n_samples * 0.7)
+        stop = n_samples if stop is None else min(stop, n_samples)
+        
+        for i in range(start, stop):
+            yield self._build_sample(i, i < n_valid, with_features)
+
     def generate_dataset(self, n_samples=1000):
         """Gera dataset completo"""
-        data = []
-        
         # 70% documentos válidos, 30% inválidos
         n_valid = int(n_samples * 0.7)
         n_invalid = n_samples - n_valid
         
-        print(f"Gerando {n_valid} documentos válidos...")
-        for i in range(n_valid):
-            text = self.generate_valid_document_text()
-            features = self.generate_features(text, True)
-            
-            sample = {
-                'id': f'doc_{i+1:04d}',
-                'text': text,
-                'is_valid': True,
-                'document_type': random.choice(self.document_types),
-                'generated_at': datetime.now().isoformat(),
-                **features
-            }
-            data.append(sample)
-        
-        print(f"Gerando {n_invalid} documentos inválidos...")
-        for i in range(n_invalid):
-            text = self.generate_invalid_document_text()
-            features = self.generate_features(text, False)
-            
-            sample = {
-                'id': f'doc_{n_valid+i+1:04d}',
-                'text': text,
-                'is_valid': False,
-                'document_type': 'invalid',
-                'generated_at': datetime.now().isoformat(),
-                **features
-            }
-            data.append(sample)
-        
-        return data
-
-    def save_data(self, data, base_path='data'):
-        """Salva dados em CSV e JSON"""
+        print(f"Gerando {n_valid} documentos válidos e {n_invalid} inválidos...")
+        return list(self.iter_samples(n_samples))
+
+    def write_samples(self, samples, path, chunk_size=10_000, featurize=False, features_path=None):
+        """Grava amostras em CSV ou Parquet (pela extensão) em blocos de `chunk_size`
+
+        Consome qualquer iterável (ex.: `iter_samples`), então a memória usada
+        é limitada pelo tamanho do bloco e não pelo tamanho do dataset.
+        Com `featurize=True` as features de cada bloco são calculadas pelo
+        caminho vetorizado; `features_path` grava também o arquivo Arrow só
+        de features.
+        """
+        samples = iter(samples)
+        
+        with DatasetWriter(path, features_path) as writer:
+            while True:
+                chunk = list(islice(samples, chunk_size))
+                if not chunk:
+                    break
+                df = pd.DataFrame(chunk)
+                if featurize:
+                    df = pd.concat([df, self.generate_features_frame(df['text'])], axis=1)
+                writer.write(df)
+        
+        return writer.rows
+
+    def generate_dataset_parallel(self, n_samples=1000, n_workers=None, seed=None,
+                                  base_path='data', shard_size=DEFAULT_SHARD_SIZE,
+                                  output_format='csv', feature_file=False):
+        """Gera dataset em shards paralelos, reprodutível para qualquer número de workers
+
+        Cada shard usa uma seed derivada de (seed, índice do shard) e é gravado
+        em arquivo próprio; os shards são concatenados em ordem no arquivo
+        final, sem manter o dataset inteiro em memória.
+        """
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        n_workers = n_workers or os.cpu_count() or 1
+        os.makedirs(base_path, exist_ok=True)
+        shard_dir = os.path.join(base_path, 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+
+        tasks = []
+        for shard_index, start in enumerate(range(0, n_samples, shard_size)):
+            stop = min(start + shard_size, n_samples)
+            shard_path = os.path.join(shard_dir, f'shard_{shard_index:05d}.{output_format}')
+            shard_features_path = (
+                os.path.join(shard_dir, f'shard_{shard_index:05d}.arrow') if feature_file else None
+            )
+            tasks.append((seed, shard_index, start, stop, n_samples,
+                          self.reference_time, shard_path, shard_features_path))
+
+        print(f"Gerando {n_samples} documentos em {len(tasks)} shards "
+              f"({n_workers} workers, seed={seed})...")
+
+        dataset_path = os.path.join(base_path, f'synthetic_data.{output_format}')
+        features_path = os.path.join(base_path, 'synthetic_features.arrow') if feature_file else None
+        if n_workers == 1:
+            _merge_shards(map(_generate_shard, tasks), dataset_path, features_path)
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                # map preserva a ordem dos shards
+                _merge_shards(executor.map(_generate_shard, tasks), dataset_path, features_path)
+
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        print(f"Dados salvos em: {dataset_path}")
+        if features_path:
+            print(f"Features salvas em: {features_path}")
+
+        return dataset_path
+
+    def save_data(self, data, base_path='data', formats=('csv',), feature_file=False,
+                  pretty_json=False):
+        """Salva dados nos formatos pedidos (csv, parquet, json)
+
+        O JSON é opcional e compacto por padrão; `pretty_json=True` grava
+        indentado. `feature_file=True` grava também `synthetic_features.arrow`.
+        """
         os.makedirs(base_path, exist_ok=True)
         
         # Converter para DataFrame
         df = pd.DataFrame(data)
         
         # Salvar CSV
-        csv_path = os.path.join(base_path, 'synthetic_data.csv')
-        df.to_csv(csv_path, index=False, encoding='utf-8')
-        print(f"Dados salvos em: {csv_path}")
+        if 'csv' in formats:
+            csv_path = os.path.join(base_path, 'synthetic_data.csv')
+            df.to_csv(csv_path, index=False, encoding='utf-8')
+            print(f"Dados salvos em: {csv_path}")
+        
+        # Salvar Parquet (colunas tipadas) e/ou arquivo só de features
+        if 'parquet' in formats or feature_file:
+            parquet_path = os.path.join(base_path, 'synthetic_data.parquet')
+            features_path = (
+                os.path.join(base_path, 'synthetic_features.arrow') if feature_file else None
+            )
+            if 'parquet' in formats:
+                with DatasetWriter(parquet_path, features_path) as writer:
+                    writer.write(df)
+                print(f"Dados salvos em: {parquet_path}")
+            else:
+                with pa.ipc.new_file(features_path, features_schema()) as writer:
+                    writer.write_batch(_features_batch(df))
+            if features_path:
+                print(f"Features salvas em: {features_path}")
         
         # Salvar JSON
-        json_path = os.path.join(base_path, 'synthetic_data.json')
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        print(f"Dados salvos em: {json_path}")
+        if 'json' in formats:
+            json_path = os.path.join(base_path, 'synthetic_data.json')
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2 if pretty_json else None, ensure_ascii=False)
+            print(f"Dados salvos em: {json_path}")
         
         return df
 
+_UPPERCASE_TABLE = np.zeros(0, dtype=bool)
+
+def _uppercase_ratio(texts, lengths):
+    """Razão de maiúsculas por texto usando uma tabela de `str.isupper` por code point"""
+    global _UPPERCASE_TABLE
+    
+    codepoints = np.frombuffer(
+        ''.join(texts).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32
+    )
+    if codepoints.size and codepoints.max() >= len(_UPPERCASE_TABLE):
+        size = max(int(codepoints.max()) + 1, 0x10000)
+        _UPPERCASE_TABLE = np.array([chr(c).isupper() for c in range(size)], dtype=bool)
+    
+    # Soma acumulada permite contar por texto, inclusive textos vazios
+    upper_cumsum = np.concatenate(([0], np.cumsum(_UPPERCASE_TABLE[codepoints], dtype=np.int64)))
+    ends = np.cumsum(lengths)
+    upper_count = upper_cumsum[ends] - upper_cumsum[ends - lengths]
+    
+    return upper_count / np.maximum(lengths, 1)
+
+def derive_shard_seed(seed, shard_index):
+    """Deriva a seed de um shard de forma estável a partir da seed principal"""
+    return int(np.random.SeedSequence([seed, shard_index]).generate_state(1)[0])
+
+def _generate_shard(task):
+    """Gera um shard e grava em disco (executado em processo separado)"""
+    (seed, shard_index, start, stop, n_samples, reference_time,
+     shard_path, shard_features_path) = task
+    generator = SyntheticDataGenerator(
+        seed=derive_shard_seed(seed, shard_index),
+        reference_time=reference_time
+    )
+    samples = generator.iter_samples(n_samples, start, stop, with_features=False)
+    generator.write_samples(samples, shard_path, featurize=True,
+                            features_path=shard_features_path)
+    return shard_path, shard_features_path
+
+def _merge_shards(shard_results, dataset_path, features_path=None):
+    """Concatena os shards em ordem, um de cada vez"""
+    dataset_writer = None
+    features_writer = None
+    
+    try:
+        for i, (shard_path, shard_features_path) in enumerate(shard_results):
+            if dataset_path.endswith('.parquet'):
+                if dataset_writer is None:
+                    dataset_writer = pq.ParquetWriter(dataset_path, dataset_schema())
+                dataset_writer.write_table(pq.read_table(shard_path))
+            else:
+                # CSV: cópia direta dos bytes, mantendo apenas o primeiro cabeçalho
+                if dataset_writer is None:
+                    dataset_writer = open(dataset_path, 'wb')
+                with open(shard_path, 'rb') as shard:
+                    header = shard.readline()
+                    if i == 0:
+                        dataset_writer.write(header)
+                    shutil.copyfileobj(shard, dataset_writer)
+            os.remove(shard_path)
+            
+            if features_path:
+                if features_writer is None:
+                    features_writer = pa.ipc.new_file(features_path, features_schema())
+                with pa.memory_map(shard_features_path) as source:
+                    reader = pa.ipc.open_file(source)
+                    for batch_index in range(reader.num_record_batches):
+                        features_writer.write_batch(reader.get_batch(batch_index))
+                os.remove(shard_features_path)
+    finally:
+        if dataset_writer is not None:
+            dataset_writer.close()
+        if features_writer is not None:
+            features_writer.close()
+
 def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos de documentos")
+    parser.add_argument('--samples', type=int, default=2000, help="Número de amostras")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Gera em shards paralelos com N processos (N > 1; só CSV ou Parquet)")
+    parser.add_argument('--seed', type=int, default=None, help="Seed para reprodutibilidade")
+    parser.add_argument('--output', default='data', help="Diretório de saída")
+    parser.add_argument('--formats', nargs='+', default=['csv'],
+                        choices=['csv', 'parquet', 'json'], help="Formatos de saída")
+    parser.add_argument('--features-file', action='store_true',
+                        help="Grava também synthetic_features.arrow (só features, float32)")
+    parser.add_argument('--pretty-json', action='store_true', help="JSON indentado")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1")
+    if args.workers > 1 and (len(args.formats) > 1 or 'json' in args.formats or args.pretty_json):
+        # Os shards são concatenados direto em disco, num único formato
+        parser.error("com --workers > 1 use um único formato, csv ou parquet (sem --pretty-json)")
+
     print("🔄 Iniciando geração de dados sintéticos...")
     
-    generator = SyntheticDataGenerator()
-    
-    # Gerar dataset
-    data = generator.generate_dataset(n_samples=2000)
+    generator = SyntheticDataGenerator(seed=args.seed)
     
-    # Salvar dados
-    df = generator.save_data(data)
+    if args.workers > 1:
+        # Modo em shards: dataset gerado direto em disco
+        output_format = args.formats[0]
+        dataset_path = generator.generate_dataset_parallel(
+            n_samples=args.samples, n_workers=args.workers,
+            seed=args.seed, base_path=args.output,
+            output_format=output_format, feature_file=args.features_file
+        )
+        if output_format == 'parquet':
+            df = pd.read_parquet(dataset_path, columns=['is_valid', 'document_type'])
+        else:
+            df = pd.read_csv(dataset_path, usecols=['is_valid', 'document_type'])
+    else:
+        # Gerar dataset
+        data = generator.generate_dataset(n_samples=args.samples)
+        
+        # Salvar dados
+        df = generator.save_data(data, args.output, formats=args.formats,
+                                 feature_file=args.features_file,
+                                 pretty_json=args.pretty_json)
     
     # Estatísticas
     print("\n📊 Estatísticas do Dataset:")
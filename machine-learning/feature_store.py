@@ -0,0 +1,314 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from data_generator import FEATURE_COLUMNS, FEATURE_SCHEMA_VERSION, SyntheticDataGenerator
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+def text_hash(text):
+    """Chave do texto no feature store (SHA-256 de 32 bytes)"""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).digest()
+
+def generator_featurizer():
+    """Features do trainer (`FEATURE_COLUMNS`) calculadas pelo caminho vetorizado"""
+    generator = SyntheticDataGenerator(seed=0)
+    return lambda texts: generator.generate_features_frame(texts)[FEATURE_COLUMNS]
+
+def iter_text_chunks(data_path, columns=('text',), chunksize=100_000):
+    """Lê as colunas pedidas (ex.: texto e rótulo) de um CSV ou Parquet em blocos"""
+    columns = list(columns)
+    if data_path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(data_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(data_path, usecols=columns, chunksize=chunksize,
+                               keep_default_na=False)
+
+class FeatureStore:
+    """Vetores de features persistidos por (hash do texto, versão do schema)
+
+    Cada versão de schema tem seu diretório em `root/<versão>/` com arquivos
+    Parquet imutáveis (`part-*.parquet`): uma coluna binária com o SHA-256 do
+    texto e uma coluna float64 por feature. Só os textos ausentes do store
+    passam pelo `featurize`; os novos vetores ficam pendentes em memória até o
+    `flush`, que grava um novo arquivo (temporário + rename). Vários processos
+    podem gravar no mesmo diretório, cada um com seus próprios arquivos.
+    """
+
+    def __init__(self, root='data/feature_store', schema_version=FEATURE_SCHEMA_VERSION,
+                 columns=FEATURE_COLUMNS, featurize=None, flush_rows=10_000):
+        if pa is None:
+            raise ImportError("pyarrow é necessário para o feature store (pip install pyarrow)")
+        if not schema_version or os.path.basename(schema_version) != schema_version:
+            raise ValueError(f"Versão de schema inválida: {schema_version}")
+
+        self.path = os.path.join(root, schema_version)
+        self.schema_version = schema_version
+        self.columns = list(columns)
+        self.featurize = featurize or generator_featurizer()
+        self.flush_rows = flush_rows
+        self.stats = {'hits': 0, 'misses': 0}
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._values = None
+        # Vetores ainda não gravados: hash -> linha
+        self._pending = {}
+
+    def _schema(self):
+        fields = [('text_hash', pa.binary(32))] + [(c, pa.float64()) for c in self.columns]
+        return pa.schema(fields, metadata={'feature_columns': json.dumps(self.columns)})
+
+    def _part_paths(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(os.path.join(self.path, name) for name in os.listdir(self.path)
+                      if name.startswith('part-') and name.endswith('.parquet'))
+
+    def _load(self):
+        """Carrega os arquivos gravados num índice de hashes + matriz de valores"""
+        tables = []
+        for part_path in self._part_paths():
+            table = pq.read_table(part_path)
+            stored_columns = json.loads(table.schema.metadata[b'feature_columns'])
+            if stored_columns != self.columns:
+                raise ValueError(f"Colunas de {part_path} não conferem: {stored_columns}")
+            tables.append(table)
+
+        if not tables:
+            self._index = pd.Index([], dtype=object)
+            self._values = np.empty((0, len(self.columns)))
+            return
+
+        table = pa.concat_tables(tables)
+        index = pd.Index(table.column('text_hash').to_pylist(), dtype=object)
+        values = np.column_stack([table.column(c).to_numpy() for c in self.columns])
+        # O mesmo texto pode ter sido calculado por dois processos
+        keep = ~index.duplicated(keep='last')
+        self._index, self._values = index[keep], values[keep]
+
+    def _ensure_loaded(self):
+        if self._index is None:
+            self._load()
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._index) + len(self._pending)
+
+    def lookup(self, hashes):
+        """Valores gravados para `hashes`; retorna (matriz com NaN nas ausências, máscara de encontrados)"""
+        with self._lock:
+            self._ensure_loaded()
+            values = np.full((len(hashes), len(self.columns)), np.nan)
+            positions = self._index.get_indexer(pd.Index(hashes, dtype=object))
+            found = positions >= 0
+            values[found] = self._values[positions[found]]
+
+            if self._pending:
+                for i in np.flatnonzero(~found):
+                    row = self._pending.get(hashes[i])
+                    if row is not None:
+                        values[i] = row
+                        found[i] = True
+
+        return values, found
+
+    def add(self, hashes, values):
+        """Registra vetores novos (gravados no próximo `flush`; com `flush_rows=None`, só no explícito)"""
+        with self._lock:
+            for key, row in zip(hashes, np.asarray(values, dtype=np.float64)):
+                self._pending[key] = row
+            should_flush = self.flush_rows is not None and len(self._pending) >= self.flush_rows
+
+        if should_flush:
+            self.flush()
+
+    def get_features(self, texts):
+        """DataFrame de features dos textos, calculando só os que não estão no store"""
+        texts = list(texts)
+        hashes = [text_hash(text) for text in texts]
+        values, found = self.lookup(hashes)
+
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            # Textos repetidos no mesmo lote são calculados uma única vez
+            first = {}
+            for i in missing:
+                first.setdefault(hashes[i], i)
+            new_rows = np.asarray(
+                pd.DataFrame(self.featurize([texts[i] for i in first.values()]))[self.columns],
+                dtype=np.float64
+            )
+            self.add(list(first), new_rows)
+
+            computed = dict(zip(first, new_rows))
+            for i in missing:
+                values[i] = computed[hashes[i]]
+
+        with self._lock:
+            self.stats['hits'] += int(found.sum())
+            self.stats['misses'] += len(missing)
+
+        return pd.DataFrame(values, columns=self.columns)
+
+    def flush(self):
+        """Grava os vetores pendentes num novo arquivo Parquet; retorna o número de linhas"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            self._ensure_loaded()
+
+            hashes = list(self._pending)
+            values = np.vstack(list(self._pending.values()))
+
+            table = pa.Table.from_arrays(
+                [pa.array(hashes, pa.binary(32))] + [pa.array(values[:, i]) for i in range(len(self.columns))],
+                schema=self._schema()
+            )
+            self._write_part(table)
+
+            # Outra requisição pode ter gravado o mesmo texto entre o lookup e o add:
+            # o índice continua único e a linha mais recente vale (como no `_load`)
+            positions = self._index.get_indexer(pd.Index(hashes, dtype=object))
+            existing = positions >= 0
+            self._values[positions[existing]] = values[existing]
+            self._index = self._index.append(pd.Index(hashes, dtype=object)[~existing])
+            self._values = np.vstack([self._values, values[~existing]])
+            self._pending = {}
+
+        return len(hashes)
+
+    def _write_part(self, table):
+        os.makedirs(self.path, exist_ok=True)
+        # Nomes em ordem de gravação (até o nanossegundo): no `_load`, a linha do arquivo mais novo vale
+        now = time.time_ns()
+        name = (f"part-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10**9))}-{now % 10**9:09d}-"
+                f"{uuid.uuid4().hex[:8]}.parquet")
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def compact(self):
+        """Junta todos os arquivos do schema num só (sem duplicatas); retorna o número de linhas"""
+        self.flush()
+        with self._lock:
+            old_parts = self._part_paths()
+            self._load()
+            table = pa.Table.from_arrays(
+                [pa.array(list(self._index), pa.binary(32))] +
+                [pa.array(self._values[:, i]) for i in range(len(self.columns))],
+                schema=self._schema()
+            )
+            self._write_part(table)
+            for part_path in old_parts:
+                os.remove(part_path)
+
+        return table.num_rows
+
+def rescore(data_path, store, model, chunksize=100_000, output_path=None):
+    """Reavalia um corpus com `model` usando as features do store
+
+    Com o store preenchido, o tempo fica limitado pela inferência; os tempos
+    de features e de inferência são reportados separadamente.
+    """
+    has_id = 'id' in (pq.read_schema(data_path).names if data_path.endswith('.parquet')
+                      else pd.read_csv(data_path, nrows=0).columns)
+    columns = ['id', 'text'] if has_id else ['text']
+
+    writer = None
+    timings = {'features': 0.0, 'inference': 0.0}
+    n_rows = n_valid = 0
+    hits_before, misses_before = store.stats['hits'], store.stats['misses']
+
+    try:
+        for chunk in iter_text_chunks(data_path, columns, chunksize):
+            start = time.perf_counter()
+            X = store.get_features(chunk['text'].astype(str))
+            timings['features'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            probabilities = model.predict_proba(X)
+            timings['inference'] += time.perf_counter() - start
+
+            prediction = probabilities.argmax(axis=1).astype(bool)
+            n_rows += len(chunk)
+            n_valid += int(prediction.sum())
+
+            if output_path is not None:
+                scores = pd.DataFrame({
+                    'is_valid': prediction,
+                    'confidence': probabilities.max(axis=1)
+                })
+                if has_id:
+                    scores.insert(0, 'id', chunk['id'].to_numpy())
+                scores_table = pa.Table.from_pandas(scores, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, scores_table.schema)
+                writer.write_table(scores_table)
+    finally:
+        if writer is not None:
+            writer.close()
+        store.flush()
+
+    return {
+        'rows': n_rows,
+        'valid': n_valid,
+        'hits': store.stats['hits'] - hits_before,
+        'misses': store.stats['misses'] - misses_before,
+        'features_seconds': timings['features'],
+        'inference_seconds': timings['inference']
+    }
+
+def main():
+    from model_registry import ModelRegistry
+
+    parser = argparse.ArgumentParser(description="Feature store por hash do texto")
+    parser.add_argument('--root', default='data/feature_store', help="Diretório do feature store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    rescore_parser = subparsers.add_parser('rescore', help="Reavalia um corpus com um modelo do registro")
+    rescore_parser.add_argument('--data', default='data/synthetic_data.csv', help="Corpus (.csv ou .parquet com coluna text)")
+    rescore_parser.add_argument('--version', default=None, help="Versão do modelo (padrão: a atual)")
+    rescore_parser.add_argument('--output', default=None, help="Arquivo .parquet com as predições")
+    rescore_parser.add_argument('--chunksize', type=int, default=100_000)
+
+    subparsers.add_parser('compact', help="Junta os arquivos do store num só")
+    subparsers.add_parser('stats', help="Linhas e arquivos do store")
+
+    args = parser.parse_args()
+    store = FeatureStore(args.root)
+
+    if args.command == 'rescore':
+        model, metadata = ModelRegistry('models').load(args.version)
+        if metadata.get('feature_names', FEATURE_COLUMNS) != FEATURE_COLUMNS:
+            raise ValueError(f"Modelo {metadata['version']} usa outras features: {metadata['feature_names']}")
+
+        print(f"🔄 Reavaliando {args.data} com o modelo {metadata['version']}...")
+        result = rescore(args.data, store, model, args.chunksize, args.output)
+        print(f"✅ {result['rows']:,} documentos ({result['valid']:,} válidos)")
+        print(f"📦 Features: {result['hits']:,} do store, {result['misses']:,} calculadas "
+              f"({result['features_seconds']:.2f}s)")
+        print(f"⏱️  Inferência: {result['inference_seconds']:.2f}s")
+        if args.output:
+            print(f"💾 Predições em: {args.output}")
+    elif args.command == 'compact':
+        print(f"✅ Store compactado: {store.compact():,} vetores")
+    elif args.command == 'stats':
+        print(f"📦 {store.path}: {len(store):,} vetores em {len(store._part_paths())} arquivos")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import argparse
+import json
+import mimetypes
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from logging_config import get_logger
+
+logger = get_logger('loadtest')
+
+# Critérios de saturação de um degrau da rampa
+MIN_ACHIEVED_RATIO = 0.9   # taxa aberta: vazão abaixo de 90% da taxa oferecida
+MIN_THROUGHPUT_GAIN = 1.1  # concorrência: menos de 10% de vazão a mais que o degrau anterior
+MAX_P95_GROWTH = 3.0       # p95 acima de 3× o p95 do primeiro degrau
+MAX_ERROR_RATE = 0.01
+
+def load_texts(data_path='data/synthetic_data.csv', n_texts=500, seed=42):
+    """Textos (válidos e inválidos) do dataset sintético (CSV ou Parquet, o que existir)"""
+    import pandas as pd
+
+    if not os.path.exists(data_path):
+        base, ext = os.path.splitext(data_path)
+        alternative = base + ('.csv' if ext == '.parquet' else '.parquet')
+        if not os.path.exists(alternative):
+            raise FileNotFoundError(f"Dataset {data_path} não encontrado. Execute: python data_generator.py")
+        data_path = alternative
+
+    if data_path.endswith('.parquet'):
+        df = pd.read_parquet(data_path, columns=['text'])
+    else:
+        df = pd.read_csv(data_path, usecols=['text'])
+    df = df.sample(n=min(n_texts, len(df)), random_state=seed)
+    return df['text'].tolist()
+
+def load_images(corpus_dir='data/scan_corpus', n_images=20, seed=42):
+    """Imagens do corpus de páginas digitalizadas; sem corpus, algumas páginas geradas em memória"""
+    from scan_corpus import ScanRenderer, iter_corpus
+
+    if os.path.exists(os.path.join(corpus_dir, 'manifest.jsonl')):
+        return [(os.path.basename(entry['image']), image)
+                for entry, image, _ in iter_corpus(corpus_dir, limit=n_images)]
+
+    from data_generator import SyntheticDataGenerator
+    logger.warning(f"⚠️ Corpus {corpus_dir} não encontrado; gerando {n_images} páginas em memória "
+                   "(python scan_corpus.py para um corpus fixo)")
+    generator = SyntheticDataGenerator(seed=seed)
+    renderer = ScanRenderer(dpi=150, artifacts='light')
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(n_images):
+        text = generator.generate_valid_document_text() if i % 3 else generator.generate_invalid_document_text()
+        data, fmt, _ = renderer.render(text, rng)
+        images.append((f"page-{i}.{fmt}", data))
+    return images
+
+class HTTPTarget:
+    """Envia as requisições ao servidor por HTTP (uma sessão `requests` por thread)"""
+
+    def __init__(self, base_url, timeout=60):
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._requests = requests
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def post(self, path, **kwargs):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        try:
+            return session.post(f"{self.base_url}{path}", timeout=self.timeout, **kwargs).status_code
+        except self._requests.RequestException as e:
+            return type(e).__name__
+
+    def get(self, path):
+        try:
+            return self._requests.get(f"{self.base_url}{path}", timeout=5).status_code
+        except self._requests.RequestException as e:
+            return type(e).__name__
+
+class InProcessTarget:
+    """Envia as requisições à aplicação ASGI no mesmo processo (TestClient, com startup)"""
+
+    def __enter__(self):
+        from fastapi.testclient import TestClient
+
+        import app_simple
+
+        self._client = TestClient(app_simple.app)
+        self._client.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._client.__exit__(*exc)
+
+    def post(self, path, **kwargs):
+        try:
+            return self._client.post(path, **kwargs).status_code
+        except Exception as e:
+            return type(e).__name__
+
+    def get(self, path):
+        return self._client.get(path).status_code
+
+def wait_ready(target, timeout=120):
+    """Aguarda `/ready` (modelo carregado e aquecimento concluído)"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if target.get('/ready') == 200:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"API não ficou pronta em {timeout}s")
+
+def send_request(target, kind, payload):
+    if kind == 'text':
+        return target.post('/validate-text', json={'text': payload})
+    filename, image = payload
+    # O tipo real do arquivo, como um cliente enviaria
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return target.post('/validate-document', files={'file': (filename, image, content_type)})
+
+def run_step(target, texts, images, duration=10, concurrency=8, rate=None, image_ratio=0.2, seed=42):
+    """Um degrau de carga; retorna vazão, percentis de latência e erros
+
+    Sem `rate`, cada um dos `concurrency` clientes envia a próxima requisição
+    assim que recebe a resposta (carga fechada). Com `rate`, as chegadas
+    seguem um processo de Poisson de `rate` req/s atendido por `concurrency`
+    clientes (carga aberta): a latência conta desde o horário agendado, então
+    a espera por um cliente livre entra na medição.
+    """
+    arrivals = None
+    if rate is not None:
+        rng = np.random.default_rng(seed)
+        arrivals = np.cumsum(rng.exponential(1 / rate, int(rate * duration * 2) + 10))
+        arrivals = arrivals[arrivals < duration]
+
+    samples = []
+    lock = threading.Lock()
+    next_arrival = [0]
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client(index):
+        rng = np.random.default_rng(seed + 1 + index)
+        while True:
+            if arrivals is None:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            else:
+                with lock:
+                    i = next_arrival[0]
+                    next_arrival[0] += 1
+                if i >= len(arrivals):
+                    return
+                scheduled = start + arrivals[i]
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            if images and rng.random() < image_ratio:
+                kind, payload = 'document', images[rng.integers(len(images))]
+            else:
+                kind, payload = 'text', texts[rng.integers(len(texts))]
+            status = send_request(target, kind, payload)
+            finished = time.perf_counter()
+            with lock:
+                samples.append((kind, finished - scheduled, status, finished))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = max([s[3] for s in samples], default=deadline) - start
+    result = {
+        'concurrency': concurrency,
+        'offered_rate': rate,
+        'requests': len(samples),
+        'seconds': round(elapsed, 3),
+        'throughput': len(samples) / elapsed if elapsed > 0 else 0.0
+    }
+    result.update(latency_summary([s[1] for s in samples]))
+
+    errors = {}
+    for _, _, status, _ in samples:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    result['errors'] = errors
+    result['error_rate'] = sum(errors.values()) / len(samples) if samples else 0.0
+
+    result['by_kind'] = {}
+    for kind in ('text', 'document'):
+        latencies = [s[1] for s in samples if s[0] == kind]
+        if latencies:
+            result['by_kind'][kind] = {'requests': len(latencies), **latency_summary(latencies)}
+
+    return result
+
+def latency_summary(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(max(latencies)) * 1000, 2)}
+
+def mark_saturation(steps):
+    """Marca os degraus saturados e retorna o joelho: o último degrau antes da saturação
+
+    Um degrau satura quando a vazão não acompanha a carga (taxa aberta: abaixo
+    de 90% da oferecida; concorrência: menos de 10% acima do degrau anterior),
+    quando o p95 passa de 3× o do primeiro degrau ou quando mais de 1% das
+    requisições falham.
+    """
+    knee = None
+    first_p95 = steps[0]['p95_ms'] if steps else None
+    for i, step in enumerate(steps):
+        reasons = []
+        if step['offered_rate'] is not None:
+            if step['throughput'] < MIN_ACHIEVED_RATIO * step['offered_rate']:
+                reasons.append('throughput_below_offered')
+        elif i > 0 and step['throughput'] < MIN_THROUGHPUT_GAIN * steps[i - 1]['throughput']:
+            reasons.append('throughput_flat')
+        if i > 0 and first_p95 and step['p95_ms'] is not None and step['p95_ms'] > MAX_P95_GROWTH * first_p95:
+            reasons.append('p95_growth')
+        if step['error_rate'] > MAX_ERROR_RATE:
+            reasons.append('errors')
+        step['saturated'] = reasons
+        if reasons:
+            break
+        knee = step
+    return knee
+
+def run_load_test(target, texts, images, duration=10, concurrency=(1, 2, 4, 8), rates=None,
+                  image_ratio=0.2, seed=42):
+    """Rampa de carga (por concorrência ou por taxa) até saturar; retorna degraus e joelho"""
+    if rates:
+        plans = [(max(concurrency), rate) for rate in rates]
+    else:
+        plans = [(c, None) for c in concurrency]
+
+    # Algumas requisições de cada tipo antes de medir
+    for payload in texts[:3]:
+        send_request(target, 'text', payload)
+    for payload in images[:2]:
+        send_request(target, 'document', payload)
+
+    steps = []
+    for c, rate in plans:
+        label = f"{rate} req/s" if rate is not None else f"{c} clientes"
+        logger.info(f"🚦 Degrau: {label} por {duration}s")
+        step = run_step(target, texts, images, duration, c, rate, image_ratio, seed)
+        steps.append(step)
+        print_step(step)
+        if mark_saturation(steps) is not steps[-1]:
+            # Depois da saturação, mais carga só aumenta a fila
+            break
+
+    knee = mark_saturation(steps)
+    return {'steps': steps, 'knee': knee}
+
+def print_step(step):
+    load = f"{step['offered_rate']:7.1f}/s" if step['offered_rate'] is not None else f"{step['concurrency']:5d} cl."
+    p = lambda value: f"{value:8.1f}" if value is not None else "       —"
+    print(f"   {load}  {step['throughput']:8.1f} req/s {p(step['p50_ms'])} {p(step['p95_ms'])} "
+          f"{p(step['p99_ms'])} ms  erros {step['error_rate']:6.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API de validação")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="API alvo (HTTP)")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Carrega app_simple no próprio processo em vez de usar HTTP (requer httpx2)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                        help="Clientes por degrau (com --rate, o maior valor é o número de clientes)")
+    parser.add_argument('--rate', type=float, nargs='+', default=None,
+                        help="Taxas de chegada (req/s) por degrau: carga aberta")
+    parser.add_argument('--duration', type=float, default=10, help="Segundos por degrau")
+    parser.add_argument('--image-ratio', type=float, default=0.2, help="Fração de requisições com imagem")
+    parser.add_argument('--data', default='data/synthetic_data.csv',
+                        help="Dataset com os textos (CSV ou Parquet; usa o outro formato se só ele existir)")
+    parser.add_argument('--corpus', default='data/scan_corpus', help="Corpus de imagens (scan_corpus.py)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="Grava o resultado em JSON")
+    args = parser.parse_args()
+
+    texts = load_texts(args.data, seed=args.seed)
+    images = load_images(args.corpus, seed=args.seed) if args.image_ratio > 0 else []
+
+    target = InProcessTarget() if args.in_process else HTTPTarget(args.url)
+    print(f"🚀 Teste de carga em {'processo' if args.in_process else args.url} "
+          f"({len(texts)} textos, {len(images)} imagens, {args.image_ratio:.0%} imagens)")
+    print("   carga        vazão           p50      p95      p99")
+    with target:
+        wait_ready(target)
+        result = run_load_test(target, texts, images, args.duration, args.concurrency, args.rate,
+                               args.image_ratio, args.seed)
+
+    knee = result['knee']
+    saturated = [step for step in result['steps'] if step['saturated']]
+    if not saturated:
+        print("✅ Nenhum degrau saturou: aumente a carga para achar o joelho")
+    elif knee is None:
+        print(f"⚠️ Saturado já no primeiro degrau ({', '.join(saturated[0]['saturated'])}): reduza a carga inicial")
+    else:
+        load = f"{knee['offered_rate']} req/s" if knee['offered_rate'] is not None else f"{knee['concurrency']} clientes"
+        print(f"📈 Joelho: {load} → {knee['throughput']:.1f} req/s, p95 {knee['p95_ms']:.1f} ms")
+        print(f"🧱 Saturação no degrau seguinte: {', '.join(saturated[0]['saturated'])}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'target': 'in-process' if args.in_process else args.url,
+                       'image_ratio': args.image_ratio, 'duration': args.duration, **result}, f, indent=2)
+        print(f"💾 Resultado em {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime
+
+# Atributos padrão de LogRecord; o resto veio de `extra=` e vai como campo estruturado
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+def get_logger(name):
+    """Logger do projeto (`ml.<name>`), configurado por `configure_logging`"""
+    return logging.getLogger(f"ml.{name}")
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRIBUTES and key != 'sampled'}
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em `extra=`"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **_extra_fields(record)
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Texto legível; campos de `extra=` vão no fim como chave=valor"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={json.dumps(value, ensure_ascii=False, default=str)}"
+                                   for key, value in fields.items())
+        return line
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos registros por requisição (`extra={'sampled': True}`) até INFO
+
+    WARNING e acima, e registros sem a marcação, passam sempre.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or record.levelno > logging.INFO or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+def configure_logging(level=None, fmt=None, sample_rate=None, stream=None):
+    """Configura os loggers `ml.*` para escrever a partir de uma thread em segundo plano
+
+    O logger só enfileira o registro (QueueHandler); a formatação e a escrita
+    acontecem na thread do QueueListener, fora do caminho da requisição.
+    Variáveis: ML_LOG_LEVEL (padrão INFO), ML_LOG_FORMAT (text|json) e
+    ML_LOG_SAMPLE_RATE (fração dos registros por requisição, padrão 1).
+    """
+    global _listener
+
+    level = (level or os.getenv('ML_LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or os.getenv('ML_LOG_FORMAT', 'text')
+    sample_rate = float(os.getenv('ML_LOG_SAMPLE_RATE', '1') if sample_rate is None else sample_rate)
+
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    logger = logging.getLogger('ml')
+    logger.handlers = [queue_handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+    return logger
+
+def _restart_listener():
+    """Após um fork, a thread do listener não existe no filho: inicia outra na mesma fila"""
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers)
+        _listener.start()
+
+def stop_logging():
+    """Esvazia a fila e encerra a thread do listener (ex.: antes de `os._exit`)"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+os.register_at_fork(after_in_child=_restart_listener)
+atexit.register(stop_logging)
@@ -0,0 +1,289 @@
+import bisect
+import json
+import os
+import threading
+import uuid
+
+from process_info import process_alive, process_token
+
+# Limites (segundos) dos histogramas de latência: de 0,5 ms (regras) a 30 s (OCR)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def snapshot(self):
+        """Séries do processo em formato JSON ([[labels], valor], ...)"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._series.items()]
+
+    def merge(self, series, value):
+        """Soma `value` (de um snapshot) ao acumulado `series`"""
+        return series + value
+
+    def render(self, series=None):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        if series is None:
+            with self._lock:
+                series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Gauge; com vários workers `aggregate` diz como juntar os processos
+
+    `sum` soma os workers vivos (ex.: requisições em andamento); `local` usa
+    só o processo que respondeu (ex.: contagens de uma fila compartilhada).
+    """
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), aggregate='sum'):
+        super().__init__(name, help_text, labelnames)
+        self.aggregate = aggregate
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+class Histogram(_Metric):
+    """Histograma com buckets fixos: `observe` é uma busca binária e dois incrementos"""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [contagem por bucket (último = +Inf), soma]
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._series.items()]
+
+    def merge(self, series, value):
+        return [[a + b for a, b in zip(series[0], value[0])], series[1] + value[1]]
+
+    def _render_series(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Métricas do processo no formato texto do Prometheus (sem dependências)
+
+    Com vários workers, `enable_multiprocess(directory)` faz cada processo
+    gravar um snapshot `<pid>-<token>.json` no diretório compartilhado (o
+    token, instante de início do processo, evita que um PID reaproveitado
+    sobrescreva o snapshot de um worker morto), e `render`
+    junta os snapshots de todos os workers. Contadores e histogramas somam
+    também os workers que já morreram, então não voltam para trás quando um
+    worker é recriado; gauges seguem o `aggregate` de cada um.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self._snapshot_pid = None
+        self._snapshot_name = None
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), aggregate='sum'):
+        return self._register(Gauge(name, help_text, labelnames, aggregate))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def enable_multiprocess(self, directory):
+        """Passa a juntar as métricas dos processos que gravam em `directory`"""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def write_snapshot(self):
+        """Grava o snapshot deste processo (arquivo temporário + rename)"""
+        pid = os.getpid()
+        if self._snapshot_pid != pid:
+            # Recalculado num processo criado por fork depois do primeiro snapshot
+            token = process_token(pid) or uuid.uuid4().hex[:12]
+            self._snapshot_pid, self._snapshot_name = pid, f"{pid}-{token}.json"
+        path = os.path.join(self.directory, self._snapshot_name)
+        snapshot = {metric.name: metric.snapshot() for metric in self._metrics}
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _aggregate(self):
+        """{nome: {labels: valor}} somando os snapshots de todos os processos"""
+        merged = {metric.name: {} for metric in self._metrics}
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            pid, _, token = stem.partition('-')
+            if ext != '.json' or not pid.isdigit() or not token:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = None
+            for metric in self._metrics:
+                if isinstance(metric, Gauge):
+                    if metric.aggregate == 'local':
+                        continue
+                    if alive is None:
+                        alive = process_alive(int(pid), token)
+                    if not alive:
+                        continue
+                series = merged[metric.name]
+                for key, value in snapshot.get(metric.name, []):
+                    key = tuple(key)
+                    series[key] = value if key not in series else metric.merge(series[key], value)
+        return merged
+
+    def render(self):
+        if self.directory is None:
+            merged = {}
+        else:
+            self.write_snapshot()
+            merged = self._aggregate()
+
+        lines = []
+        for metric in self._metrics:
+            if metric.name in merged and not (isinstance(metric, Gauge) and metric.aggregate == 'local'):
+                lines.extend(metric.render(merged[metric.name]))
+            else:
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def server_timing(timings, total=None):
+    """Header `Server-Timing` (durações em ms) a partir de {etapa: segundos}"""
+    entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+class SlowRequestLog:
+    """Grava em JSONL as requisições acima de `threshold_ms`, com as durações por etapa"""
+
+    def __init__(self, path='logs/slow_requests.jsonl', threshold_ms=1000):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            path=os.getenv('ML_SLOW_REQUEST_LOG', 'logs/slow_requests.jsonl'),
+            threshold_ms=float(os.getenv('ML_SLOW_REQUEST_MS', '1000'))
+        )
+
+    def record(self, duration, entry):
+        """Registra `entry` se `duration` (segundos) passou do limite; retorna se registrou"""
+        if self.threshold_ms < 0 or duration * 1000 < self.threshold_ms:
+            return False
+
+        line = json.dumps({**entry, 'duration_ms': round(duration * 1000, 3)},
+                          ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+        return True
+
+# Métricas do pipeline de validação (app_simple.py)
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'ml_stage_duration_seconds',
+    "Duração de cada etapa da validação (upload_read, decode, features, rules, inference)",
+    ['stage']
+)
+OCR_SECONDS = registry.histogram(
+    'ml_ocr_duration_seconds', "Duração do OCR por backend", ['backend']
+)
+REQUEST_SECONDS = registry.histogram(
+    'ml_request_duration_seconds', "Duração total das requisições de validação", ['endpoint']
+)
+VALIDATIONS = registry.counter(
+    'ml_validations_total', "Resultados das validações por motivo", ['endpoint', 'result', 'reason']
+)
+IN_FLIGHT = registry.gauge(
+    'ml_requests_in_flight', "Requisições de validação em andamento", ['endpoint']
+)
+WORKER_INFO = registry.gauge(
+    'ml_worker_info', "Workers vivos incluídos na raspagem", ['pid']
+)
+FEATURE_STORE_LOOKUPS = registry.counter(
+    'ml_feature_store_lookups_total', "Consultas ao feature store", ['result']
+)
+VALIDATION_JOBS = registry.gauge(
+    'ml_validation_jobs', "Jobs de validação por status (fila compartilhada entre workers)", ['status'],
+    aggregate='local'
+)
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+import joblib
+
+class ModelRegistry:
+    """Registro de modelos versionados em `models/versions/<versão>/`
+
+    Cada versão é gravada num diretório temporário e publicada com um
+    `rename` atômico, então um leitor nunca vê um pickle pela metade. A versão
+    servida fica em `models/CURRENT.json`, junto com o histórico usado no
+    rollback.
+    """
+
+    def __init__(self, root='models'):
+        self.root = root
+        self.versions_dir = os.path.join(root, 'versions')
+        self.pointer_path = os.path.join(root, 'CURRENT.json')
+
+    def _version_dir(self, version):
+        # Versões são geradas por `register`; bloqueia nomes com caminho
+        if not version or os.path.basename(version) != version or version.startswith('.'):
+            raise ValueError(f"Versão inválida: {version}")
+        return os.path.join(self.versions_dir, version)
+
+    def _write_json_atomic(self, path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _read_pointer(self):
+        if not os.path.exists(self.pointer_path):
+            return {'current': None, 'history': []}
+        with open(self.pointer_path) as f:
+            return json.load(f)
+
+    def register(self, model, metadata):
+        """Grava uma nova versão (modelo + metadados) e retorna seu identificador"""
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+        tmp_dir = os.path.join(self.versions_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+        try:
+            model_path = os.path.join(tmp_dir, 'model.pkl')
+            # Sem compressão: permite carregar com mmap_mode
+            joblib.dump(model, model_path)
+            with open(model_path, 'rb') as f:
+                os.fsync(f.fileno())
+
+            metadata = {**metadata, 'version': version, 'registered_at': datetime.now().isoformat()}
+            self._write_json_atomic(os.path.join(tmp_dir, 'metadata.json'), metadata)
+
+            os.rename(tmp_dir, self._version_dir(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        return version
+
+    def promote(self, version):
+        """Torna `version` a versão servida; a anterior vai para o histórico"""
+        if not os.path.exists(os.path.join(self._version_dir(version), 'model.pkl')):
+            raise FileNotFoundError(f"Versão não encontrada: {version}")
+
+        pointer = self._read_pointer()
+        if pointer['current'] == version:
+            return pointer
+        if pointer['current'] is not None:
+            pointer['history'].append(pointer['current'])
+        pointer['current'] = version
+        pointer['updated_at'] = datetime.now().isoformat()
+        self._write_json_atomic(self.pointer_path, pointer)
+
+        return pointer
+
+    def rollback(self):
+        """Volta para a versão servida anteriormente"""
+        pointer = self._read_pointer()
+        if not pointer['history']:
+            raise ValueError("Não há versão anterior para rollback")
+
+        pointer['current'] = pointer['history'].pop()
+        pointer['updated_at'] = datetime.now().isoformat()
+        self._write_json_atomic(self.pointer_path, pointer)
+
+        return pointer
+
+    def current_version(self):
+        return self._read_pointer()['current']
+
+    def metadata(self, version):
+        with open(os.path.join(self._version_dir(version), 'metadata.json')) as f:
+            return json.load(f)
+
+    def list_versions(self):
+        """Versões publicadas (mais recentes primeiro) com seus metadados"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        versions = sorted(
+            (v for v in os.listdir(self.versions_dir) if not v.startswith('.')),
+            reverse=True
+        )
+        return [self.metadata(v) for v in versions]
+
+    def load(self, version=None, mmap_mode=None):
+        """Carrega a versão pedida (padrão: a atual); retorna (modelo, metadados)"""
+        version = version or self.current_version()
+        if version is None:
+            raise FileNotFoundError("Nenhuma versão promovida no registro")
+
+        model_path = os.path.join(self._version_dir(version), 'model.pkl')
+        return joblib.load(model_path, mmap_mode=mmap_mode), self.metadata(version)
+
+def test_hot_swap(n_clients=4, n_swaps=20):
+    """Teste de troca de modelo sob carga: nenhuma requisição pode falhar"""
+    import tempfile
+    import threading
+    import numpy as np
+    from fastapi.testclient import TestClient
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    import app_simple
+
+    print("🧪 Teste de hot swap do modelo...")
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cda_valido.txt')) as f:
+        valid_text = f.read()
+
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 9))
+    y = (X[:, 0] > 0.5).astype(int)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = ModelRegistry(tmp)
+        versions = []
+        for C in (0.1, 10.0):
+            pipeline = Pipeline([('scaler', StandardScaler()),
+                                 ('classifier', LogisticRegression(C=C))]).fit(X, y)
+            versions.append(registry.register(pipeline, {'model_type': f'lr_C{C}'}))
+        registry.promote(versions[0])
+
+        app_simple.model_registry = registry
+        app_simple.load_model()
+
+        errors = []
+        served_versions = set()
+        stop = threading.Event()
+
+        with TestClient(app_simple.app) as client:
+            def hammer():
+                while not stop.is_set():
+                    response = client.post('/validate-text', json={'text': valid_text})
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+                    else:
+                        served_versions.add(response.json().get('model_version'))
+
+            clients = [threading.Thread(target=hammer) for _ in range(n_clients)]
+            for thread in clients:
+                thread.start()
+
+            swap_latencies = []
+            for i in range(n_swaps):
+                start = time.perf_counter()
+                response = client.post(f'/models/{versions[(i + 1) % 2]}/promote')
+                swap_latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+            stop.set()
+            for thread in clients:
+                thread.join()
+
+            rollback = client.post('/models/rollback')
+
+    assert not errors, f"Requisições com erro durante a troca: {errors}"
+    assert served_versions == set(versions), f"Versões servidas: {served_versions}"
+    assert rollback.status_code == 200
+
+    print(f"✅ {n_swaps} trocas sem erros ({n_clients} clientes concorrentes)")
+    print(f"⏱️  Latência da troca: mediana {np.median(swap_latencies)*1000:.1f} ms, "
+          f"máx {max(swap_latencies)*1000:.1f} ms")
+
+if __name__ == "__main__":
+    test_hot_swap()
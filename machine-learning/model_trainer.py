@@ -2,17 +2,41 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
-from sklearn.model_selection import train_test_split
+import io
+import json
+import shutil
+import tempfile
+import warnings
+from scipy.stats import loguniform, randint
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (habilita HalvingRandomSearchCV)
+from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score, HalvingRandomSearchCV
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.svm import SVC
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 import joblib
+import argparse
+import time
+from joblib import Parallel, delayed
 from datetime import datetime
 import re
 
+from data_generator import FEATURE_COLUMNS
+from feature_store import FeatureStore, iter_text_chunks
+from logging_config import configure_logging, get_logger
+from model_registry import ModelRegistry
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = get_logger('trainer')
+
 def extract_features_for_training(text):
     """Versão simplificada para treinamento que retorna só features"""
     
@@ -82,43 +106,284 @@ def extract_features_for_training(text):
     
     return features
 
+# Espaços da busca de hiperparâmetros (parâmetros do passo `classifier` do pipeline)
+SEARCH_SPACES = {
+    'random_forest': {
+        'max_depth': [None, 8, 16, 32],
+        'min_samples_leaf': randint(1, 10),
+        'max_features': ['sqrt', 'log2', None]
+    },
+    'random_forest_compact': {
+        'max_depth': randint(3, 10),
+        'min_samples_leaf': randint(1, 10)
+    },
+    'logistic_regression': {
+        'C': loguniform(1e-3, 1e2),
+        'class_weight': [None, 'balanced']
+    },
+    'svm': {
+        'C': loguniform(1e-2, 1e2),
+        'gamma': loguniform(1e-4, 1e0),
+        'class_weight': [None, 'balanced']
+    }
+}
+
+# Recurso que cresce a cada rodada da busca: número de árvores (de, até) nas
+# florestas, cujo custo depende mais das árvores que das amostras; amostras nos demais.
+# O máximo é uma rodada alcançável com factor=3 (25 → 75 → 225, 5 → 15 → 45). O
+# número de árvores da rodada final não vai para o modelo: ele fica com o de `self.models`
+SEARCH_RESOURCES = {
+    'random_forest': ('n_estimators', 25, 225),
+    'random_forest_compact': ('n_estimators', 5, 45)
+}
+
+def _classifier_params(params, exclude=()):
+    """Parâmetros `classifier__*` da busca como parâmetros do estimador, em tipos JSON"""
+    params = {param.removeprefix('classifier__'): value for param, value in params.items()}
+    return {param: value.item() if isinstance(value, np.generic) else value
+            for param, value in params.items() if param not in exclude}
+
+def _train_candidate(name, model, X_train, y_train, X_test, y_test, cv_folds, fold_jobs):
+    """Valida (k-fold) e treina um candidato; executado em processo separado"""
+    # Criar pipeline com normalização
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('classifier', model)
+    ])
+    
+    # Validação cruzada com os folds em paralelo
+    start = time.perf_counter()
+    cv = StratifiedKFold(n_splits=cv_folds, shuffle=True, random_state=42)
+    cv_scores = cross_val_score(pipeline, X_train, y_train, cv=cv,
+                                scoring='accuracy', n_jobs=fold_jobs)
+    cv_time = time.perf_counter() - start
+    
+    # Treinar modelo final
+    start = time.perf_counter()
+    pipeline.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    
+    # Avaliar no conjunto de teste
+    y_pred = pipeline.predict(X_test)
+    
+    return name, {
+        'model': pipeline,
+        'accuracy': accuracy_score(y_test, y_pred),
+        'cv_accuracy_mean': float(cv_scores.mean()),
+        'cv_accuracy_std': float(cv_scores.std()),
+        'cv_time': cv_time,
+        'fit_time': fit_time,
+        'predictions': y_pred,
+        'y_test': y_test
+    }
+
+def measure_serving_cost(model, X, single_calls=200, batch_size=1000):
+    """Custo de servir o modelo: latência de 1 linha e de um lote, tamanho e carregamento
+
+    A latência de uma linha é a de `predict_proba` com um array de 1 linha,
+    como no caminho de `/validate-text`; o tamanho e o tempo de carga vêm do
+    `joblib.dump`/`joblib.load` em memória.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    rows = [X[i % len(X)][None, :] for i in range(single_calls)]
+    batch = X[np.arange(batch_size) % len(X)]
+    
+    with warnings.catch_warnings():
+        # Pipelines treinados com DataFrame avisam ao receber arrays
+        warnings.simplefilter('ignore', UserWarning)
+        for row in rows[:10]:
+            model.predict_proba(row)
+        
+        latencies = []
+        for row in rows:
+            start = time.perf_counter()
+            model.predict_proba(row)
+            latencies.append(time.perf_counter() - start)
+        
+        batch_times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            model.predict_proba(batch)
+            batch_times.append(time.perf_counter() - start)
+    
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    serialized = buffer.getvalue()
+    load_times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        joblib.load(io.BytesIO(serialized))
+        load_times.append(time.perf_counter() - start)
+    
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'single_row_p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'single_row_p95_ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'batch_ms_per_1k_rows': round(min(batch_times) * 1000 * 1000 / batch_size, 3),
+        'size_mb': round(len(serialized) / 1024 / 1024, 4),
+        'load_ms': round(min(load_times) * 1000, 3)
+    }
+
+def iter_feature_chunks(data_path, chunksize=100_000):
+    """Lê o dataset em blocos de (X float32, y), sem carregá-lo inteiro
+
+    Aceita CSV, Parquet ou o arquivo Arrow só de features; só as colunas de
+    features e o rótulo são lidos.
+    """
+    columns = FEATURE_COLUMNS + ['is_valid']
+    
+    if data_path.endswith('.arrow'):
+        with pa.memory_map(data_path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunksize):
+                    part = batch.slice(offset, chunksize)
+                    X = part.column('features').flatten().to_numpy().reshape(-1, len(FEATURE_COLUMNS))
+                    yield X, part.column('is_valid').to_numpy().astype(int)
+        return
+    
+    if data_path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(data_path)
+        chunks = (batch.to_pandas() for batch in
+                  parquet_file.iter_batches(batch_size=chunksize, columns=columns))
+    else:
+        chunks = pd.read_csv(data_path, usecols=columns, chunksize=chunksize)
+    
+    for df in chunks:
+        X = df[FEATURE_COLUMNS].fillna(0).to_numpy(dtype=np.float32)
+        # CSV guarda o rótulo como texto True/False
+        y = df['is_valid'].astype(str).str.lower().isin(['true', '1']).to_numpy(dtype=int)
+        yield X, y
+
+def _env_float(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
 class DocumentValidatorTrainer:
-    def __init__(self):
+    def __init__(self, n_jobs=None, cv_folds=5, latency_budget_ms=None, size_budget_mb=None,
+                 accuracy_tolerance=None):
+        # Núcleos disponíveis para o treinamento (divididos entre candidatos e folds)
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.cv_folds = cv_folds
+        # Orçamento de serviço: p95 de 1 linha (ms) e tamanho serializado (MB); None = sem limite
+        self.latency_budget_ms = (latency_budget_ms if latency_budget_ms is not None
+                                  else _env_float('ML_LATENCY_BUDGET_MS'))
+        self.size_budget_mb = (size_budget_mb if size_budget_mb is not None
+                               else _env_float('ML_MODEL_SIZE_BUDGET_MB'))
+        # Candidatos a até `accuracy_tolerance` da melhor acurácia CV empatam: vence o mais rápido
+        if accuracy_tolerance is None:
+            accuracy_tolerance = _env_float('ML_ACCURACY_TOLERANCE')
+        self.accuracy_tolerance = 0.005 if accuracy_tolerance is None else accuracy_tolerance
         self.models = {
             'random_forest': RandomForestClassifier(n_estimators=100, random_state=42),
+            # Variante compacta para servir: menos árvores e mais rasas
+            'random_forest_compact': RandomForestClassifier(n_estimators=20, max_depth=8, random_state=42),
             'logistic_regression': LogisticRegression(random_state=42, max_iter=1000),
             'svm': SVC(probability=True, random_state=42)
         }
         self.best_model = None
         self.scaler = StandardScaler()
+        # Informações extras do treino gravadas nos metadados
+        self.training_info = {}
+        # Melhores configurações e histórico da busca (`search_hyperparameters`)
+        self.search_info = {}
         
     def load_data(self, csv_path='data/synthetic_data.csv'):
-        """Carrega dados do CSV"""
-        print(f"📂 Carregando dados de: {csv_path}")
+        """Carrega dados do CSV ou Parquet (no Parquet, sem a coluna de texto)"""
+        logger.info(f"📂 Carregando dados de: {csv_path}")
         
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"Arquivo não encontrado: {csv_path}")
         
-        df = pd.read_csv(csv_path)
-        print(f"✅ Dados carregados: {len(df)} amostras")
+        if csv_path.endswith('.parquet'):
+            df = pd.read_parquet(csv_path, columns=FEATURE_COLUMNS + ['is_valid'])
+        else:
+            df = pd.read_csv(csv_path)
+        logger.info(f"✅ Dados carregados: {len(df)} amostras")
         
         return df
     
+    def load_feature_matrix(self, features_path='data/synthetic_features.arrow'):
+        """Carrega o arquivo Arrow só de features, mapeado em memória, como float32
+
+        Com um único bloco a matriz é uma view direta do arquivo (sem cópia);
+        com vários blocos é montada em um único array float32.
+        """
+        logger.info(f"📂 Carregando features de: {features_path}")
+        
+        if pa is None:
+            raise ImportError("pyarrow é necessário para ler arquivos Arrow (pip install pyarrow)")
+        if not os.path.exists(features_path):
+            raise FileNotFoundError(f"Arquivo não encontrado: {features_path}")
+        
+        n_features = len(FEATURE_COLUMNS)
+        source = pa.memory_map(features_path, 'r')
+        reader = pa.ipc.open_file(source)
+        
+        stored_columns = json.loads(reader.schema.metadata[b'feature_columns'])
+        if stored_columns != FEATURE_COLUMNS:
+            raise ValueError(f"Features do arquivo não conferem: {stored_columns}")
+        
+        batches = [reader.get_batch(i) for i in range(reader.num_record_batches)]
+        n_rows = sum(batch.num_rows for batch in batches)
+        
+        def batch_matrix(batch):
+            values = batch.column('features').values
+            return values.to_numpy(zero_copy_only=True).reshape(-1, n_features)
+        
+        if len(batches) == 1:
+            X = batch_matrix(batches[0])
+            y = batches[0].column('is_valid').to_numpy(zero_copy_only=True)
+        else:
+            X = np.empty((n_rows, n_features), dtype=np.float32)
+            y = np.empty(n_rows, dtype=np.int8)
+            offset = 0
+            for batch in batches:
+                X[offset:offset + batch.num_rows] = batch_matrix(batch)
+                y[offset:offset + batch.num_rows] = batch.column('is_valid').to_numpy(zero_copy_only=True)
+                offset += batch.num_rows
+        
+        logger.info(f"✅ Features carregadas: {n_rows} amostras")
+        
+        return X, y.astype(int)
+    
+    def load_text_features(self, data_path, store, chunksize=100_000):
+        """Features de um dataset só com texto e rótulo, via feature store
+
+        Só textos novos ou alterados são calculados; os demais vêm do store.
+        """
+        logger.info(f"📂 Carregando textos de: {data_path} (feature store: {store.path})")
+        
+        if not os.path.exists(data_path):
+            raise FileNotFoundError(f"Arquivo não encontrado: {data_path}")
+        
+        frames, labels = [], []
+        for chunk in iter_text_chunks(data_path, ['text', 'is_valid'], chunksize):
+            frames.append(store.get_features(chunk['text'].astype(str)))
+            # CSV guarda o rótulo como texto True/False
+            labels.append(chunk['is_valid'].astype(str).str.lower().isin(['true', '1']).to_numpy(dtype=int))
+        store.flush()
+        
+        X = pd.concat(frames, ignore_index=True)
+        y = pd.Series(np.concatenate(labels), name='is_valid')
+        
+        logger.info(f"✅ Features: {store.stats['hits']} do store, {store.stats['misses']} calculadas")
+        logger.info(f"📊 Features shape: {X.shape}")
+        
+        return X, y
+    
     def prepare_features(self, df):
         """Prepara features para treinamento"""
-        print("🔧 Preparando features...")
+        logger.info("🔧 Preparando features...")
         
         # Selecionar apenas colunas numéricas para features
-        feature_columns = [
-            'legal_terms_count', 'has_dates', 'text_length', 
-            'number_count', 'special_chars_count', 'legal_density',
-            'keywords_present', 'has_coordinates', 'uppercase_ratio'
-        ]
+        feature_columns = list(FEATURE_COLUMNS)
         
         # Verificar se todas as colunas existem
         missing_cols = [col for col in feature_columns if col not in df.columns]
         if missing_cols:
-            print(f"⚠️  Colunas faltando: {missing_cols}")
+            logger.warning(f"⚠️  Colunas faltando: {missing_cols}")
             # Criar colunas faltando com valores padrão
             for col in missing_cols:
                 df[col] = 0
@@ -126,121 +391,355 @@ class DocumentValidatorTrainer:
         X = df[feature_columns].fillna(0)
         y = df['is_valid'].astype(int)
         
-        print(f"📊 Features shape: {X.shape}")
-        print(f"🎯 Target distribution: {y.value_counts().to_dict()}")
+        logger.info(f"📊 Features shape: {X.shape}")
+        logger.info(f"🎯 Target distribution: {y.value_counts().to_dict()}")
         
         return X, y, feature_columns
     
-    def train_models(self, X, y):
-        """Treina múltiplos modelos e seleciona o melhor"""
-        print("🚀 Iniciando treinamento dos modelos...")
+    def allocate_cores(self):
+        """Divide os núcleos entre candidatos, folds e threads de cada estimador"""
+        candidate_workers = max(1, min(len(self.models), self.n_jobs))
+        cores_per_candidate = max(1, self.n_jobs // candidate_workers)
+        fold_jobs = max(1, min(self.cv_folds, cores_per_candidate))
+        estimator_jobs = max(1, cores_per_candidate // fold_jobs)
+        
+        return candidate_workers, fold_jobs, estimator_jobs
+    
+    def train_models(self, X, y, progress_callback=None):
+        """Treina os candidatos em paralelo, com validação cruzada, e seleciona o melhor
+
+        `progress_callback(name, result)` é chamado quando cada candidato termina.
+        """
+        logger.info("🚀 Iniciando treinamento dos modelos...")
         
         # Dividir dados
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42, stratify=y
         )
         
-        print(f"📈 Dados de treino: {X_train.shape[0]} amostras")
-        print(f"📊 Dados de teste: {X_test.shape[0]} amostras")
+        logger.info(f"📈 Dados de treino: {X_train.shape[0]} amostras")
+        logger.info(f"📊 Dados de teste: {X_test.shape[0]} amostras")
         
-        best_score = 0
-        results = {}
+        training_start = time.perf_counter()
+        candidate_workers, fold_jobs, estimator_jobs = self.allocate_cores()
+        logger.info(f"⚙️  {self.n_jobs} núcleos: {candidate_workers} candidatos em paralelo, "
+                    f"{fold_jobs} folds por candidato, {estimator_jobs} thread(s) por estimador")
         
+        tasks = []
         for name, model in self.models.items():
-            print(f"\n🔄 Treinando {name}...")
-            
-            # Criar pipeline com normalização
-            pipeline = Pipeline([
-                ('scaler', StandardScaler()),
-                ('classifier', model)
-            ])
-            
-            # Treinar modelo
-            pipeline.fit(X_train, y_train)
-            
-            # Avaliar
-            y_pred = pipeline.predict(X_test)
-            accuracy = accuracy_score(y_test, y_pred)
-            
-            results[name] = {
-                'model': pipeline,
-                'accuracy': accuracy,
-                'predictions': y_pred,
-                'y_test': y_test
-            }
-            
-            print(f"✅ {name} - Acurácia: {accuracy:.4f}")
-            
-            # Salvar melhor modelo
-            if accuracy > best_score:
-                best_score = accuracy
-                self.best_model = pipeline
-                self.best_model_name = name
+            model = clone(model)
+            if isinstance(model, RandomForestClassifier):
+                # Árvores treinadas em paralelo dentro de cada fold
+                model.set_params(n_jobs=estimator_jobs)
+            tasks.append((name, model, X_train, y_train, X_test, y_test, self.cv_folds, fold_jobs))
+        
+        # Pool de processos (loky) para os candidatos; dentro de cada processo os
+        # folds do cross_val_score rodam em paralelo (backend aninhado do joblib)
+        results = {}
+        parallel = Parallel(n_jobs=candidate_workers, return_as='generator_unordered')
+        for name, result in parallel(delayed(_train_candidate)(*task) for task in tasks):
+            results[name] = result
+            self._report_candidate(name, result)
+            if progress_callback is not None:
+                progress_callback(name, result)
+        
+        # Custo de servir cada candidato, medido em sequência (sem disputa de CPU)
+        for name, result in results.items():
+            classifier = result['model'].named_steps['classifier']
+            if 'n_jobs' in classifier.get_params():
+                # Servindo uma linha por vez, threads por estimador só custam
+                classifier.set_params(n_jobs=None)
+            result['serving'] = measure_serving_cost(result['model'], X_test)
+        
+        self.best_model_name, selection = self.select_model(results)
+        self.best_model = results[self.best_model_name]['model']
+        
+        self.training_info = {
+            'training_seconds': round(time.perf_counter() - training_start, 3),
+            'cv_folds': self.cv_folds,
+            'metrics': {
+                name: {
+                    'accuracy': r['accuracy'],
+                    'cv_accuracy_mean': r['cv_accuracy_mean'],
+                    'cv_accuracy_std': r['cv_accuracy_std'],
+                    **r['serving']
+                }
+                for name, r in results.items()
+            },
+            'selection': selection,
+            'serving': results[self.best_model_name]['serving'],
+            **({'search': self.search_info} if self.search_info else {})
+        }
         
-        print(f"\n🏆 Melhor modelo: {self.best_model_name} (Acurácia: {best_score:.4f})")
+        best = results[self.best_model_name]
+        logger.info(f"🏆 Melhor modelo: {self.best_model_name} (Acurácia CV: {best['cv_accuracy_mean']:.4f}, "
+                    f"p95 {best['serving']['single_row_p95_ms']:.3f} ms, {best['serving']['size_mb']:.2f} MB)")
         
         return results, X_test, y_test
     
+    def search_hyperparameters(self, X, y, n_candidates=27, factor=3):
+        """Busca os hiperparâmetros de cada candidato com successive halving
+
+        Cada modelo começa com `n_candidates` configurações sorteadas de
+        `SEARCH_SPACES` avaliadas com pouco recurso; a cada rodada só a melhor
+        fração `1/factor` segue, com `factor` vezes mais recurso. O recurso é
+        o número de árvores nas florestas (`SEARCH_RESOURCES`) e o número de
+        amostras nos demais modelos. As configurações e folds de cada rodada
+        rodam em paralelo em todos os núcleos.
+
+        Nas florestas todas as rodadas usam o treino inteiro: os folds são
+        calculados uma vez e o StandardScaler de cada fold é ajustado uma vez
+        e reaproveitado por todas as configurações (`Pipeline(memory=...)`).
+
+        A busca usa só a parte de treino do `train_test_split` de
+        `train_models`; as melhores configurações substituem os parâmetros de
+        `self.models` para o treino final.
+        """
+        logger.info(f"🔎 Busca de hiperparâmetros: {n_candidates} configurações por modelo, "
+                    f"fator {factor}, {self.n_jobs} núcleos")
+        
+        # Mesmo split de train_models: a busca não vê o conjunto de teste
+        X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+        # Matriz numpy contígua uma vez só: evita a validação de DataFrame em cada fit (~2× mais rápido)
+        X_train = np.ascontiguousarray(X_train, dtype=np.float64)
+        y_train = np.asarray(y_train)
+        cv = StratifiedKFold(n_splits=self.cv_folds, shuffle=True, random_state=42)
+        # Folds fixos para as buscas sem subamostragem (recurso = árvores)
+        cached_folds = list(cv.split(X_train, y_train))
+        
+        cache_dir = tempfile.mkdtemp(prefix='search_cache_')
+        memory = joblib.Memory(cache_dir, verbose=0)
+        search_start = time.perf_counter()
+        try:
+            for name, model in self.models.items():
+                model = clone(model)
+                if isinstance(model, SVC):
+                    # A busca pontua por acurácia: dispensa a calibração interna de probability=True
+                    model.set_params(probability=False)
+                if 'n_jobs' in model.get_params():
+                    # O paralelismo fica nas configurações/folds, não dentro do estimador
+                    model.set_params(n_jobs=1)
+                
+                resource_param = ()
+                if name in SEARCH_RESOURCES:
+                    param, min_resources, max_resources = SEARCH_RESOURCES[name]
+                    resource_options = {'resource': f'classifier__{param}', 'min_resources': min_resources,
+                                        'max_resources': max_resources, 'cv': cached_folds}
+                    resource_param = (param,)
+                else:
+                    resource_options = {'resource': 'n_samples', 'min_resources': 'exhaust', 'cv': cv}
+                
+                pipeline = Pipeline([('scaler', StandardScaler()), ('classifier', model)], memory=memory)
+                search = HalvingRandomSearchCV(
+                    pipeline,
+                    {f'classifier__{param}': values for param, values in SEARCH_SPACES[name].items()},
+                    n_candidates=n_candidates, factor=factor, scoring='accuracy', refit=False,
+                    return_train_score=False, random_state=42, n_jobs=self.n_jobs, **resource_options
+                )
+                start = time.perf_counter()
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', UserWarning)
+                    search.fit(X_train, y_train)
+                seconds = time.perf_counter() - start
+                
+                # O recurso (árvores da última rodada) não é um hiperparâmetro escolhido
+                best_params = _classifier_params(search.best_params_, exclude=resource_param)
+                self.models[name].set_params(**best_params)
+                
+                cv_results = search.cv_results_
+                self.search_info[name] = {
+                    'best_params': best_params,
+                    'best_cv_accuracy': float(search.best_score_),
+                    'n_candidates': int(search.n_candidates_[0]),
+                    'iterations': [
+                        {'n_candidates': int(n), 'n_resources': int(r)}
+                        for n, r in zip(search.n_candidates_, search.n_resources_)
+                    ],
+                    'search_seconds': round(seconds, 3),
+                    # Histórico: cada configuração em cada rodada
+                    'trace': [
+                        {
+                            'iteration': int(cv_results['iter'][i]),
+                            'n_resources': int(cv_results['n_resources'][i]),
+                            'params': _classifier_params(cv_results['params'][i], exclude=resource_param),
+                            'cv_accuracy_mean': float(cv_results['mean_test_score'][i]),
+                            'cv_accuracy_std': float(cv_results['std_test_score'][i]),
+                            'fit_seconds': float(cv_results['mean_fit_time'][i])
+                        }
+                        for i in range(len(cv_results['params']))
+                    ]
+                }
+                logger.info(f"🔎 {name}: {len(cv_results['params'])} avaliações em "
+                            f"{search.n_iterations_} rodadas ({seconds:.1f}s), "
+                            f"melhor CV {search.best_score_:.4f} com {best_params}")
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        
+        logger.info(f"✅ Busca concluída em {time.perf_counter() - search_start:.1f}s")
+        return self.search_info
+    
+    def within_budget(self, serving):
+        """Se o custo de servir (`measure_serving_cost`) cabe no orçamento"""
+        if self.latency_budget_ms is not None and serving['single_row_p95_ms'] > self.latency_budget_ms:
+            return False
+        if self.size_budget_mb is not None and serving['size_mb'] > self.size_budget_mb:
+            return False
+        return True
+    
+    def select_model(self, results):
+        """Escolhe o vencedor pela acurácia CV dentro do orçamento de latência e memória
+
+        Entre os candidatos no orçamento, os que ficam a até `accuracy_tolerance`
+        da melhor acurácia CV empatam e vence o de menor p95. Se nenhum cabe no
+        orçamento, vence o mais rápido. Retorna (nome, resumo da seleção).
+        """
+        eligible = [name for name in results if self.within_budget(results[name]['serving'])]
+        budget_met = bool(eligible)
+        if not budget_met:
+            logger.warning(f"⚠️  Nenhum candidato cabe no orçamento (p95 ≤ {self.latency_budget_ms} ms, "
+                           f"≤ {self.size_budget_mb} MB): usando o mais rápido")
+            eligible = list(results)
+        
+        best_cv = max(results[name]['cv_accuracy_mean'] for name in eligible)
+        tied = [name for name in eligible
+                if results[name]['cv_accuracy_mean'] >= best_cv - self.accuracy_tolerance]
+        candidates = tied if budget_met else eligible
+        winner = min(candidates, key=lambda name: (results[name]['serving']['single_row_p95_ms'],
+                                                   -results[name]['cv_accuracy_mean']))
+        
+        return winner, {
+            'latency_budget_ms': self.latency_budget_ms,
+            'size_budget_mb': self.size_budget_mb,
+            'accuracy_tolerance': self.accuracy_tolerance,
+            'budget_met': budget_met,
+            'eligible': sorted(eligible) if budget_met else [],
+            'tied': sorted(tied) if budget_met else []
+        }
+    
+    def _report_candidate(self, name, result):
+        logger.info(f"✅ {name} - Acurácia: {result['accuracy']:.4f} "
+                    f"(CV {self.cv_folds}-fold: {result['cv_accuracy_mean']:.4f} ± {result['cv_accuracy_std']:.4f}, "
+                    f"CV {result['cv_time']:.1f}s, treino {result['fit_time']:.1f}s)")
+    
     def evaluate_model(self, results, X_test, y_test):
         """Avalia o melhor modelo em detalhes"""
-        print(f"\n📋 Avaliação detalhada do melhor modelo ({self.best_model_name}):")
+        logger.info(f"📋 Avaliação detalhada do melhor modelo ({self.best_model_name}):")
         
         best_result = results[self.best_model_name]
         y_pred = best_result['predictions']
         
         # Relatório de classificação
-        print("\n📊 Relatório de Classificação:")
-        print(classification_report(y_test, y_pred, 
-                                  target_names=['Inválido', 'Válido']))
+        report = classification_report(y_test, y_pred, target_names=['Inválido', 'Válido'])
+        logger.info(f"📊 Relatório de Classificação:\n{report}")
         
         # Matriz de confusão
-        print("\n🔍 Matriz de Confusão:")
         cm = confusion_matrix(y_test, y_pred)
-        print(cm)
+        logger.info(f"🔍 Matriz de Confusão:\n{cm}")
+        
+        # Custo de servir de cada candidato
+        lines = [f"  {'candidato':<22} {'acc CV':>7} {'p50 ms':>8} {'p95 ms':>8} {'lote/1k ms':>11} "
+                 f"{'MB':>8} {'carga ms':>9}"]
+        for name, result in sorted(results.items(), key=lambda item: -item[1]['cv_accuracy_mean']):
+            serving = result['serving']
+            marker = '🏆' if name == self.best_model_name else ('  ' if self.within_budget(serving) else '⛔')
+            lines.append(
+                f"{marker}{name:<22} {result['cv_accuracy_mean']:>7.4f} {serving['single_row_p50_ms']:>8.3f} "
+                f"{serving['single_row_p95_ms']:>8.3f} {serving['batch_ms_per_1k_rows']:>11.2f} "
+                f"{serving['size_mb']:>8.3f} {serving['load_ms']:>9.2f}"
+            )
+        logger.info("⏱️  Custo de servir (⛔ = fora do orçamento):\n" + "\n".join(lines))
         
         # Importância das features (se disponível)
         if hasattr(self.best_model.named_steps['classifier'], 'feature_importances_'):
-            print("\n🎯 Importância das Features:")
             importances = self.best_model.named_steps['classifier'].feature_importances_
-            feature_names = [
-                'legal_terms_count', 'has_dates', 'text_length', 
-                'number_count', 'special_chars_count', 'legal_density',
-                'keywords_present', 'has_coordinates', 'uppercase_ratio'
-            ]
-            
-            for name, importance in zip(feature_names, importances):
-                print(f"  {name}: {importance:.4f}")
+            logger.info("🎯 Importância das Features:\n" + "\n".join(
+                f"  {name}: {importance:.4f}" for name, importance in zip(FEATURE_COLUMNS, importances)
+            ))
     
-    def save_model(self, model_dir='models'):
-        """Salva o melhor modelo treinado"""
-        os.makedirs(model_dir, exist_ok=True)
-        
-        model_path = os.path.join(model_dir, 'document_validator.pkl')
+    def save_model(self, model_dir='models', promote=True):
+        """Salva o melhor modelo como nova versão no registro (e a promove)"""
+        registry = ModelRegistry(model_dir)
         
-        # Salvar modelo
-        joblib.dump(self.best_model, model_path)
-        
-        # Salvar metadados
+        # Metadados: esquema de features, métricas e tempo de treino
         metadata = {
             'model_type': self.best_model_name,
             'trained_at': datetime.now().isoformat(),
-            'feature_names': [
-                'legal_terms_count', 'has_dates', 'text_length', 
-                'number_count', 'special_chars_count', 'legal_density',
-                'keywords_present', 'has_coordinates', 'uppercase_ratio'
-            ]
+            'feature_names': FEATURE_COLUMNS,
+            **self.training_info
         }
         
-        metadata_path = os.path.join(model_dir, 'model_metadata.json')
-        import json
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        version = registry.register(self.best_model, metadata)
+        if promote:
+            registry.promote(version)
         
-        print(f"💾 Modelo salvo em: {model_path}")
-        print(f"📋 Metadados salvos em: {metadata_path}")
+        model_path = os.path.join(registry.versions_dir, version, 'model.pkl')
+        logger.info(f"💾 Modelo salvo em: {model_path} (versão {version}{', promovida' if promote else ''})")
         
         return model_path
     
+    def train_incremental(self, data_path, chunksize=100_000, base_model_path=None):
+        """Treina (ou atualiza) um modelo lendo o dataset em blocos
+
+        Usa StandardScaler e SGDClassifier com `partial_fit`: a média/variância
+        do scaler são estatísticas acumuladas e cada bloco é visto uma vez,
+        então a memória não cresce com o tamanho do dataset. Com
+        `base_model_path` o modelo existente é atualizado só com os dados
+        novos de `data_path`, sem revisitar o histórico.
+        """
+        logger.info(f"🔁 Treinamento incremental a partir de: {data_path}")
+        
+        if base_model_path:
+            pipeline = joblib.load(base_model_path)
+            if not all(hasattr(step, 'partial_fit') for _, step in pipeline.steps):
+                raise ValueError(f"Modelo em {base_model_path} não suporta treino incremental")
+            logger.info(f"📦 Atualizando modelo existente: {base_model_path}")
+        else:
+            pipeline = Pipeline([
+                ('scaler', StandardScaler()),
+                ('classifier', SGDClassifier(loss='log_loss', random_state=42))
+            ])
+        scaler = pipeline.named_steps['scaler']
+        classifier = pipeline.named_steps['classifier']
+        
+        start = time.perf_counter()
+        n_chunks = 0
+        n_new = 0
+        n_correct = 0
+        n_evaluated = 0
+        
+        for X_chunk, y_chunk in iter_feature_chunks(data_path, chunksize):
+            # Validação progressiva: avalia o bloco antes de treinar com ele
+            if hasattr(classifier, 'coef_'):
+                y_pred = classifier.predict(scaler.transform(X_chunk))
+                n_correct += int((y_pred == y_chunk).sum())
+                n_evaluated += len(y_chunk)
+            
+            scaler.partial_fit(X_chunk)
+            classifier.partial_fit(scaler.transform(X_chunk), y_chunk, classes=[0, 1])
+            
+            n_chunks += 1
+            n_new += len(y_chunk)
+        
+        elapsed = time.perf_counter() - start
+        progressive_accuracy = n_correct / n_evaluated if n_evaluated else None
+        
+        self.best_model = pipeline
+        self.best_model_name = 'sgd_incremental'
+        self.training_info = {
+            'incremental': True,
+            'samples_seen': int(scaler.n_samples_seen_),
+            'samples_last_update': n_new,
+            'progressive_accuracy': progressive_accuracy,
+            'training_seconds': round(elapsed, 3)
+        }
+        
+        logger.info(f"✅ {n_new} amostras em {n_chunks} blocos ({elapsed:.1f}s); "
+                    f"total visto pelo modelo: {int(scaler.n_samples_seen_)}")
+        if progressive_accuracy is not None:
+            logger.info(f"📊 Acurácia progressiva: {progressive_accuracy:.4f}")
+        
+        return self.training_info
+    
     def predict(self, features):
         """Faz predição com o modelo treinado"""
         if self.best_model is None:
@@ -248,12 +747,7 @@ class DocumentValidatorTrainer:
         
         # Converter para formato correto se necessário
         if isinstance(features, dict):
-            feature_order = [
-                'legal_terms_count', 'has_dates', 'text_length', 
-                'number_count', 'special_chars_count', 'legal_density',
-                'keywords_present', 'has_coordinates', 'uppercase_ratio'
-            ]
-            features = [[features.get(f, 0) for f in feature_order]]
+            features = [[features.get(f, 0) for f in FEATURE_COLUMNS]]
         
         prediction = self.best_model.predict(features)[0]
         probability = self.best_model.predict_proba(features)[0]
@@ -268,22 +762,64 @@ class DocumentValidatorTrainer:
         }
 
 def main():
+    parser = argparse.ArgumentParser(description="Treina o modelo de validação de documentos")
+    parser.add_argument('--data', default='data/synthetic_data.csv',
+                        help="Dataset (.csv, .parquet ou .arrow só de features)")
+    parser.add_argument('--jobs', type=int, default=None,
+                        help="Núcleos para o treinamento (padrão: todos)")
+    parser.add_argument('--cv-folds', type=int, default=5, help="Folds da validação cruzada")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Treino incremental em blocos (partial_fit, memória constante)")
+    parser.add_argument('--update-model', default=None,
+                        help="Modelo incremental a atualizar com --data (ex.: models/versions/<versão>/model.pkl)")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Linhas por bloco no modo incremental")
+    parser.add_argument('--feature-store', default=None,
+                        help="Calcula features do texto via feature store (ex.: data/feature_store)")
+    parser.add_argument('--search', action='store_true',
+                        help="Busca hiperparâmetros (successive halving) antes do treino final")
+    parser.add_argument('--search-candidates', type=int, default=27,
+                        help="Configurações sorteadas por modelo na primeira rodada da busca")
+    parser.add_argument('--latency-budget-ms', type=float, default=None,
+                        help="p95 máximo de predição de 1 linha (padrão: ML_LATENCY_BUDGET_MS, sem limite)")
+    parser.add_argument('--size-budget-mb', type=float, default=None,
+                        help="Tamanho máximo do modelo serializado (padrão: ML_MODEL_SIZE_BUDGET_MB, sem limite)")
+    parser.add_argument('--accuracy-tolerance', type=float, default=None,
+                        help="Diferença de acurácia CV considerada empate; vence o mais rápido (padrão 0.005)")
+    args = parser.parse_args()
+
+    configure_logging()
     print("🤖 Iniciando treinamento do modelo de validação de documentos...")
     
-    trainer = DocumentValidatorTrainer()
+    trainer = DocumentValidatorTrainer(n_jobs=args.jobs, cv_folds=args.cv_folds,
+                                       latency_budget_ms=args.latency_budget_ms,
+                                       size_budget_mb=args.size_budget_mb,
+                                       accuracy_tolerance=args.accuracy_tolerance)
     
     try:
-        # Carregar dados
-        df = trainer.load_data()
-        
-        # Preparar features
-        X, y, feature_columns = trainer.prepare_features(df)
+        if args.incremental or args.update_model:
+            trainer.train_incremental(args.data, args.chunksize, args.update_model)
+        elif args.feature_store:
+            # Reaproveita as features já calculadas para os mesmos textos
+            X, y = trainer.load_text_features(args.data, FeatureStore(args.feature_store), args.chunksize)
+        elif args.data.endswith('.arrow'):
+            # Features float32 mapeadas em memória, sem a coluna de texto
+            X, y = trainer.load_feature_matrix(args.data)
+        else:
+            # Carregar dados
+            df = trainer.load_data(args.data)
+            
+            # Preparar features
+            X, y, feature_columns = trainer.prepare_features(df)
         
-        # Treinar modelos
-        results, X_test, y_test = trainer.train_models(X, y)
+        if trainer.best_model is None and args.search:
+            trainer.search_hyperparameters(X, y, n_candidates=args.search_candidates)
         
-        # Avaliar melhor modelo
-        trainer.evaluate_model(results, X_test, y_test)
+        if trainer.best_model is None:
+            # Treinar modelos
+            results, X_test, y_test = trainer.train_models(X, y)
+            
+            # Avaliar melhor modelo
+            trainer.evaluate_model(results, X_test, y_test)
         
         # Salvar modelo
         model_path = trainer.save_model()
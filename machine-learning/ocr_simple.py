@@ -4,8 +4,13 @@ import pytesseract
 import re
 import os
 import base64
+import time
 from typing import Dict, Any
 
+from logging_config import get_logger
+
+logger = get_logger('ocr')
+
 class OCRProcessor:
     def __init__(self):
         # Configuração simples do Mistral
@@ -18,7 +23,7 @@ class OCRProcessor:
                 from mistralai.models.chat_completion import ChatMessage
                 self.mistral_client = MistralClient(api_key=self.mistral_api_key)
                 self.ChatMessage = ChatMessage
-                print("✅ Mistral configurado")
+                logger.info("✅ Mistral configurado")
             except ImportError:
                 self.use_mistral = False
 
@@ -35,7 +40,7 @@ class OCRProcessor:
             text = pytesseract.image_to_string(gray, config='--oem 3 --psm 6 -l por')
             return text.strip()
         except Exception as e:
-            print(f"Erro Tesseract: {e}")
+            logger.error(f"Erro Tesseract: {e}")
             return ""
 
     def extract_text_mistral(self, image_bytes: bytes):
@@ -74,7 +79,7 @@ class OCRProcessor:
             return text
             
         except Exception as e:
-            print(f"Erro Mistral: {e}")
+            logger.error(f"Erro Mistral: {e}")
             return ""
 
     def is_valid_document(self, text: str):
@@ -92,46 +97,116 @@ class OCRProcessor:
         
         return found_terms >= 2 and not has_invalid
 
-    def process_uploaded_file(self, file_content: bytes, filename: str):
-        """Processa arquivo"""
+    def strip_bounds(self, gray, strip_height=None):
+        """Faixas horizontais (início, fim) da imagem para OCR incremental
+
+        Os cortes ficam na linha com menos tinta perto de cada múltiplo de
+        `strip_height`, para não partir uma linha de texto ao meio. Sem
+        `strip_height` (ou em imagens baixas) a página é uma faixa só.
+        """
+        height = gray.shape[0]
+        if not strip_height or height <= strip_height * 1.5:
+            return [(0, height)]
+        
+        ink = (gray < 128).sum(axis=1)
+        window = strip_height // 4
+        cuts = [0]
+        target = strip_height
+        while target < height - strip_height // 2:
+            low, high = max(target - window, cuts[-1] + 1), min(target + window, height - 1)
+            cut = low + int(np.argmin(ink[low:high]))
+            cuts.append(cut)
+            target = cut + strip_height
+        cuts.append(height)
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    def iter_process_uploaded_file(self, file_content: bytes, filename: str, strip_height=None):
+        """Versão incremental de `process_uploaded_file`
+
+        Gera eventos `(nome, dados)`: `decoded` (dimensões e número de faixas),
+        um `ocr` por faixa com o texto parcial e, por último, `done` com o mesmo
+        resultado de `process_uploaded_file`. O OCR de cada faixa só roda quando
+        o próximo evento é pedido: parar de consumir cancela o restante.
+        """
+        timings = {}
         try:
             # Converter para imagem
+            start = time.perf_counter()
             nparr = np.frombuffer(file_content, np.uint8)
             image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            timings["decode"] = time.perf_counter() - start
             
             if image is None:
-                return {"success": False, "error": "Imagem inválida", "text": ""}
+                yield "done", {"success": False, "error": "Imagem inválida", "error_code": "invalid_image",
+                               "text": "", "timings": timings}
+                return
             
-            # Tentar Mistral primeiro
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            bounds = self.strip_bounds(gray, strip_height)
+            yield "decoded", {"width": image.shape[1], "height": image.shape[0], "strips": len(bounds),
+                              "seconds": timings["decode"]}
+            
+            # Tentar Mistral primeiro (página inteira)
             text = ""
             method = "tesseract"
             
             if self.use_mistral:
+                start = time.perf_counter()
                 text = self.extract_text_mistral(file_content)
+                timings["ocr_mistral"] = time.perf_counter() - start
                 if text:
                     method = "mistral"
+                    yield "ocr", {"strip": 1, "strips": 1, "text": text, "method": method,
+                                  "seconds": timings["ocr_mistral"]}
             
-            # Fallback para Tesseract
+            # Fallback para Tesseract, faixa por faixa
             if not text:
-                text = self.extract_text_tesseract(image)
+                parts = []
+                timings["ocr_tesseract"] = 0.0
+                for i, (top, bottom) in enumerate(bounds, 1):
+                    start = time.perf_counter()
+                    part = self.extract_text_tesseract(gray[top:bottom])
+                    seconds = time.perf_counter() - start
+                    timings["ocr_tesseract"] += seconds
+                    if part:
+                        parts.append(part)
+                    yield "ocr", {"strip": i, "strips": len(bounds), "text": part, "method": "tesseract",
+                                  "seconds": seconds}
+                text = "\n".join(parts)
                 method = "tesseract"
             
             # Validar se é documento de terra
             if not self.is_valid_document(text):
-                return {
+                yield "done", {
                     "success": False,
                     "error": "Documento não é relacionado a propriedade de terra",
-                    "text": text
+                    "error_code": "not_land_document",
+                    "text": text,
+                    "method_used": method,
+                    "timings": timings
                 }
+                return
             
-            return {
+            yield "done", {
                 "success": True,
                 "text": text,
-                "method_used": method
+                "method_used": method,
+                "timings": timings
             }
             
         except Exception as e:
-            return {"success": False, "error": f"Erro: {str(e)}", "text": ""}
+            yield "done", {"success": False, "error": f"Erro: {str(e)}", "error_code": "ocr_error",
+                           "text": "", "timings": timings}
+
+    def process_uploaded_file(self, file_content: bytes, filename: str):
+        """Processa arquivo
+
+        O resultado traz `timings` (segundos) de cada etapa executada:
+        `decode`, `ocr_mistral`, `ocr_tesseract`.
+        """
+        for event, data in self.iter_process_uploaded_file(file_content, filename):
+            if event == "done":
+                return data
 
     def extract_structured_info(self, text: str):
         """Extrai informações básicas"""
@@ -149,6 +224,16 @@ class OCRProcessor:
         
         return info
 
+def synthetic_document_image(lines, width=600, line_height=50):
+    """PNG com as linhas de texto em preto sobre branco (teste e aquecimento do OCR)"""
+    image = np.ones((line_height * (len(lines) + 3), width, 3), dtype=np.uint8) * 255
+    for i, line in enumerate(lines):
+        scale = 1 if i == 0 else 0.7
+        cv2.putText(image, line, (50, line_height * (i + 2)), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), 2)
+    
+    _, buffer = cv2.imencode('.png', image)
+    return buffer.tobytes()
+
 def test_simple():
     """Teste simples"""
     print("🧪 Teste simples do OCR...")
@@ -156,13 +241,7 @@ def test_simple():
     processor = OCRProcessor()
     
     # Criar imagem de teste
-    test_image = np.ones((300, 600, 3), dtype=np.uint8) * 255
-    cv2.putText(test_image, "ESCRITURA PUBLICA", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-    cv2.putText(test_image, "Matricula: 12345", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-    cv2.putText(test_image, "Propriedade rural", (50, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-    
-    _, buffer = cv2.imencode('.png', test_image)
-    image_bytes = buffer.tobytes()
+    image_bytes = synthetic_document_image(["ESCRITURA PUBLICA", "Matricula: 12345", "Propriedade rural"])
     
     result = processor.process_uploaded_file(image_bytes, "test.png")
     
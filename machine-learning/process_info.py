@@ -0,0 +1,26 @@
+import os
+
+def process_token(pid):
+    """Instante de início do processo (`/proc/<pid>/stat`, em ticks desde o boot) ou None
+
+    Distingue um processo novo que reaproveitou o PID (ex.: reinício do
+    container, onde o worker volta com o mesmo PID).
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # O nome do processo (2º campo) pode ter espaços; os campos seguintes vêm depois do ')'
+    return stat.rsplit(')', 1)[1].split()[19]
+
+def process_alive(pid, token=None):
+    """Se o processo `pid` existe e, com `token`, se ainda é o mesmo processo"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    current = process_token(pid)
+    return token is None or current is None or current == token
@@ -0,0 +1,194 @@
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Perfis da requisição atual: o principal (event loop) + os das threads de OCR
+_current_profiles = contextvars.ContextVar('current_profiles', default=None)
+
+class RequestProfiler:
+    """Perfis cProfile de uma fração amostrada das requisições
+
+    Ativado por `ML_PROFILE_RATE` (fração de 0 a 1) ou, por requisição, pelo
+    header `X-Profile` com o token de `ML_PROFILE_TOKEN`. Cada perfil é salvo
+    em `directory` como `<id>.prof` (pstats) com os metadados da requisição em
+    `<id>.json`. Só uma requisição por processo é perfilada por vez: o cProfile
+    é por thread e, no event loop, também captura as requisições intercaladas.
+    """
+
+    def __init__(self, directory='profiles', rate=0.0, token=None, keep=200):
+        self.directory = directory
+        self.rate = rate
+        self.token = token or None
+        self.keep = keep
+        self._busy = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            directory=os.getenv('ML_PROFILE_DIR', 'profiles'),
+            rate=float(os.getenv('ML_PROFILE_RATE', '0')),
+            token=os.getenv('ML_PROFILE_TOKEN'),
+            keep=int(os.getenv('ML_PROFILE_KEEP', '200'))
+        )
+
+    @property
+    def enabled(self):
+        return self.rate > 0 or self.token is not None
+
+    def check_token(self, token):
+        return self.token is not None and token is not None and secrets.compare_digest(token, self.token)
+
+    def should_profile(self, headers):
+        """Decide se a requisição (headers ASGI) será perfilada"""
+        requested = headers.get(b'x-profile')
+        if requested is not None:
+            return self.check_token(requested.decode('latin-1'))
+        return self.rate > 0 and random.random() < self.rate
+
+    def wrap(self, func):
+        """Perfila `func` na thread em que rodar (ex.: OCR no pool) se a requisição estiver sendo perfilada"""
+        profiles = _current_profiles.get()
+        if profiles is None:
+            return func
+
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: o cProfile usa sys.monitoring, que aceita um perfil ativo
+                # por vez; o do event loop já registra as chamadas das outras threads
+                return func(*args, **kwargs)
+            profiles.append(profile)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+
+        return profiled
+
+    def save(self, profiles, metadata):
+        """Grava o perfil combinado e seus metadados; retorna o id"""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(os.path.join(self.directory, f"{profile_id}.prof"))
+
+        # Resumo das funções com mais tempo próprio junto dos metadados
+        stats.sort_stats('tottime')
+        top = []
+        for func in stats.fcn_list[:15]:
+            _, _, total_time, cumulative_time, _ = stats.stats[func]
+            top.append({
+                'function': f"{os.path.basename(func[0])}:{func[1]}({func[2]})",
+                'total_seconds': round(total_time, 6),
+                'cumulative_seconds': round(cumulative_time, 6)
+            })
+
+        metadata = {**metadata, 'profile_id': profile_id, 'threads': len(profiles), 'top': top}
+        with open(os.path.join(self.directory, f"{profile_id}.json"), 'w') as f:
+            json.dump(metadata, f, indent=2, default=str)
+
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Mantém só os `keep` perfis mais recentes"""
+        for profile_id in self.list_ids()[self.keep:]:
+            for ext in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + ext))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self):
+        """Ids dos perfis gravados, mais recentes primeiro"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [entry.name[:-5] for entry in entries]
+
+    def list_profiles(self, limit=50):
+        """Metadados dos perfis mais recentes"""
+        profiles = []
+        for profile_id in self.list_ids()[:limit]:
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                    profiles.append(json.load(f))
+            except FileNotFoundError:
+                continue
+        return profiles
+
+    def profile_path(self, profile_id):
+        """Caminho do `.prof` (ou None se o id for inválido ou não existir)"""
+        if not re.fullmatch(r'\d{8}-\d{6}-[0-9a-f]{8}', profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.prof")
+        return path if os.path.exists(path) else None
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila as requisições escolhidas por `RequestProfiler`"""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.profiler.should_profile(dict(scope['headers'])):
+            await self.app(scope, receive, send)
+            return
+
+        # Outra requisição já está sendo perfilada neste processo
+        if not self.profiler._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        response = {'status': None, 'bytes': 0}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['bytes'] += len(message.get('body', b''))
+            await send(message)
+
+        profile = cProfile.Profile()
+        profiles = [profile]
+        token = _current_profiles.set(profiles)
+        started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            _current_profiles.reset(token)
+            try:
+                headers = dict(scope['headers'])
+                self.profiler.save(profiles, {
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'query': scope.get('query_string', b'').decode('latin-1'),
+                    'status': response['status'],
+                    'request_bytes': int(headers.get(b'content-length', b'0') or 0),
+                    'response_bytes': response['bytes'],
+                    'duration_seconds': round(duration, 6),
+                    'started_at': started_at,
+                    'pid': os.getpid()
+                })
+            finally:
+                self.profiler._busy.release()
@@ -0,0 +1,348 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from data_generator import SyntheticDataGenerator, derive_shard_seed
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:
+    Image = None
+
+# Versão da renderização; mude ao alterar o desenho ou os artefatos para não
+# comparar medições de OCR entre corpora diferentes
+CORPUS_VERSION = 'scan-v1'
+
+# Data de referência fixa: as datas dos textos não dependem de quando o corpus é gerado
+REFERENCE_TIME = datetime(2025, 1, 1)
+
+# Tamanhos de página em milímetros (largura, altura)
+PAGE_SIZES = {
+    'a4': (210.0, 297.0),
+    'letter': (215.9, 279.4),
+    'oficio': (216.0, 330.0)
+}
+
+# Intensidade máxima de cada artefato; cada página sorteia valores até esses limites
+ARTIFACT_LEVELS = {
+    'clean': {'rotation': 0.0, 'blur': 0.0, 'noise': 0.0, 'lighting': 0.0, 'jpeg_quality': None},
+    'light': {'rotation': 1.0, 'blur': 0.6, 'noise': 4.0, 'lighting': 0.12, 'jpeg_quality': (75, 95)},
+    'heavy': {'rotation': 3.0, 'blur': 1.3, 'noise': 12.0, 'lighting': 0.35, 'jpeg_quality': (35, 70)}
+}
+
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSerif-Regular.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/Library/Fonts/Arial.ttf',
+    'C:\\Windows\\Fonts\\times.ttf'
+]
+
+def available_fonts(font_paths=None):
+    """Fontes TrueType existentes entre as candidatas padrão, ou as pedidas (todas obrigatórias)"""
+    if font_paths:
+        missing = [path for path in font_paths if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Fonte não encontrada: {', '.join(missing)}")
+        return list(font_paths)
+    return [path for path in FONT_CANDIDATES if os.path.exists(path)]
+
+def font_fingerprints(font_paths):
+    """Nome e SHA-256 de cada fonte; sem fontes, a embutida do Pillow (pela versão)"""
+    if not font_paths:
+        from PIL import __version__ as pillow_version
+        return [{'font': 'default', 'pillow': pillow_version}]
+    fingerprints = []
+    for path in font_paths:
+        with open(path, 'rb') as f:
+            fingerprints.append({'font': os.path.basename(path), 'sha256': hashlib.sha256(f.read()).hexdigest()})
+    return fingerprints
+
+def document_kind(text, is_valid):
+    """Tipo do documento pelo início do texto: escritura, certidao, memorial ou invalid"""
+    if not is_valid:
+        return 'invalid'
+    for prefix, kind in (('ESCRITURA', 'escritura'), ('CERTIDÃO', 'certidao'), ('MEMORIAL', 'memorial')):
+        if text.startswith(prefix):
+            return kind
+    return 'other'
+
+class ScanRenderer:
+    """Desenha textos em páginas e aplica artefatos de digitalização
+
+    A página é desenhada em tons de cinza no tamanho e DPI pedidos, com
+    margens de 20 mm. Os artefatos (iluminação irregular, rotação, desfoque,
+    ruído e compressão JPEG) usam o gerador numpy recebido, então a mesma
+    seed produz os mesmos bytes com as mesmas fontes. Sem `font_paths` as
+    fontes vêm do sistema e podem mudar entre máquinas; `font_paths` fixa
+    as fontes e falha se alguma não existir.
+    """
+
+    def __init__(self, dpi=200, page_size='a4', artifacts='light', font_paths=None):
+        if Image is None:
+            raise ImportError("Pillow é necessário para gerar o corpus (pip install pillow)")
+        if page_size not in PAGE_SIZES:
+            raise ValueError(f"Tamanho de página desconhecido: {page_size} ({', '.join(PAGE_SIZES)})")
+        if artifacts not in ARTIFACT_LEVELS:
+            raise ValueError(f"Nível de artefatos desconhecido: {artifacts} ({', '.join(ARTIFACT_LEVELS)})")
+
+        self.dpi = dpi
+        self.page_size = page_size
+        self.artifacts = artifacts
+        self.fonts = available_fonts(font_paths)
+
+        width_mm, height_mm = PAGE_SIZES[page_size]
+        self.width = round(width_mm / 25.4 * dpi)
+        self.height = round(height_mm / 25.4 * dpi)
+        self.margin = round(20 / 25.4 * dpi)
+
+    def _font(self, path, size_pt):
+        size_px = max(8, round(size_pt / 72 * self.dpi))
+        if path is None:
+            return ImageFont.load_default(size=size_px)
+        return ImageFont.truetype(path, size_px)
+
+    def _wrap(self, text, font, max_width):
+        """Quebra cada parágrafo em linhas que cabem em `max_width` pixels"""
+        lines = []
+        for paragraph in text.split('\n'):
+            words = paragraph.split()
+            if not words:
+                lines.append('')
+                continue
+            line = words[0]
+            for word in words[1:]:
+                candidate = f"{line} {word}"
+                if font.getlength(candidate) <= max_width:
+                    line = candidate
+                else:
+                    lines.append(line)
+                    line = word
+            lines.append(line)
+        return lines
+
+    def render_page(self, text, rng):
+        """Página limpa (modo L) com o texto; retorna (imagem, parâmetros do desenho)"""
+        font_path = self.fonts[rng.integers(len(self.fonts))] if self.fonts else None
+        size_pt = float(rng.uniform(10, 12.5))
+        paper = int(rng.integers(240, 256))
+        max_width = self.width - 2 * self.margin
+
+        # Reduz a fonte até o texto caber numa página
+        while True:
+            font = self._font(font_path, size_pt)
+            line_height = round(font.size * 1.35)
+            lines = self._wrap(text, font, max_width)
+            if len(lines) * line_height <= self.height - 2 * self.margin or size_pt <= 6:
+                break
+            size_pt *= 0.9
+
+        image = Image.new('L', (self.width, self.height), paper)
+        draw = ImageDraw.Draw(image)
+        ink = int(rng.integers(0, 50))
+        y = self.margin
+        for line in lines:
+            draw.text((self.margin, y), line, font=font, fill=ink)
+            y += line_height
+
+        return image, {
+            'font': os.path.basename(font_path) if font_path else 'default',
+            'font_size_pt': round(size_pt, 2),
+            'lines': len(lines)
+        }
+
+    def apply_artifacts(self, image, rng):
+        """Aplica os artefatos do nível configurado; retorna (bytes da imagem, formato, parâmetros)"""
+        level = ARTIFACT_LEVELS[self.artifacts]
+        params = {}
+
+        # Iluminação irregular: gradiente a partir de um ponto aleatório da página
+        if level['lighting'] > 0:
+            strength = float(rng.uniform(0, level['lighting']))
+            cx, cy = rng.uniform(0, self.width), rng.uniform(0, self.height)
+            ys, xs = np.mgrid[0:self.height, 0:self.width].astype(np.float32)
+            distance = np.hypot(xs - cx, ys - cy) / np.hypot(self.width, self.height)
+            pixels = np.asarray(image, dtype=np.float32) * (1 - strength * distance)
+            image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+            params['lighting'] = round(strength, 3)
+
+        if level['rotation'] > 0:
+            angle = float(rng.uniform(-level['rotation'], level['rotation']))
+            image = image.rotate(angle, resample=Image.BICUBIC, fillcolor=int(np.median(image)))
+            params['rotation_deg'] = round(angle, 3)
+
+        if level['blur'] > 0:
+            radius = float(rng.uniform(0, level['blur']))
+            image = image.filter(ImageFilter.GaussianBlur(radius))
+            params['blur_radius'] = round(radius, 3)
+
+        if level['noise'] > 0:
+            sigma = float(rng.uniform(0, level['noise']))
+            pixels = np.asarray(image, dtype=np.float32) + rng.normal(0, sigma, (self.height, self.width))
+            image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+            params['noise_sigma'] = round(sigma, 3)
+
+        buffer = io.BytesIO()
+        if level['jpeg_quality'] is None:
+            image.save(buffer, format='PNG')
+            return buffer.getvalue(), 'png', params
+
+        quality = int(rng.integers(level['jpeg_quality'][0], level['jpeg_quality'][1] + 1))
+        image.save(buffer, format='JPEG', quality=quality)
+        params['jpeg_quality'] = quality
+        return buffer.getvalue(), 'jpg', params
+
+    def render(self, text, rng):
+        """Bytes da página digitalizada, formato e parâmetros sorteados"""
+        image, page_params = self.render_page(text, rng)
+        data, fmt, artifact_params = self.apply_artifacts(image, rng)
+        return data, fmt, {**page_params, **artifact_params}
+
+def _render_documents(task):
+    """Gera e grava um bloco de documentos (executado em processo separado)"""
+    output_dir, seed, indices, valid_ratio, renderer_options = task
+    renderer = ScanRenderer(**renderer_options)
+    entries = []
+
+    for index in indices:
+        # Seed própria por documento: o corpus não depende da ordem nem do número de processos
+        doc_seed = derive_shard_seed(seed, index)
+        generator = SyntheticDataGenerator(seed=doc_seed, reference_time=REFERENCE_TIME)
+        is_valid = generator.rng.random() < valid_ratio
+        text = (generator.generate_valid_document_text() if is_valid
+                else generator.generate_invalid_document_text())
+
+        data, fmt, params = renderer.render(text, np.random.default_rng(doc_seed))
+        doc_id = f"doc-{index:06d}"
+        image_path = os.path.join('images', f"{doc_id}.{fmt}")
+        text_path = os.path.join('text', f"{doc_id}.txt")
+        with open(os.path.join(output_dir, image_path), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(output_dir, text_path), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        entries.append({
+            'id': doc_id,
+            'image': image_path,
+            'text': text_path,
+            'is_valid': is_valid,
+            'kind': document_kind(text, is_valid),
+            'text_chars': len(text),
+            'image_bytes': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            **params
+        })
+
+    return entries
+
+def generate_corpus(output_dir='data/scan_corpus', n_documents=200, seed=42, dpi=200, page_size='a4',
+                    artifacts='light', valid_ratio=0.7, workers=None, font_paths=None):
+    """Gera o corpus de páginas digitalizadas com o texto de referência
+
+    Grava `images/<id>.(jpg|png)`, `text/<id>.txt` (texto de referência),
+    `manifest.jsonl` (uma linha por documento com tipo, rótulo e artefatos
+    sorteados) e `corpus.json` (parâmetros da geração, com o SHA-256 das
+    fontes). A mesma seed gera os mesmos arquivos, com qualquer número de
+    processos, desde que as fontes sejam as mesmas: só é reprodutível entre
+    máquinas com `font_paths` apontando para os mesmos arquivos.
+    """
+    renderer_options = {'dpi': dpi, 'page_size': page_size, 'artifacts': artifacts,
+                        'font_paths': font_paths}
+    # Valida os parâmetros antes de criar processos
+    renderer = ScanRenderer(**renderer_options)
+
+    os.makedirs(os.path.join(output_dir, 'images'), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, 'text'), exist_ok=True)
+
+    workers = workers or 1
+    blocks = [range(start, min(start + 50, n_documents)) for start in range(0, n_documents, 50)]
+    tasks = [(output_dir, seed, block, valid_ratio, renderer_options) for block in blocks]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_render_documents, tasks))
+    else:
+        results = [_render_documents(task) for task in tasks]
+
+    entries = [entry for block in results for entry in block]
+    manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    corpus_info = {
+        'corpus_version': CORPUS_VERSION,
+        'documents': n_documents,
+        'seed': seed,
+        'dpi': dpi,
+        'page_size': page_size,
+        'page_pixels': [renderer.width, renderer.height],
+        'artifacts': artifacts,
+        'artifact_limits': ARTIFACT_LEVELS[artifacts],
+        'valid_ratio': valid_ratio,
+        'fonts': font_fingerprints(renderer.fonts),
+        'reference_time': REFERENCE_TIME.isoformat(),
+        'created_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(output_dir, 'corpus.json'), 'w') as f:
+        json.dump(corpus_info, f, indent=2)
+
+    return corpus_info, entries
+
+def iter_corpus(corpus_dir='data/scan_corpus', limit=None):
+    """Percorre o corpus: (entrada do manifesto, bytes da imagem, texto de referência)"""
+    with open(os.path.join(corpus_dir, 'manifest.jsonl'), encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if limit is not None and i >= limit:
+                break
+            entry = json.loads(line)
+            with open(os.path.join(corpus_dir, entry['image']), 'rb') as image_file:
+                image = image_file.read()
+            with open(os.path.join(corpus_dir, entry['text']), encoding='utf-8') as text_file:
+                text = text_file.read()
+            yield entry, image, text
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um corpus de páginas digitalizadas sintéticas para OCR")
+    parser.add_argument('--output', default='data/scan_corpus', help="Diretório do corpus")
+    parser.add_argument('--documents', type=int, default=200, help="Número de documentos")
+    parser.add_argument('--seed', type=int, default=42, help="Seed (mesma seed, mesmos arquivos)")
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--page-size', default='a4', choices=list(PAGE_SIZES))
+    parser.add_argument('--artifacts', default='light', choices=list(ARTIFACT_LEVELS),
+                        help="Intensidade de rotação, desfoque, ruído, iluminação e JPEG")
+    parser.add_argument('--valid-ratio', type=float, default=0.7, help="Fração de documentos válidos")
+    parser.add_argument('--workers', type=int, default=None, help="Processos de renderização")
+    parser.add_argument('--font', action='append', default=None,
+                        help="Fonte TrueType (pode repetir; padrão: DejaVu/Liberation do sistema). "
+                             "Fixe as fontes para gerar o mesmo corpus em outra máquina")
+    args = parser.parse_args()
+    for path in args.font or []:
+        if not os.path.exists(path):
+            parser.error(f"fonte não encontrada: {path}")
+
+    print(f"🖨️  Gerando {args.documents} páginas ({args.page_size}, {args.dpi} dpi, artefatos {args.artifacts})...")
+    corpus_info, entries = generate_corpus(
+        args.output, args.documents, args.seed, args.dpi, args.page_size, args.artifacts,
+        args.valid_ratio, args.workers, args.font
+    )
+
+    kinds = {}
+    for entry in entries:
+        kinds[entry['kind']] = kinds.get(entry['kind'], 0) + 1
+    total_mb = sum(entry['image_bytes'] for entry in entries) / 1024 / 1024
+    print(f"✅ Corpus em {args.output}: {len(entries)} páginas, {total_mb:.1f} MB")
+    print(f"📊 Tipos: {kinds}")
+    print(f"🔤 Fontes: {', '.join(font['font'] for font in corpus_info['fonts'])}")
+    if not args.font:
+        print("⚠️ Fontes do sistema: o corpus só se repete em máquinas com as mesmas fontes (use --font)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import gc
+import glob
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+
+import uvicorn
+
+from logging_config import get_logger, stop_logging
+
+logger = get_logger('serving')
+
+def plan_worker_resources(workers=None, ocr_threads=None):
+    """Divide a CPU entre workers HTTP e threads de OCR sem oversubscription
+
+    Cada thread de OCR dispara um processo Tesseract limitado a 1 thread
+    (OMP_THREAD_LIMIT), então workers × ocr_threads ≈ núcleos disponíveis.
+    """
+    cpus = os.cpu_count() or 1
+    workers = max(1, workers or 1)
+    ocr_threads = max(1, ocr_threads or cpus // workers)
+
+    return {
+        'cpus': cpus,
+        'workers': workers,
+        'ocr_threads': ocr_threads,
+        'tesseract_threads': 1
+    }
+
+def apply_resource_plan(plan):
+    """Aplica os limites de threads do plano no processo atual (herdados pelos workers)"""
+    os.environ['ML_OCR_THREADS'] = str(plan['ocr_threads'])
+    # Tesseract (OpenMP) lê este limite a cada execução
+    os.environ.setdefault('OMP_THREAD_LIMIT', str(plan['tesseract_threads']))
+
+    # BLAS/OpenMP do numpy/sklearn: 1 thread por worker quando há vários
+    if plan['workers'] > 1:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+
+def _bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def _prepare_metrics_dir():
+    """Diretório dos snapshots de métricas dos workers (ML_METRICS_DIR ou temporário)
+
+    Snapshots de uma execução anterior são apagados: os contadores recomeçam
+    junto com o servidor. Retorna o diretório e se ele deve ser removido ao sair.
+    """
+    metrics_dir = os.getenv('ML_METRICS_DIR')
+    if not metrics_dir:
+        metrics_dir = tempfile.mkdtemp(prefix='ml-metrics-')
+        os.environ['ML_METRICS_DIR'] = metrics_dir
+        return metrics_dir, True
+
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.json')):
+        os.remove(path)
+    return metrics_dir, False
+
+def _run_worker(app, sock, log_level):
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def serve_prefork(app, host='0.0.0.0', port=8000, workers=1, preload=None, log_level='info'):
+    """Serve `app` com N workers criados por fork depois de `preload()`
+
+    O modelo carregado em `preload` antes do fork é compartilhado entre os
+    workers (copy-on-write); `gc.freeze()` evita que o coletor de lixo
+    toque nos objetos herdados e force a cópia das páginas.
+    """
+    if preload is not None:
+        preload()
+
+    if workers == 1:
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
+        return
+
+    sock = _bind_socket(host, port)
+    # Antes do fork: os workers herdam ML_METRICS_DIR e /metrics soma todos eles
+    metrics_dir, remove_metrics_dir = _prepare_metrics_dir()
+    gc.collect()
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # Worker: restaura os sinais padrão (uvicorn instala os seus)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                _run_worker(app, sock, log_level)
+            finally:
+                stop_logging()
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+    logger.info(f"🚀 {workers} workers em http://{host}:{port}", extra={'pids': sorted(children)})
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+
+        if not stopping:
+            # Worker caiu inesperadamente: sobe outro no lugar
+            logger.warning(f"⚠️ Worker {pid} terminou (status {status}); reiniciando")
+            time.sleep(0.5)
+            spawn()
+
+    sock.close()
+    if remove_metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
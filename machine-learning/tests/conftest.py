@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Os módulos ficam soltos em machine-learning/ (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from feature_store import FeatureStore, text_hash
+
+def _featurize(texts):
+    return pd.DataFrame({'length': [float(len(text)) for text in texts]})
+
+def test_same_text_added_twice_keeps_unique_index(tmp_path):
+    """Duas requisições que erram o mesmo texto e gravam em sequência não duplicam a chave"""
+    store = FeatureStore(str(tmp_path), 'v1', ['length'], featurize=_featurize, flush_rows=None)
+    key = text_hash('matrícula 123')
+
+    values, found = store.lookup([key])
+    assert not found.any()
+    store.add([key], [[13.0]])
+    store.flush()
+    store.add([key], [[14.0]])
+    store.flush()
+
+    values, found = store.lookup([key])
+    assert found.all()
+    np.testing.assert_array_equal(values, [[14.0]])
+    assert len(store) == 1
+
+    # Um processo novo lê os dois arquivos com o mesmo resultado
+    reloaded = FeatureStore(str(tmp_path), 'v1', ['length'], featurize=_featurize)
+    np.testing.assert_array_equal(reloaded.lookup([key])[0], [[14.0]])
@@ -0,0 +1,16 @@
+import os
+
+from metrics import MetricsRegistry
+
+def test_dead_worker_counters_survive_pid_reuse(tmp_path):
+    """O snapshot de um worker morto não é sobrescrito por outro processo com o mesmo PID"""
+    registry = MetricsRegistry()
+    lookups = registry.counter('lookups_total', "Consultas", ['result'])
+    registry.enable_multiprocess(str(tmp_path))
+
+    # Snapshot de um worker morto que tinha o nosso PID (outro instante de início)
+    (tmp_path / f"{os.getpid()}-1.json").write_text('{"lookups_total": [[["hit"], 5]]}')
+
+    lookups.inc(2, result='hit')
+    assert 'lookups_total{result="hit"} 7' in registry.render()
+    assert len(os.listdir(tmp_path)) == 2
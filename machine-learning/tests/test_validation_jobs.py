@@ -0,0 +1,68 @@
+import os
+import signal
+import time
+
+import pytest
+
+import validation_jobs
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requer fork")
+def test_forked_sibling_lease_is_alive():
+    """Um worker criado por fork tem o próprio token: os irmãos o veem vivo"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, f"{os.getpid()}-{validation_jobs.PROCESS_TOKEN}-0".encode())
+        os.close(write_fd)
+        signal.pause()
+        os._exit(0)
+
+    os.close(write_fd)
+    try:
+        worker = os.read(read_fd, 256).decode()
+        assert validation_jobs._process_alive(worker)
+    finally:
+        os.close(read_fd)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    assert not validation_jobs._process_alive(worker)
+
+def test_lease_renewed_while_job_runs(tmp_path):
+    """Um job mais longo que o lease não é retomado por outro worker"""
+    queue = validation_jobs.ValidationJobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path),
+                                               lease_seconds=0.3, poll_seconds=0.05)
+    job = queue.submit([b'conteudo'], 'doc.txt', {})
+    calls = []
+
+    def process(content, filename, params):
+        calls.append(filename)
+        # Durante o job, outro worker não encontra nada para reservar
+        for _ in range(10):
+            time.sleep(0.1)
+            assert queue.claim('outro-0-0') is None
+        return {'ok': True}
+
+    queue.start(process)
+    try:
+        for _ in range(50):
+            if queue.get(job['job_id'])['status'] == 'completed':
+                break
+            time.sleep(0.1)
+    finally:
+        queue.stop()
+    assert queue.get(job['job_id'])['status'] == 'completed'
+    assert calls == ['doc.txt']
+
+def test_stale_owner_cannot_complete(tmp_path):
+    """Depois que o lease expira e outro worker retoma o job, o dono antigo não grava"""
+    queue = validation_jobs.ValidationJobQueue(str(tmp_path / 'jobs.sqlite3'), str(tmp_path), lease_seconds=0)
+    job = queue.submit([b'conteudo'], 'doc.txt', {})
+    assert queue.claim('antigo-0-0')['job_id'] == job['job_id']
+    time.sleep(0.01)
+    assert queue.claim('novo-0-0')['job_id'] == job['job_id']
+
+    assert not queue.complete(job['job_id'], 'antigo-0-0', result={'ok': False})
+    assert queue.get(job['job_id'])['status'] == 'running'
+    assert queue.complete(job['job_id'], 'novo-0-0', result={'ok': True})
+    assert queue.get(job['job_id'])['result'] == {'ok': True}
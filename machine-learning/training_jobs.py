@@ -0,0 +1,242 @@
+import glob
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from process_info import process_alive, process_token
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Estados em que um job ainda ocupa o treinador
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Um job `queued` sem processo registrado há mais que isso foi abandonado
+QUEUED_GRACE_SECONDS = 60
+
+def _write_status(status_path, status):
+    """Grava o status do job de forma atômica (arquivo temporário + rename)"""
+    tmp_path = f"{status_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f, indent=2, default=str)
+    os.replace(tmp_path, status_path)
+
+def run_training_job(status_path, data_path='data/synthetic_data.csv', n_samples=1000, n_jobs=None,
+                     search=False):
+    """Executa geração de dados, treino e salvamento do modelo (processo separado)
+
+    O progresso de cada etapa, as métricas de cada candidato e os tempos são
+    gravados em `status_path`, que o processo da API consulta.
+    """
+    # Imports aqui: o processo é iniciado com spawn e só precisa deles no treino
+    from data_generator import SyntheticDataGenerator
+    from logging_config import configure_logging
+    from model_trainer import DocumentValidatorTrainer
+    
+    configure_logging()
+
+    with open(status_path) as f:
+        status = json.load(f)
+    # PID e instante de início: outros workers sabem se o treino ainda roda
+    status.update({'status': 'running', 'started_at': datetime.now().isoformat(),
+                   'pid': os.getpid(), 'process_token': process_token(os.getpid())})
+
+    def stage(name):
+        status['stage'] = name
+        status['timings'].setdefault(name, None)
+        _write_status(status_path, status)
+        return time.perf_counter()
+
+    def finish_stage(name, start):
+        status['timings'][name] = round(time.perf_counter() - start, 3)
+
+    try:
+        if not os.path.exists(data_path):
+            # Gerar dados primeiro
+            start = stage('generating_data')
+            generator = SyntheticDataGenerator()
+            data = generator.generate_dataset(n_samples=n_samples)
+            generator.save_data(data, os.path.dirname(data_path) or '.')
+            finish_stage('generating_data', start)
+
+        start = stage('loading_data')
+        trainer = DocumentValidatorTrainer(n_jobs=n_jobs)
+        df = trainer.load_data(data_path)
+        X, y, _ = trainer.prepare_features(df)
+        finish_stage('loading_data', start)
+
+        if search:
+            start = stage('searching')
+            search_info = trainer.search_hyperparameters(X, y)
+            status['search'] = {name: {'best_params': info['best_params'],
+                                       'best_cv_accuracy': info['best_cv_accuracy'],
+                                       'search_seconds': info['search_seconds']}
+                                for name, info in search_info.items()}
+            finish_stage('searching', start)
+
+        def on_candidate(name, result):
+            status['candidates'][name] = {
+                'accuracy': result['accuracy'],
+                'cv_accuracy_mean': result['cv_accuracy_mean'],
+                'cv_accuracy_std': result['cv_accuracy_std'],
+                'cv_time': round(result['cv_time'], 3),
+                'fit_time': round(result['fit_time'], 3)
+            }
+            _write_status(status_path, status)
+
+        start = stage('training')
+        results, _, _ = trainer.train_models(X, y, progress_callback=on_candidate)
+        for name, result in results.items():
+            # Custo de servir, medido depois que todos os candidatos terminam
+            status['candidates'][name]['serving'] = result['serving']
+        status['selection'] = trainer.training_info['selection']
+        finish_stage('training', start)
+
+        start = stage('saving')
+        model_path = trainer.save_model()
+        finish_stage('saving', start)
+
+        status.update({
+            'status': 'completed',
+            'stage': 'done',
+            'best_model': trainer.best_model_name,
+            'accuracy': max(r['accuracy'] for r in results.values()),
+            'model_path': model_path
+        })
+    except Exception as e:
+        status.update({'status': 'failed', 'error': str(e)})
+    finally:
+        status['finished_at'] = datetime.now().isoformat()
+        _write_status(status_path, status)
+
+def _job_alive(status):
+    """Se o processo de treino do job ainda existe (PID + instante de início)"""
+    pid = status.get('pid')
+    if pid is None:
+        created_at = datetime.fromisoformat(status['created_at'])
+        return (datetime.now() - created_at).total_seconds() < QUEUED_GRACE_SECONDS
+    return process_alive(pid, status.get('process_token'))
+
+class TrainingJobManager:
+    """Executa treinos em processos separados, um por vez, com status consultável
+
+    Pedidos de treino enquanto outro job está ativo não iniciam um novo
+    processo: retornam o job em andamento. A verificação vale entre processos
+    (workers do servidor): ela roda sob um lock de arquivo em `jobs_dir` e
+    procura nos status gravados um job ativo cujo processo ainda existe.
+    """
+
+    def __init__(self, jobs_dir='models/jobs'):
+        self.jobs_dir = jobs_dir
+        self._lock = threading.Lock()
+        self._active_job_id = None
+        # spawn: o processo de treino não herda threads/estado do servidor
+        self._context = multiprocessing.get_context('spawn')
+
+    def _status_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    @contextmanager
+    def _submit_lock(self):
+        """Lock entre threads e, onde há `fcntl`, entre processos"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            with open(os.path.join(self.jobs_dir, '.submit.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _find_active(self):
+        """Job ativo de qualquer processo (ou None)"""
+        if self._active_job_id is not None:
+            active = self.get(self._active_job_id)
+            if active and active['status'] in ACTIVE_STATUSES:
+                return active
+
+        for status_path in glob.glob(os.path.join(self.jobs_dir, '*.json')):
+            try:
+                with open(status_path) as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if status.get('status') in ACTIVE_STATUSES and _job_alive(status):
+                return status
+        return None
+
+    def submit(self, on_complete=None, **params):
+        """Inicia um job de treino ou retorna o ativo; devolve (status, criado)"""
+        with self._submit_lock():
+            active = self._find_active()
+            if active is not None:
+                return active, False
+
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            job_id = uuid.uuid4().hex[:12]
+            status_path = self._status_path(job_id)
+            status = {
+                'job_id': job_id,
+                'status': 'queued',
+                'stage': None,
+                'created_at': datetime.now().isoformat(),
+                'params': params,
+                'timings': {},
+                'candidates': {}
+            }
+            _write_status(status_path, status)
+
+            process = self._context.Process(
+                target=run_training_job, args=(status_path,), kwargs=params, daemon=False
+            )
+            process.start()
+            self._active_job_id = job_id
+
+        watcher = threading.Thread(
+            target=self._watch, args=(job_id, process, on_complete), daemon=True
+        )
+        watcher.start()
+
+        return status, True
+
+    def _watch(self, job_id, process, on_complete):
+        """Aguarda o fim do processo e dispara o callback (ex.: recarregar o modelo)"""
+        process.join()
+        status = self.get(job_id)
+
+        if status['status'] in ACTIVE_STATUSES:
+            # Processo morreu sem registrar o fim (ex.: falta de memória)
+            status.update({
+                'status': 'failed',
+                'error': f"Processo de treino terminou com código {process.exitcode}",
+                'finished_at': datetime.now().isoformat()
+            })
+            _write_status(self._status_path(job_id), status)
+
+        with self._lock:
+            if self._active_job_id == job_id:
+                self._active_job_id = None
+
+        if status['status'] == 'completed' and on_complete is not None:
+            on_complete(status)
+
+    def get(self, job_id):
+        """Status atual do job (ou None se não existir)"""
+        if not re.fullmatch(r'[0-9a-f]{12}', job_id):
+            return None
+        status_path = self._status_path(job_id)
+        if not os.path.exists(status_path):
+            return None
+        with open(status_path) as f:
+            return json.load(f)
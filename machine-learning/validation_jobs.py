@@ -0,0 +1,308 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from logging_config import get_logger
+from process_info import process_alive, process_token
+
+logger = get_logger('jobs')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    upload_path TEXT,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+def _own_token():
+    return process_token(os.getpid()) or uuid.uuid4().hex[:12]
+
+# Identifica este processo nos jobs reservados: `<pid>-<token>-<thread>`
+PROCESS_TOKEN = _own_token()
+
+def _reset_token():
+    # Workers pré-fork (serving.serve_prefork) importam o módulo antes do fork:
+    # sem isso herdariam o token do pai e veriam os leases dos irmãos como órfãos
+    global PROCESS_TOKEN
+    PROCESS_TOKEN = _own_token()
+
+os.register_at_fork(after_in_child=_reset_token)
+
+class RetryLater(Exception):
+    """O job não pode rodar agora (ex.: sem modelo); volta para a fila sem gastar tentativa"""
+
+def _process_alive(worker):
+    """Se o processo do worker (`<pid>-<token>-<thread>`) ainda existe"""
+    parts = str(worker).split('-')
+    try:
+        pid = int(parts[0])
+    except ValueError:
+        return False
+    token = parts[1] if len(parts) >= 3 else None
+    if pid == os.getpid():
+        # Mesmo PID de um processo anterior (reinício): só os jobs deste processo estão vivos
+        return token == PROCESS_TOKEN
+    return process_alive(pid, token)
+
+class ValidationJobQueue:
+    """Fila durável de validações de documentos (SQLite + arquivos em `uploads/`)
+
+    O upload é gravado em disco (fsync + rename) antes do job entrar na fila,
+    então um job aceito sobrevive a reinícios. Um job em execução tem um
+    lease, renovado enquanto ele roda: se o processo morrer, outro worker o
+    retoma quando o lease expira, até `max_attempts` tentativas. Só o dono
+    atual do lease grava o resultado. Vários processos podem compartilhar o
+    mesmo banco; a reserva de um job é uma transação `BEGIN IMMEDIATE`.
+    """
+
+    def __init__(self, db_path='uploads/jobs.sqlite3', uploads_dir='uploads',
+                 lease_seconds=600, max_attempts=3, poll_seconds=1.0):
+        self.db_path = db_path
+        self.uploads_dir = uploads_dir
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+        os.makedirs(uploads_dir, exist_ok=True)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Uma conexão por operação: seguro entre threads e processos
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute('PRAGMA synchronous=FULL')
+            yield conn
+        finally:
+            conn.close()
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job.pop('upload_path', None)
+        job.pop('lease_until', None)
+        return job
+
+    def submit(self, chunks, filename, params):
+        """Grava o upload (iterável de bytes) e enfileira o job; retorna o job"""
+        job_id = uuid.uuid4().hex[:12]
+        _, ext = os.path.splitext(os.path.basename(filename or ''))
+        ext = ext if re.fullmatch(r'\.[A-Za-z0-9]{1,8}', ext) else ''
+        upload_path = os.path.join(self.uploads_dir, f"{job_id}{ext}")
+        tmp_path = f"{upload_path}.tmp"
+
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, upload_path)
+
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (job_id, status, filename, upload_path, params, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', filename, upload_path, json.dumps(params), datetime.now().isoformat())
+            )
+
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Status do job (ou None se não existir)"""
+        if not re.fullmatch(r'[0-9a-f]{12}', job_id):
+            return None
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def counts(self):
+        """Número de jobs por status"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def claim(self, worker):
+        """Reserva o próximo job (na fila ou com lease expirado); retorna a linha ou None"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Jobs cujo processo morreu repetidamente não voltam para a fila
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "error = 'Processamento interrompido ' || attempts || ' vezes' "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                    (datetime.now().isoformat(), now, self.max_attempts)
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                        "lease_until = ?, started_at = ? WHERE job_id = ?",
+                        (worker, now + self.lease_seconds, datetime.now().isoformat(), row['job_id'])
+                    )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return row
+
+    def renew(self, job_id, worker):
+        """Estende o lease de um job em execução; retorna False se `worker` não o detém mais"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result=None, error=None):
+        """Grava o resultado (ou o erro) e remove o upload
+
+        Só o worker que detém o lease grava: se o job foi retomado por outro
+        (lease expirado), o resultado antigo é descartado. Retorna se gravou.
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT upload_path FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            cursor = conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL '
+                "WHERE job_id = ? AND worker = ? AND status = 'running'",
+                ('failed' if error else 'completed', json.dumps(result, default=str) if result is not None else None,
+                 error, datetime.now().isoformat(), job_id, worker)
+            )
+        if cursor.rowcount != 1:
+            logger.warning(f"⚠️ Job {job_id} foi retomado por outro worker; resultado descartado",
+                           extra={'job_id': job_id, 'worker': worker})
+            return False
+        if row and row['upload_path']:
+            try:
+                os.remove(row['upload_path'])
+            except FileNotFoundError:
+                pass
+        return True
+
+    def release(self, job_id, worker):
+        """Devolve um job reservado à fila sem contar a tentativa"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = MAX(attempts - 1, 0), worker = NULL, "
+                "lease_until = NULL, started_at = NULL WHERE job_id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker)
+            )
+
+    @contextmanager
+    def _heartbeat(self, job_id, worker):
+        """Renova o lease a cada terço de `lease_seconds` enquanto o job roda"""
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(job_id, worker):
+                        return
+                except sqlite3.Error as e:
+                    logger.warning(f"Erro ao renovar o lease do job {job_id}: {e}", extra={'job_id': job_id})
+
+        thread = threading.Thread(target=beat, name=f"lease-{job_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def recover(self):
+        """Libera na hora os jobs em execução por processos que já morreram (mesma máquina)
+
+        Sem isso, um job interrompido por uma queda só volta quando o lease expira.
+        Retorna o número de jobs liberados.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT job_id, worker FROM jobs WHERE status = 'running'").fetchall()
+            dead = [row['job_id'] for row in rows if not _process_alive(row['worker'])]
+            conn.executemany('UPDATE jobs SET lease_until = 0 WHERE job_id = ?', [(job_id,) for job_id in dead])
+        if dead:
+            logger.warning(f"♻️ {len(dead)} job(s) interrompido(s) voltando para a fila", extra={'jobs': dead})
+        return len(dead)
+
+    def start(self, process, n_workers=1):
+        """Inicia `n_workers` threads que executam `process(conteúdo, nome, params)` para cada job"""
+        self._stop.clear()
+        self.recover()
+        for i in range(n_workers):
+            thread = threading.Thread(
+                target=self._work, args=(process, f"{os.getpid()}-{PROCESS_TOKEN}-{i}"),
+                name=f"validation-job-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Para as threads; um job interrompido volta para a fila quando o lease expira"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self, process, worker):
+        while not self._stop.is_set():
+            try:
+                row = self.claim(worker)
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao reservar job: {e}")
+                row = None
+
+            if row is None:
+                # Fila vazia: espera um submit deste processo ou o próximo poll
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+
+            job_id = row['job_id']
+            try:
+                with self._heartbeat(job_id, worker):
+                    with open(row['upload_path'], 'rb') as f:
+                        content = f.read()
+                    result = process(content, row['filename'], json.loads(row['params']))
+                self.complete(job_id, worker, result=result)
+            except RetryLater as e:
+                logger.debug(f"⏳ Job {job_id} volta para a fila: {e}", extra={'job_id': job_id})
+                self.release(job_id, worker)
+                self._stop.wait(self.poll_seconds)
+            except Exception as e:
+                logger.error(f"Job {job_id} falhou: {e}", extra={'job_id': job_id})
+                self.complete(job_id, worker, error=str(e))